@@ -0,0 +1,216 @@
+"""
+GeoForge Benchmark: block model cell load
+Times the original executemany insert of block_model_cells against binary
+COPY into a staging table followed by one INSERT ... SELECT
+
+Both paths load the same grid into a scratch copy of block_model_cells
+(same columns, unique key and indexes as migration 005) and are timed end
+to end from the client: cell generation, transfer, server-side inserts
+and commit. The geometry column and its GIST index are included when the
+PostGIS extension is available and left out of both paths otherwise.
+
+Usage (against a disposable database):
+
+    DATABASE_URL=postgresql://... python benchmarks/cell_load.py --shape 100 100 50
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bulk_io import copy_columns, create_staging_table  # noqa: E402
+
+
+TABLE = "bench_block_model_cells"
+
+# Original create_block_model batch size (one commit per batch)
+BATCH_SIZE = 1000
+
+
+def create_table(cur, postgis: bool):
+    geometry = "geometry GEOMETRY(PointZ, 4326)," if postgis else ""
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cur.execute(f"""
+        CREATE TABLE {TABLE} (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            block_model_id UUID NOT NULL,
+            i INTEGER NOT NULL,
+            j INTEGER NOT NULL,
+            k INTEGER NOT NULL,
+            centroid_x DOUBLE PRECISION NOT NULL,
+            centroid_y DOUBLE PRECISION NOT NULL,
+            centroid_z DOUBLE PRECISION NOT NULL,
+            {geometry}
+            au_grade DOUBLE PRECISION,
+            volume_m3 DOUBLE PRECISION,
+            density DOUBLE PRECISION DEFAULT 2.7,
+            tonnage DOUBLE PRECISION GENERATED ALWAYS AS (volume_m3 * density) STORED,
+            classification VARCHAR(50),
+            is_estimated BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(block_model_id, i, j, k)
+        )
+    """)
+    cur.execute(f"CREATE INDEX ON {TABLE}(block_model_id)")
+    cur.execute(f"CREATE INDEX ON {TABLE}(i, j, k)")
+    cur.execute(f"CREATE INDEX ON {TABLE}(classification)")
+    cur.execute(f"CREATE INDEX ON {TABLE}(is_estimated)")
+    if postgis:
+        cur.execute(f"CREATE INDEX ON {TABLE} USING GIST(geometry)")
+
+
+def load_executemany(conn, grid, postgis: bool) -> int:
+    """The pre-COPY create_block_model loop: Python tuples, executemany, commit per batch"""
+    cur = conn.cursor()
+    block_model_id = str(uuid.uuid4())
+    geometry_column = ", geometry" if postgis else ""
+    geometry_value = ", ST_SetSRID(ST_MakePoint(%s, %s, %s), 4326)" if postgis else ""
+    query = f"""
+        INSERT INTO {TABLE} (
+            block_model_id, i, j, k,
+            centroid_x, centroid_y, centroid_z,
+            volume_m3{geometry_column}
+        ) VALUES (
+            %s, %s, %s, %s,
+            %s, %s, %s,
+            %s{geometry_value}
+        )
+    """
+    volume = grid["block_size_x"] * grid["block_size_y"] * grid["block_size_z"]
+    blocks_created = 0
+    blocks_batch = []
+
+    def flush():
+        if postgis:
+            rows = [b + b[4:7] for b in blocks_batch]
+        else:
+            rows = blocks_batch
+        cur.executemany(query, rows)
+        conn.commit()
+
+    for i in range(grid["nx"]):
+        for j in range(grid["ny"]):
+            for k in range(grid["nz"]):
+                blocks_batch.append((
+                    block_model_id, i, j, k,
+                    grid["x_min"] + (i + 0.5) * grid["block_size_x"],
+                    grid["y_min"] + (j + 0.5) * grid["block_size_y"],
+                    grid["z_min"] + (k + 0.5) * grid["block_size_z"],
+                    volume
+                ))
+                if len(blocks_batch) >= BATCH_SIZE:
+                    flush()
+                    blocks_created += len(blocks_batch)
+                    blocks_batch = []
+    if blocks_batch:
+        flush()
+        blocks_created += len(blocks_batch)
+    cur.close()
+    return blocks_created
+
+
+def load_copy(conn, grid, postgis: bool) -> int:
+    """NumPy index arrays, binary COPY into a staging table, one INSERT ... SELECT"""
+    cur = conn.cursor()
+    block_model_id = str(uuid.uuid4())
+    i_idx, j_idx, k_idx = np.meshgrid(
+        np.arange(grid["nx"], dtype=np.int32),
+        np.arange(grid["ny"], dtype=np.int32),
+        np.arange(grid["nz"], dtype=np.int32),
+        indexing="ij"
+    )
+    i_idx, j_idx, k_idx = i_idx.ravel(), j_idx.ravel(), k_idx.ravel()
+    centroid_x = grid["x_min"] + (i_idx + 0.5) * grid["block_size_x"]
+    centroid_y = grid["y_min"] + (j_idx + 0.5) * grid["block_size_y"]
+    centroid_z = grid["z_min"] + (k_idx + 0.5) * grid["block_size_z"]
+
+    names = ["i", "j", "k", "centroid_x", "centroid_y", "centroid_z"]
+    arrays = [i_idx, j_idx, k_idx, centroid_x, centroid_y, centroid_z]
+    create_staging_table(cur, "bench_cell_staging", names, arrays)
+    copy_columns(cur, "bench_cell_staging", names, arrays)
+
+    geometry_column = ", geometry" if postgis else ""
+    geometry_value = (
+        ", ST_SetSRID(ST_MakePoint(s.centroid_x, s.centroid_y, s.centroid_z), 4326)" if postgis else ""
+    )
+    volume = grid["block_size_x"] * grid["block_size_y"] * grid["block_size_z"]
+    cur.execute(f"""
+        INSERT INTO {TABLE} (
+            block_model_id, i, j, k,
+            centroid_x, centroid_y, centroid_z,
+            volume_m3{geometry_column}
+        )
+        SELECT
+            %s, s.i, s.j, s.k,
+            s.centroid_x, s.centroid_y, s.centroid_z,
+            %s{geometry_value}
+        FROM bench_cell_staging s
+    """, (block_model_id, volume))
+    blocks_created = cur.rowcount
+    conn.commit()
+    cur.close()
+    return blocks_created
+
+
+METHODS = {"executemany": load_executemany, "copy": load_copy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="defaults to DATABASE_URL")
+    parser.add_argument("--shape", type=int, nargs=3, default=[50, 50, 40], metavar=("NX", "NY", "NZ"))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method (best and median reported)")
+    parser.add_argument("--methods", nargs="+", choices=list(METHODS), default=list(METHODS))
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    nx, ny, nz = args.shape
+    grid = {
+        "x_min": 500000.0, "y_min": 7000000.0, "z_min": -500.0,
+        "block_size_x": 10.0, "block_size_y": 10.0, "block_size_z": 5.0,
+        "nx": nx, "ny": ny, "nz": nz
+    }
+
+    conn = psycopg2.connect(args.dsn)
+    cur = conn.cursor()
+    cur.execute("SELECT version()")
+    server = cur.fetchone()[0]
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'postgis')")
+    postgis = cur.fetchone()[0]
+    if postgis:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    conn.commit()
+
+    print(server.split(",")[0])
+    print(f"PostGIS: {'yes' if postgis else 'no (geometry column and ST_MakePoint left out of both paths)'}")
+    print(f"Grid: {nx} x {ny} x {nz} = {nx * ny * nz:,} blocks, {args.repeat} run(s) per method")
+
+    try:
+        for name in args.methods:
+            timings = []
+            for _ in range(args.repeat):
+                create_table(cur, postgis)
+                conn.commit()
+                start = time.perf_counter()
+                rows = METHODS[name](conn, grid, postgis)
+                timings.append(time.perf_counter() - start)
+                if rows != nx * ny * nz:
+                    raise RuntimeError(f"{name} loaded {rows} rows, expected {nx * ny * nz}")
+            best, median = min(timings), float(np.median(timings))
+            print(f"{name:>12}: best {best:8.2f} s  median {median:8.2f} s  ({rows / best:,.0f} blocks/s)")
+    finally:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+GeoForge Block Model LOD Pyramid
+Level-of-detail aggregates of a block model for 3D visualization
+
+Level 0 is the model itself (parent blocks, or leaf cells when
+sub-blocked). Level n merges 2x2x2 cells of level n-1, so its cells are
+2**n parent blocks on a side. Each level keeps additive sums (tonnage,
+metal and graded tonnage per element, tonnage per classification) so
+coarse grades are exact tonnage-weighted means of the model cells:
+
+    grade = sum(tonnage * grade) / sum(tonnage where grade is known)
+
+The pyramid is stored next to the columnar store in lod.npz, stamped
+with the store version it was built from, and rebuilt whenever that
+version moves on. Builds hold the store lock, so concurrent rebuilds (a
+worker's deferred rebuild and /lod requests in any API process) run one
+after another, each reading one store version, and a build that finds
+the pyramid already current skips the work.
+"""
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from block_store import BlockModelStore, GRADE_COLUMNS, CLASSIFICATIONS
+
+
+LOD_FILE = "lod.npz"
+
+# Grade attributes returned per cell by query_level()
+LOD_GRADES = ["au_grade", "cu_grade"]
+
+_N_CODES = len(CLASSIFICATIONS)
+
+
+def _parent_keys(ijk: np.ndarray, shape: Sequence[int]):
+    """Map cells to their 2x2x2 parents; returns (parent_ijk, parent_shape, inverse)"""
+    parent_shape = tuple(int(n) for n in np.ceil(np.asarray(shape) / 2).astype(int))
+    keys = np.ravel_multi_index((ijk // 2).T, parent_shape)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    parent_ijk = np.stack(np.unravel_index(unique_keys, parent_shape), axis=1).astype(np.int32)
+    return parent_ijk, parent_shape, inverse
+
+
+def _sum_by(inverse: np.ndarray, n: int, values: np.ndarray) -> np.ndarray:
+    if values.ndim == 1:
+        return np.bincount(inverse, weights=values, minlength=n)
+    width = values.shape[1]
+    flat = (inverse[:, None] * width + np.arange(width)).ravel()
+    return np.bincount(flat, weights=values.ravel(), minlength=n * width).reshape(n, width)
+
+
+def _first_level(store: BlockModelStore):
+    """
+    Level 1 sums straight from the model columns, one column at a time so
+    no per-cell copy of every attribute is held at once.
+    """
+    ijk, shape, inverse = _parent_keys(store.block_ijk(), store.shape)
+    n = len(ijk)
+    tonnage = store.tonnage()
+    estimated = np.asarray(store.column("is_estimated"))
+    codes = np.asarray(store.column("classification")).astype(np.int64)
+
+    sums = {
+        "cell_count": np.bincount(inverse, minlength=n).astype(np.float64),
+        "tonnage": _sum_by(inverse, n, tonnage),
+        "estimated_tonnage": _sum_by(inverse, n, np.where(estimated, tonnage, 0.0)),
+        "class_tonnage": np.bincount(
+            inverse * _N_CODES + codes, weights=tonnage, minlength=n * _N_CODES
+        ).reshape(n, _N_CODES)
+    }
+    for name in GRADE_COLUMNS:
+        grade = np.asarray(store.column(name))
+        known = np.isfinite(grade)
+        sums[f"{name}_tonnage"] = _sum_by(inverse, n, np.where(known, tonnage, 0.0))
+        sums[f"{name}_metal"] = _sum_by(inverse, n, np.where(known, tonnage * grade, 0.0))
+    return ijk, shape, sums
+
+
+def _pyramid_arrays(store: BlockModelStore) -> Dict[str, np.ndarray]:
+    """Cells and sums of every level from 1 up, plus n_levels"""
+    arrays = {}
+
+    level = 0
+    if max(store.shape) > 1:
+        ijk, shape, sums = _first_level(store)
+        level = 1
+        while True:
+            arrays[f"l{level}_ijk"] = ijk
+            for name, values in sums.items():
+                arrays[f"l{level}_{name}"] = values
+            if max(shape) <= 1:
+                break
+            ijk, shape, inverse = _parent_keys(ijk, shape)
+            sums = {name: _sum_by(inverse, len(ijk), values) for name, values in sums.items()}
+            level += 1
+    arrays["n_levels"] = np.array(level)
+    return arrays
+
+
+def _stored_version(path: str) -> Optional[int]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as pyramid:
+        return int(pyramid["version"])
+
+
+def build_pyramid(store: BlockModelStore, only_if_stale: bool = False) -> int:
+    """
+    Rebuild every coarse level from the current store; returns the number
+    of levels above level 0. Cost is one pass over the model plus 1/7 of
+    that for the coarser levels. With only_if_stale, a pyramid already
+    built from the current store version is kept.
+    """
+    final_path = os.path.join(store.path, LOD_FILE)
+    with store.lock():
+        version = store.reload().meta["version"]
+        if only_if_stale and _stored_version(final_path) == version:
+            with np.load(final_path) as pyramid:
+                return int(pyramid["n_levels"])
+        arrays = _pyramid_arrays(store)
+        arrays["version"] = np.array(version)
+        tmp_path = final_path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, final_path)
+    return int(arrays["n_levels"])
+
+
+def load_pyramid(store: BlockModelStore):
+    """The stored pyramid, rebuilt first if missing or older than the store"""
+    path = os.path.join(store.path, LOD_FILE)
+    if os.path.exists(path):
+        pyramid = np.load(path)
+        if int(pyramid["version"]) == store.reload().meta["version"]:
+            return pyramid
+    build_pyramid(store, only_if_stale=True)
+    return np.load(path)
+
+
+# ==================== QUERIES ====================
+
+def _box_range(store: BlockModelStore, box: Optional[Dict[str, float]], cell_scale: int):
+    """Index range [lo, hi) per axis of cells (cell_scale parents wide) touching the box"""
+    shape = np.ceil(np.asarray(store.shape) / cell_scale).astype(int)
+    if not box:
+        return np.zeros(3, dtype=int), shape
+    size = store.parent_size * cell_scale
+    low = np.array([box.get(f"{axis}_min", -np.inf) for axis in "xyz"])
+    high = np.array([box.get(f"{axis}_max", np.inf) for axis in "xyz"])
+    lo = np.clip(np.floor((low - store.origin) / size), 0, shape).astype(int)
+    hi = np.clip(np.ceil((high - store.origin) / size), 0, shape).astype(int)
+    return lo, np.maximum(hi, lo)
+
+
+def _model_cells(store: BlockModelStore, box: Optional[Dict[str, float]]) -> np.ndarray:
+    """Level 0 cells whose parent block touches the box"""
+    lo, hi = _box_range(store, box, 1)
+    axes = [np.arange(lo[a], hi[a]) for a in range(3)]
+    parents = np.ravel_multi_index(np.meshgrid(*axes, indexing="ij"), store.shape).ravel()
+    if not store.is_subblocked:
+        return parents
+    # cell_parent is sorted, so each parent's cells are one contiguous run
+    cell_parent = store.cell_geometry("cell_parent")
+    starts = np.searchsorted(cell_parent, parents, side="left")
+    stops = np.searchsorted(cell_parent, parents, side="right")
+    counts = stops - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+def count_level(store: BlockModelStore, pyramid, level: int, box: Optional[Dict[str, float]]) -> int:
+    if level == 0:
+        if not store.is_subblocked:
+            lo, hi = _box_range(store, box, 1)
+            return int(np.prod(hi - lo))
+        return len(_model_cells(store, box))
+    return int(np.count_nonzero(_level_selection(store, pyramid, level, box)))
+
+
+def _level_selection(store, pyramid, level, box):
+    ijk = pyramid[f"l{level}_ijk"]
+    lo, hi = _box_range(store, box, 1 << level)
+    return np.all((ijk >= lo) & (ijk < hi), axis=1)
+
+
+def choose_level(store: BlockModelStore, pyramid, box: Optional[Dict[str, float]], max_blocks: int) -> int:
+    """Finest level whose cells inside the box fit in max_blocks"""
+    n_levels = int(pyramid["n_levels"])
+    for level in range(n_levels + 1):
+        if count_level(store, pyramid, level, box) <= max_blocks:
+            return level
+    return n_levels
+
+
+def query_level(store: BlockModelStore, pyramid, level: int, box: Optional[Dict[str, float]]) -> Dict[str, np.ndarray]:
+    """
+    Cells of one level touching the view box, as column arrays:
+    centroids, sizes, tonnage, grades, dominant classification code
+    (by tonnage), cell_count (model cells aggregated) and is_estimated.
+    """
+    if level == 0:
+        cells = _model_cells(store, box)
+        centroids = store.centroids(cells)
+        sizes = store.cell_sizes(cells)
+        result = {
+            "tonnage": store.tonnage(cells),
+            "classification": np.asarray(store.column("classification")[cells]),
+            "cell_count": np.ones(len(cells), dtype=np.int64),
+            "is_estimated": np.asarray(store.column("is_estimated")[cells])
+        }
+        for name in LOD_GRADES:
+            result[name] = np.asarray(store.column(name)[cells])
+    else:
+        selection = _level_selection(store, pyramid, level, box)
+        ijk = pyramid[f"l{level}_ijk"][selection]
+        scale = 1 << level
+        # Edge cells are clipped to the model extents
+        lower = ijk * scale
+        upper = np.minimum((ijk + 1) * scale, np.asarray(store.shape))
+        sizes = (upper - lower) * store.parent_size
+        centroids = store.origin + lower * store.parent_size + sizes / 2
+
+        def _sum(name):
+            return pyramid[f"l{level}_{name}"][selection]
+
+        result = {
+            "tonnage": _sum("tonnage"),
+            "classification": np.argmax(_sum("class_tonnage"), axis=1).astype(np.uint8),
+            "cell_count": _sum("cell_count").astype(np.int64),
+            "is_estimated": _sum("estimated_tonnage") > 0
+        }
+        for name in LOD_GRADES:
+            graded = _sum(f"{name}_tonnage")
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[name] = np.where(graded > 0, _sum(f"{name}_metal") / graded, np.nan)
+
+    result.update(
+        centroid_x=centroids[:, 0], centroid_y=centroids[:, 1], centroid_z=centroids[:, 2],
+        size_x=sizes[:, 0], size_y=sizes[:, 1], size_z=sizes[:, 2]
+    )
+    return result
@@ -0,0 +1,698 @@
+"""
+GeoForge Block Model Store
+Columnar, memory-mapped storage for block model attributes
+
+Each block model gets a directory holding one contiguous .npy array per
+attribute plus a meta.json with the grid definition. Cells are indexed
+implicitly by (i, j, k) from nx/ny/nz:
+
+    flat = (i * ny + j) * nz + k
+
+so no per-row keys are stored and model-wide reads, filters and
+aggregations are plain NumPy operations on memory-mapped arrays.
+
+Sub-blocked models keep the regular parent grid but store one row per
+leaf cell of an octree: the parent's flat index, the subdivision level
+(cell edge = parent edge / 2**level) and the cell's i/j/k within the
+parent at that level. Parents are only split where seed points (contacts,
+vein intercepts, samples) fall, so the cell count grows with the number
+of boundary blocks rather than with the finest resolution.
+block_model_cells in PostgreSQL is kept as a synced copy for SQL consumers
+(views, ad-hoc queries); see sync_to_postgres().
+"""
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from bulk_io import copy_columns, create_staging_table
+
+
+BLOCK_STORE_DIR = os.getenv(
+    "BLOCK_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "block_store")
+)
+
+GRADE_COLUMNS = ["au_grade", "ag_grade", "cu_grade", "pb_grade", "zn_grade"]
+
+# Attribute name -> (dtype, fill value for a new model)
+COLUMN_SPECS = {
+    **{name: (np.float64, np.nan) for name in GRADE_COLUMNS},
+    "density": (np.float64, 2.7),
+    "au_variance": (np.float64, np.nan),
+    "ag_variance": (np.float64, np.nan),
+    "cu_variance": (np.float64, np.nan),
+    "pb_variance": (np.float64, np.nan),
+    "zn_variance": (np.float64, np.nan),
+    "sample_count": (np.int32, 0),
+    "search_distance": (np.float64, np.nan),
+    "slope_of_regression": (np.float64, np.nan),
+    "negative_weight_sum": (np.float64, np.nan),
+    "search_pass": (np.uint8, 0),  # 1-based search pass that estimated the cell
+    "classification": (np.uint8, 0),
+    "is_estimated": (np.bool_, False),
+}
+
+# classification codes (0 = not classified yet)
+CLASSIFICATIONS = [None, "measured", "indicated", "inferred", "unclassified"]
+CLASSIFICATION_CODES = {name: code for code, name in enumerate(CLASSIFICATIONS) if name}
+
+# Troy ounces per tonne at 1 g/t (same factor as the SQL reports)
+OZ_PER_TONNE_GPT = 0.029166667
+
+# Deepest octree subdivision (finest cell edge = parent edge / 16)
+MAX_SUB_BLOCK_LEVEL = 4
+
+# Per-cell geometry arrays of a sub-blocked store -> dtype
+CELL_ARRAYS = {"cell_parent": np.int64, "cell_level": np.uint8, "cell_sub": np.uint16}
+
+
+class StoreVersionConflict(RuntimeError):
+    """A column write based on a store version that is no longer current"""
+
+
+class BlockModelStore:
+    """Memory-mapped columnar arrays for one block model"""
+
+    def __init__(self, block_model_id: str, root: str = None):
+        self.block_model_id = str(block_model_id)
+        self.path = os.path.join(root or BLOCK_STORE_DIR, self.block_model_id)
+        self._meta = None
+
+    # ---------- lifecycle ----------
+
+    @classmethod
+    def create(
+        cls, block_model_id: str, grid: Dict, root: str = None, cells: Dict[str, np.ndarray] = None
+    ) -> "BlockModelStore":
+        """
+        Create an empty store for a regular grid.
+
+        grid needs x_min, y_min, z_min, block_size_x/y/z and nx, ny, nz
+        (the parent grid). Passing cells (from build_octree) creates a
+        sub-blocked store with one row per leaf cell.
+        """
+        store = cls(block_model_id, root)
+        os.makedirs(store.path, exist_ok=True)
+        meta = {
+            key: float(grid[key])
+            for key in ("x_min", "y_min", "z_min", "block_size_x", "block_size_y", "block_size_z")
+        }
+        meta.update(nx=int(grid["nx"]), ny=int(grid["ny"]), nz=int(grid["nz"]), version=0, synced_version=-1)
+        if cells is not None:
+            meta.update(
+                model_type="subblock",
+                n_cells=len(cells["cell_parent"]),
+                sub_block_levels=int(cells["cell_level"].max(initial=0))
+            )
+        store._meta = meta
+
+        with store._lock():
+            if cells is not None:
+                for name, dtype in CELL_ARRAYS.items():
+                    store._write_array(name, np.asarray(cells[name], dtype=dtype))
+            for name, (dtype, fill) in COLUMN_SPECS.items():
+                store._write_array(name, np.full(store.n_blocks, fill, dtype=dtype))
+            store._write_meta(meta)
+        return store
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, "meta.json"))
+
+    @property
+    def meta(self) -> Dict:
+        if self._meta is None:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    def reload(self):
+        self._meta = None
+        return self
+
+    # ---------- grid geometry ----------
+
+    @property
+    def shape(self):
+        return (self.meta["nx"], self.meta["ny"], self.meta["nz"])
+
+    @property
+    def is_subblocked(self) -> bool:
+        return self.meta.get("model_type") == "subblock"
+
+    @property
+    def n_parents(self) -> int:
+        nx, ny, nz = self.shape
+        return nx * ny * nz
+
+    @property
+    def n_blocks(self) -> int:
+        """Number of stored cells (parents for regular models, leaf cells when sub-blocked)"""
+        if self.is_subblocked:
+            return self.meta["n_cells"]
+        return self.n_parents
+
+    @property
+    def origin(self) -> np.ndarray:
+        meta = self.meta
+        return np.array([meta["x_min"], meta["y_min"], meta["z_min"]])
+
+    @property
+    def parent_size(self) -> np.ndarray:
+        meta = self.meta
+        return np.array([meta["block_size_x"], meta["block_size_y"], meta["block_size_z"]])
+
+    def flat_index(self, i, j, k) -> np.ndarray:
+        """Storage index of parent blocks (regular models only)"""
+        if self.is_subblocked:
+            raise ValueError("Sub-blocked models are not indexed by i, j, k alone")
+        return np.ravel_multi_index((i, j, k), self.shape)
+
+    def cell_geometry(self, name: str) -> np.ndarray:
+        """Read-only memory map of a sub-block geometry array"""
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def _cells(self, selection) -> np.ndarray:
+        return np.arange(self.n_blocks) if selection is None else np.asarray(selection)
+
+    def block_ijk(self, selection: np.ndarray = None) -> np.ndarray:
+        """(n, 3) int32 parent grid indices in storage order"""
+        cells = self._cells(selection)
+        if self.is_subblocked:
+            cells = np.asarray(self.cell_geometry("cell_parent"))[cells]
+        return np.stack(np.unravel_index(cells, self.shape), axis=1).astype(np.int32)
+
+    def cell_levels(self, selection: np.ndarray = None) -> np.ndarray:
+        """Octree level of each cell (0 = whole parent block)"""
+        cells = self._cells(selection)
+        if self.is_subblocked:
+            return np.asarray(self.cell_geometry("cell_level"))[cells]
+        return np.zeros(len(cells), dtype=np.uint8)
+
+    def cell_sub_ijk(self, selection: np.ndarray = None) -> np.ndarray:
+        """(n, 3) index of each cell within its parent at its own level"""
+        cells = self._cells(selection)
+        if self.is_subblocked:
+            return np.asarray(self.cell_geometry("cell_sub"))[cells]
+        return np.zeros((len(cells), 3), dtype=np.uint16)
+
+    def cell_sizes(self, selection: np.ndarray = None) -> np.ndarray:
+        """(n, 3) cell edge lengths"""
+        scale = 1.0 / (1 << self.cell_levels(selection).astype(np.int64))
+        return scale[:, None] * self.parent_size
+
+    def centroids(self, selection: np.ndarray = None) -> np.ndarray:
+        """(n, 3) cell centroids, computed from the grid definition"""
+        corner = self.origin + self.block_ijk(selection) * self.parent_size
+        return corner + (self.cell_sub_ijk(selection) + 0.5) * self.cell_sizes(selection)
+
+    def volume(self, selection: np.ndarray = None) -> np.ndarray:
+        return np.prod(self.cell_sizes(selection), axis=1)
+
+    def tonnage(self, selection: np.ndarray = None) -> np.ndarray:
+        density = self.column("density")
+        return self.volume(selection) * (density if selection is None else density[selection])
+
+    # ---------- columns ----------
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only memory map of one attribute"""
+        if name not in COLUMN_SPECS:
+            raise KeyError(f"Unknown block model attribute '{name}'")
+        path = os.path.join(self.path, f"{name}.npy")
+        if not os.path.exists(path):
+            # Attribute added after this store was created: still at its fill value
+            dtype, fill = COLUMN_SPECS[name]
+            return np.full(self.n_blocks, fill, dtype=dtype)
+        return np.load(path, mmap_mode="r")
+
+    def write_columns(self, columns: Dict[str, np.ndarray], base_version: Optional[int] = None):
+        """
+        Replace whole attribute arrays and bump the store version.
+
+        Each array is written to a temporary file and renamed into place,
+        so concurrent readers keep seeing a complete (old or new) column;
+        columns are swapped one at a time, so a reader spanning several
+        columns may see some old and some new. When base_version is given
+        and another write landed since, nothing is written and
+        StoreVersionConflict is raised (the caller's arrays are stale).
+        """
+        with self._lock():
+            meta = self.reload().meta
+            if base_version is not None and meta["version"] != base_version:
+                raise StoreVersionConflict(
+                    f"Block model store changed (version {base_version} -> {meta['version']}) during the update"
+                )
+            for name, values in columns.items():
+                dtype, _ = COLUMN_SPECS[name]
+                values = np.asarray(values, dtype=dtype)
+                if values.shape != (self.n_blocks,):
+                    raise ValueError(f"Column '{name}' must have {self.n_blocks} values")
+                self._write_array(name, values)
+            meta["version"] += 1
+            self._write_meta(meta)
+        return meta["version"]
+
+    def classification_labels(self, codes: np.ndarray) -> np.ndarray:
+        return np.array(CLASSIFICATIONS, dtype=object)[codes]
+
+    # ---------- PostgreSQL sync bookkeeping ----------
+
+    @property
+    def needs_sync(self) -> bool:
+        meta = self.reload().meta
+        return meta["synced_version"] < meta["version"]
+
+    def mark_synced(self, version: int):
+        with self._lock():
+            meta = self.reload().meta
+            meta["synced_version"] = max(meta["synced_version"], int(version))
+            self._write_meta(meta)
+
+    # ---------- estimation record (incremental re-estimation) ----------
+
+    def write_estimation_record(self, record: Dict, sample_xyz: np.ndarray, sample_grades: np.ndarray):
+        """
+        Keep the settings and the exact sample set of the last estimation,
+        so an incremental run can find the samples that changed since.
+        """
+        with self._lock():
+            self._write_array("estimation_sample_xyz", np.asarray(sample_xyz, dtype=np.float64))
+            self._write_array("estimation_sample_grades", np.asarray(sample_grades, dtype=np.float64))
+            final_path = os.path.join(self.path, "estimation.json")
+            with open(final_path + ".tmp", "w") as f:
+                json.dump(record, f)
+            os.replace(final_path + ".tmp", final_path)
+
+    def estimation_record(self):
+        """(record, sample_xyz, sample_grades) of the last estimation, or None"""
+        with self._lock():
+            path = os.path.join(self.path, "estimation.json")
+            if not os.path.exists(path):
+                return None
+            with open(path) as f:
+                record = json.load(f)
+            return (
+                record,
+                np.load(os.path.join(self.path, "estimation_sample_xyz.npy")),
+                np.load(os.path.join(self.path, "estimation_sample_grades.npy"))
+            )
+
+    # ---------- indicator ccdfs (multiple-indicator kriging) ----------
+
+    def write_indicator_ccdf(
+        self, element: str, record: Dict, ccdf: np.ndarray, estimated: np.ndarray, samples: np.ndarray
+    ):
+        """
+        Keep an element's per-cell ccdf codes ((n_blocks, K) uint16), the
+        cells that have one, and the sample grades that define the class
+        distributions, under indicators/<element>/.
+        """
+        folder = os.path.join("indicators", element)
+        with self._lock():
+            os.makedirs(os.path.join(self.path, folder), exist_ok=True)
+            self._write_array(os.path.join(folder, "ccdf"), np.asarray(ccdf, dtype=np.uint16))
+            self._write_array(os.path.join(folder, "estimated"), np.asarray(estimated, dtype=np.bool_))
+            self._write_array(os.path.join(folder, "samples"), np.asarray(samples, dtype=np.float64))
+            final_path = os.path.join(self.path, folder, "indicators.json")
+            with open(final_path + ".tmp", "w") as f:
+                json.dump(record, f)
+            os.replace(final_path + ".tmp", final_path)
+
+    def indicator_ccdf(self, element: str):
+        """(record, ccdf codes, estimated mask, samples) of an element, or None"""
+        folder = os.path.join(self.path, "indicators", element)
+        with self._lock():
+            if not os.path.exists(os.path.join(folder, "indicators.json")):
+                return None
+            with open(os.path.join(folder, "indicators.json")) as f:
+                record = json.load(f)
+            return (
+                record,
+                np.load(os.path.join(folder, "ccdf.npy"), mmap_mode="r"),
+                np.load(os.path.join(folder, "estimated.npy"), mmap_mode="r"),
+                np.load(os.path.join(folder, "samples.npy"))
+            )
+
+    def clear_indicator_ccdf(self, element: str):
+        """Drop an element's ccdfs (its grades were re-estimated another way)"""
+        path = os.path.join(self.path, "indicators", element, "indicators.json")
+        with self._lock():
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ---------- simulation summaries ----------
+
+    def write_simulation(self, simulation_id: str, summary: Dict, arrays: Dict[str, np.ndarray]):
+        """
+        Keep one simulation run's per-cell summaries (e-type mean, variance,
+        exceedance probabilities) and its summary JSON under
+        simulations/<simulation_id>/. Realizations themselves are never stored.
+        """
+        folder = os.path.join("simulations", str(simulation_id))
+        with self._lock():
+            os.makedirs(os.path.join(self.path, folder), exist_ok=True)
+            for name, values in arrays.items():
+                self._write_array(os.path.join(folder, name), np.asarray(values))
+            final_path = os.path.join(self.path, folder, "summary.json")
+            with open(final_path + ".tmp", "w") as f:
+                json.dump(summary, f)
+            os.replace(final_path + ".tmp", final_path)
+
+    def simulations(self) -> List[Dict]:
+        """Summary JSON of every stored simulation run, oldest first"""
+        root = os.path.join(self.path, "simulations")
+        paths = [
+            os.path.join(root, simulation_id, "summary.json")
+            for simulation_id in (os.listdir(root) if os.path.isdir(root) else [])
+        ]
+        summaries = []
+        for path in sorted((p for p in paths if os.path.exists(p)), key=os.path.getmtime):
+            with open(path) as f:
+                summaries.append(json.load(f))
+        return summaries
+
+    def simulation_array(self, simulation_id: str, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, "simulations", str(simulation_id), f"{name}.npy"), mmap_mode="r")
+
+    # ---------- internals ----------
+
+    def lock(self):
+        """
+        Exclusive cross-process lock of the store (not re-entrant): held by
+        every store write and by builders of files derived from the store.
+        """
+        return self._lock()
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_array(self, name: str, values: np.ndarray):
+        final_path = os.path.join(self.path, f"{name}.npy")
+        tmp_path = final_path + ".tmp"
+        mapped = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=values.dtype, shape=values.shape)
+        mapped[...] = values
+        mapped.flush()
+        del mapped
+        os.replace(tmp_path, final_path)
+
+    def _write_meta(self, meta: Dict):
+        final_path = os.path.join(self.path, "meta.json")
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, final_path)
+        self._meta = meta
+
+
+class ColumnUpdate:
+    """
+    Accumulates partial edits to several columns and writes them as one
+    store version.
+
+    Columns are copied from the version current when the update starts;
+    commit raises StoreVersionConflict if another write landed since, so
+    concurrent edits are never silently overwritten. Readers are not
+    isolated from a commit in progress (see write_columns).
+    """
+
+    def __init__(self, store: BlockModelStore):
+        self.store = store
+        self.base_version = store.reload().meta["version"]
+        self.columns: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        """Writable in-memory copy of a column, loaded on first use"""
+        if name not in self.columns:
+            self.columns[name] = np.array(self.store.column(name))
+        return self.columns[name]
+
+    def set(self, name: str, selection: np.ndarray, values):
+        self.column(name)[selection] = values
+
+    def commit(self) -> int:
+        if not self.columns:
+            return self.store.reload().meta["version"]
+        return self.store.write_columns(self.columns, self.base_version)
+
+
+# ==================== SUB-BLOCKING ====================
+
+def _encode_cells(parent, sub, level):
+    n = np.int64(1) << level
+    return ((parent * n + sub[:, 0]) * n + sub[:, 1]) * n + sub[:, 2]
+
+
+def _decode_cells(keys, level):
+    n = np.int64(1) << level
+    sub = np.empty((len(keys), 3), dtype=np.int64)
+    keys, sub[:, 2] = np.divmod(keys, n)
+    keys, sub[:, 1] = np.divmod(keys, n)
+    parent, sub[:, 0] = np.divmod(keys, n)
+    return parent, sub
+
+
+# Child offsets within a split cell
+_OCTANTS = np.array([(a, b, c) for a in (0, 1) for b in (0, 1) for c in (0, 1)], dtype=np.int64)
+
+
+def build_octree(grid: Dict, seeds: np.ndarray, max_level: int) -> Dict[str, np.ndarray]:
+    """
+    Leaf cells of a sub-blocked model refined around seed points.
+
+    Every cell containing a seed is split into 8 children down to max_level;
+    all other parents stay whole. Work and output size are proportional to
+    n_parents + 8 * max_level * (seeded cells). Returns cell_parent,
+    cell_level and cell_sub arrays (see CELL_ARRAYS) sorted by parent.
+    """
+    max_level = int(min(max(max_level, 0), MAX_SUB_BLOCK_LEVEL))
+    shape = (int(grid["nx"]), int(grid["ny"]), int(grid["nz"]))
+    n_parents = shape[0] * shape[1] * shape[2]
+    origin = np.array([grid["x_min"], grid["y_min"], grid["z_min"]], dtype=np.float64)
+    size = np.array([grid["block_size_x"], grid["block_size_y"], grid["block_size_z"]], dtype=np.float64)
+
+    # Seed positions in parent-block units; seeds outside the grid are ignored
+    local = (np.asarray(seeds, dtype=np.float64).reshape(-1, 3) - origin) / size
+    local = local[np.all((local >= 0) & (local < shape), axis=1)]
+    parent_ijk = np.floor(local).astype(np.int64)
+    seed_parent = np.ravel_multi_index(parent_ijk.T, shape)
+    seed_fraction = local - parent_ijk
+
+    def _seeded(level):
+        n = 1 << level
+        sub = np.minimum((seed_fraction * n).astype(np.int64), n - 1)
+        return np.unique(_encode_cells(seed_parent, sub, level))
+
+    split = _seeded(0) if max_level > 0 else np.empty(0, dtype=np.int64)
+    parents = [np.setdiff1d(np.arange(n_parents, dtype=np.int64), split, assume_unique=True)]
+    levels = [np.zeros(len(parents[0]), dtype=np.uint8)]
+    subs = [np.zeros((len(parents[0]), 3), dtype=np.int64)]
+
+    for level in range(1, max_level + 1):
+        parent, sub = _decode_cells(split, level - 1)
+        child_sub = (2 * sub[:, None, :] + _OCTANTS[None, :, :]).reshape(-1, 3)
+        child_keys = _encode_cells(np.repeat(parent, 8), child_sub, level)
+        if level < max_level:
+            split = _seeded(level)
+            child_keys = child_keys[~np.isin(child_keys, split, assume_unique=True)]
+        leaf_parent, leaf_sub = _decode_cells(child_keys, level)
+        parents.append(leaf_parent)
+        levels.append(np.full(len(leaf_parent), level, dtype=np.uint8))
+        subs.append(leaf_sub)
+
+    parent = np.concatenate(parents)
+    level = np.concatenate(levels)
+    sub = np.concatenate(subs)
+    order = np.lexsort((sub[:, 2], sub[:, 1], sub[:, 0], level, parent))
+    return {
+        "cell_parent": parent[order],
+        "cell_level": level[order],
+        "cell_sub": sub[order].astype(np.uint16)
+    }
+
+
+# ==================== AGGREGATIONS ====================
+
+def summarize(
+    store: BlockModelStore,
+    grade_column: str,
+    selection: np.ndarray,
+    group_codes: Optional[np.ndarray] = None
+) -> Dict:
+    """
+    Block count, tonnage, mean grade and contained ounces for selected blocks.
+
+    The mean grade is tonnage-weighted, so sub-blocks count by their size.
+    With group_codes, returns one summary per distinct code (like GROUP BY).
+    Empty groups report None for tonnage/grade/ounces, matching SQL SUM/AVG.
+    """
+    grades = np.asarray(store.column(grade_column))
+    tonnage = store.tonnage()
+
+    def _summary(mask):
+        count = int(np.count_nonzero(mask))
+        if count == 0:
+            return {"block_count": 0, "total_tonnage": None, "avg_grade": None, "total_oz": None}
+        total_tonnage = float(tonnage[mask].sum())
+        metal = float((tonnage[mask] * grades[mask]).sum())
+        return {
+            "block_count": count,
+            "total_tonnage": total_tonnage,
+            "avg_grade": metal / total_tonnage if total_tonnage else float(grades[mask].mean()),
+            "total_oz": metal * OZ_PER_TONNE_GPT
+        }
+
+    if group_codes is None:
+        return _summary(selection)
+    return {
+        int(code): _summary(selection & (group_codes == code))
+        for code in np.unique(group_codes[selection])
+    }
+
+
+# ==================== POSTGRESQL SYNC ====================
+
+def load_from_rows(block_model_id: str, grid: Dict, frame, root: str = None) -> BlockModelStore:
+    """
+    Build a store from block_model_cells rows (a pandas DataFrame with i, j, k
+    and attribute columns). Used to hydrate models created before the store.
+    Sub-blocked models rebuild their cell layout from the sub_* columns.
+    """
+    if grid.get("model_type") == "subblock":
+        parent = np.ravel_multi_index(
+            (frame["i"].to_numpy(), frame["j"].to_numpy(), frame["k"].to_numpy()),
+            (int(grid["nx"]), int(grid["ny"]), int(grid["nz"]))
+        )
+        level = frame["sub_level"].to_numpy(dtype=np.uint8)
+        sub = frame[["sub_i", "sub_j", "sub_k"]].to_numpy(dtype=np.int64)
+        order = np.lexsort((sub[:, 2], sub[:, 1], sub[:, 0], level, parent))
+        cells = {"cell_parent": parent[order], "cell_level": level[order], "cell_sub": sub[order]}
+        store = BlockModelStore.create(block_model_id, grid, root, cells=cells)
+        flat = np.empty(len(order), dtype=np.int64)
+        flat[order] = np.arange(len(order))
+    else:
+        store = BlockModelStore.create(block_model_id, grid, root)
+        flat = store.flat_index(
+            frame["i"].to_numpy(), frame["j"].to_numpy(), frame["k"].to_numpy()
+        )
+    columns = {}
+    for name, (dtype, fill) in COLUMN_SPECS.items():
+        if name not in frame:
+            continue
+        values = np.full(store.n_blocks, fill, dtype=dtype)
+        if name == "classification":
+            codes = frame[name].map(CLASSIFICATION_CODES).fillna(0)
+            values[flat] = codes.to_numpy(dtype=dtype)
+        else:
+            source = frame[name]
+            if np.dtype(dtype).kind != "f":
+                source = source.fillna(fill)
+            values[flat] = source.to_numpy(dtype=dtype)
+        columns[name] = values
+    version = store.write_columns(columns)
+    store.mark_synced(version)
+    return store
+
+
+SYNC_COLUMNS = [name for name in COLUMN_SPECS if name != "is_estimated"]
+
+# block_model_cells natural key of one cell
+CELL_KEY_COLUMNS = ["i", "j", "k", "sub_level", "sub_i", "sub_j", "sub_k"]
+
+
+def sync_to_postgres(
+    conn, store: BlockModelStore, cells: Optional[np.ndarray] = None, since_version: Optional[int] = None
+) -> int:
+    """
+    Upsert the full store into block_model_cells in one transaction.
+
+    cells/since_version sync only the cells written by the single store
+    version after since_version; the full store is synced instead when
+    since_version was never synced or the store has moved on since.
+
+    Columns are streamed with binary COPY into a staging table and applied
+    with one INSERT ... ON CONFLICT (block_model_id, i, j, k, sub_level,
+    sub_i, sub_j, sub_k) DO UPDATE, which both creates missing cells and
+    refreshes existing ones. Regular models sync with sub_* = 0.
+    Serialized per model with an advisory lock; returns the synced version.
+    """
+    meta = store.reload().meta
+    version = meta["version"]
+    if cells is not None and (
+        since_version is None or meta["synced_version"] < since_version or version != since_version + 1
+    ):
+        cells = None
+    ijk = store.block_ijk(cells)
+    sub = store.cell_sub_ijk(cells).astype(np.int32)
+    centroids = store.centroids(cells)
+
+    names = CELL_KEY_COLUMNS + ["centroid_x", "centroid_y", "centroid_z", "volume_m3", "is_estimated"]
+    arrays = [
+        ijk[:, 0], ijk[:, 1], ijk[:, 2],
+        store.cell_levels(cells).astype(np.int32), sub[:, 0], sub[:, 1], sub[:, 2],
+        centroids[:, 0], centroids[:, 1], centroids[:, 2],
+        store.volume(cells),
+        np.asarray(store.column("is_estimated"))[store._cells(cells)]
+    ]
+    for name in SYNC_COLUMNS:
+        values = np.asarray(store.column(name))[store._cells(cells)]
+        if values.dtype == np.uint8:
+            values = values.astype(np.int32)
+        names.append(name)
+        arrays.append(values)
+
+    def _nullable(name):
+        if name == "classification":
+            labels = " ".join(
+                f"WHEN {code} THEN '{label}'" for label, code in CLASSIFICATION_CODES.items()
+            )
+            return f"CASE s.classification {labels} END"
+        if name in ("sample_count", "search_pass"):
+            return f"NULLIF(s.{name}, 0)"
+        return f"NULLIF(s.{name}, 'NaN'::double precision)"
+
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (store.block_model_id,))
+    create_staging_table(cur, "block_store_sync", names, arrays)
+    copy_columns(cur, "block_store_sync", names, arrays)
+    cur.execute("ANALYZE block_store_sync")
+
+    cur.execute(f"""
+        INSERT INTO block_model_cells (
+            block_model_id, {', '.join(CELL_KEY_COLUMNS)},
+            centroid_x, centroid_y, centroid_z,
+            volume_m3, geometry, is_estimated,
+            {', '.join(SYNC_COLUMNS)}
+        )
+        SELECT
+            %s, {', '.join(f's.{name}' for name in CELL_KEY_COLUMNS)},
+            s.centroid_x, s.centroid_y, s.centroid_z,
+            s.volume_m3,
+            ST_SetSRID(ST_MakePoint(s.centroid_x, s.centroid_y, s.centroid_z), 4326),
+            s.is_estimated,
+            {', '.join(_nullable(name) for name in SYNC_COLUMNS)}
+        FROM block_store_sync s
+        ON CONFLICT (block_model_id, {', '.join(CELL_KEY_COLUMNS)}) DO UPDATE SET
+            {', '.join(f'{name} = EXCLUDED.{name}' for name in SYNC_COLUMNS)},
+            is_estimated = EXCLUDED.is_estimated,
+            updated_at = CURRENT_TIMESTAMP
+    """, (store.block_model_id,))
+    conn.commit()
+    cur.close()
+
+    store.mark_synced(version)
+    return version
+
+
+def columns_to_select() -> Iterable[str]:
+    """block_model_cells columns needed to hydrate a store"""
+    return CELL_KEY_COLUMNS + ["is_estimated"] + SYNC_COLUMNS
@@ -0,0 +1,131 @@
+"""
+GeoForge Block Stream
+Compact binary streaming of block model cells for the 3D viewer
+
+The whole filtered model is sent as little-endian column buffers, read
+from the memory-mapped store one storage range at a time, so server
+memory stays bounded regardless of model size and nothing is truncated.
+
+Layout (all integers little-endian uint32, every offset 4-byte aligned):
+
+    b"GFBLK001"                       magic
+    header_length, header JSON        padded with spaces to a multiple of 4
+    repeated chunks:
+        row_count (> 0)
+        one buffer per header column, row_count values each,
+        zero-padded to a multiple of 4 bytes
+    0                                 end of stream
+
+The header lists the columns (name + dtype) in chunk order, the total
+block count, the model origin and parent block size, and the
+classification labels indexed by the classification codes. Positions are
+float32 offsets from the origin so projected coordinates keep their
+precision. Missing grades are NaN.
+"""
+import json
+import struct
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from block_store import BlockModelStore, CLASSIFICATIONS, CLASSIFICATION_CODES
+
+
+MAGIC = b"GFBLK001"
+
+# Cells read from the store per chunk (~30 bytes each on the wire)
+STREAM_CHUNK_ROWS = 262144
+
+
+def _cell_filter(store: BlockModelStore, classification: Optional[str], min_grade: Optional[float]):
+    """Per-range selection matching get_block_model_blocks' filters"""
+    code = CLASSIFICATION_CODES.get(classification) if classification else None
+
+    def _select(start: int, stop: int) -> np.ndarray:
+        keep = np.ones(stop - start, dtype=bool)
+        if classification:
+            keep &= np.asarray(store.column("classification")[start:stop]) == code
+        if min_grade is not None:
+            keep &= np.asarray(store.column("au_grade")[start:stop]) >= min_grade
+        return start + np.flatnonzero(keep)
+
+    return _select
+
+
+def _columns(store: BlockModelStore, grades: List[str]):
+    """(name, dtype) of every streamed column; 4-byte types first"""
+    columns = [("x", "float32"), ("y", "float32"), ("z", "float32")]
+    if store.is_subblocked:
+        columns += [("size_x", "float32"), ("size_y", "float32"), ("size_z", "float32")]
+    columns += [(name, "float32") for name in grades]
+    columns += [("tonnage", "float32"), ("classification", "uint8"), ("is_estimated", "uint8")]
+    if store.is_subblocked:
+        columns.append(("level", "uint8"))
+    return columns
+
+
+def _chunk_values(store: BlockModelStore, cells: np.ndarray, grades: List[str]):
+    offsets = store.centroids(cells) - store.origin
+    values = [offsets[:, 0], offsets[:, 1], offsets[:, 2]]
+    if store.is_subblocked:
+        sizes = store.cell_sizes(cells)
+        values += [sizes[:, 0], sizes[:, 1], sizes[:, 2]]
+    values += [store.column(name)[cells] for name in grades]
+    values += [
+        store.tonnage(cells),
+        store.column("classification")[cells],
+        store.column("is_estimated")[cells]
+    ]
+    if store.is_subblocked:
+        values.append(store.cell_levels(cells))
+    return values
+
+
+def _pad(data: bytes, fill: bytes = b"\0") -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def count_cells(
+    store: BlockModelStore,
+    classification: Optional[str] = None,
+    min_grade: Optional[float] = None,
+    chunk_rows: int = STREAM_CHUNK_ROWS
+) -> int:
+    select = _cell_filter(store, classification, min_grade)
+    return sum(
+        len(select(start, min(start + chunk_rows, store.n_blocks)))
+        for start in range(0, store.n_blocks, chunk_rows)
+    )
+
+
+def stream_cells(
+    store: BlockModelStore,
+    grades: List[str],
+    classification: Optional[str] = None,
+    min_grade: Optional[float] = None,
+    chunk_rows: int = STREAM_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """Yield the binary stream (see module docstring) in storage order"""
+    columns = _columns(store, grades)
+    header = {
+        "n_blocks": count_cells(store, classification, min_grade, chunk_rows),
+        "origin": store.origin.tolist(),
+        "block_size": store.parent_size.tolist(),
+        "subblocked": store.is_subblocked,
+        "columns": [{"name": name, "dtype": dtype} for name, dtype in columns],
+        "classifications": CLASSIFICATIONS
+    }
+    header_bytes = _pad(json.dumps(header).encode(), b" ")
+    yield MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+
+    select = _cell_filter(store, classification, min_grade)
+    for start in range(0, store.n_blocks, chunk_rows):
+        cells = select(start, min(start + chunk_rows, store.n_blocks))
+        if len(cells) == 0:
+            continue
+        parts = [struct.pack("<I", len(cells))]
+        for (_, dtype), values in zip(columns, _chunk_values(store, cells, grades)):
+            parts.append(_pad(np.asarray(values).astype("<" + np.dtype(dtype).str[1:]).tobytes()))
+        yield b"".join(parts)
+
+    yield struct.pack("<I", 0)
@@ -0,0 +1,263 @@
+"""
+GeoForge Downhole Compositing
+Length-weighted composites of assay intervals, persisted per composite set
+
+Methods:
+    fixed_length  equal-length composites over each hole's sampled extent
+    lithology     composites within contiguous geological_units runs
+                  (split to composite_length if given, else one per run)
+    vein          one composite per vein intersection (or composite_length
+                  pieces of it)
+
+Composite grades are exact length-weighted means of the overlapping assay
+intervals, computed for all holes and elements at once from cumulative
+metal/length integrals along the hole: with I(d) the integral up to depth
+d, a composite [a, b) holds I(b) - I(a). Partial samples are split at the
+composite boundary; missing assays do not count towards the length.
+
+A composite set records its parameters and a version that moves on every
+time holes are recomposited. Holes are tracked in composite_set_holes;
+triggers drop a hole's row (and, by cascade, its composites) whenever its
+samples, assays, domains or survey change, so a refresh only recomposites
+those holes.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from bulk_io import copy_frame, copy_query_to_frame
+from desurvey import desurvey, load_hole_geometry
+
+
+COMPOSITE_METHODS = ["fixed_length", "lithology", "vein"]
+COMPOSITE_ELEMENTS = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+
+# Composite sort key spacing: hole_index * _HOLE_KEY + depth
+_HOLE_KEY = 1.0e5
+_EPS = 1.0e-6
+
+
+def _merge_runs(hole: np.ndarray, start: np.ndarray, end: np.ndarray, label: np.ndarray):
+    """Merge touching intervals of the same hole and label (sorted by hole, start)"""
+    new_run = np.r_[True, (hole[1:] != hole[:-1]) | (label[1:] != label[:-1]) | (start[1:] > end[:-1] + _EPS)]
+    first = np.flatnonzero(new_run)
+    return hole[first], start[first], np.maximum.reduceat(end, first), label[first]
+
+
+def split_domains(domain_from: np.ndarray, domain_to: np.ndarray, length: Optional[float]):
+    """
+    Cut domain intervals into pieces of at most `length` metres (the last
+    piece of each domain takes the remainder). Returns (domain, from, to).
+    """
+    extent = np.maximum(domain_to - domain_from, 0.0)
+    if not length:
+        return np.arange(len(extent)), domain_from.copy(), domain_to.copy()
+    n_pieces = np.maximum(np.ceil(extent / length - _EPS), 1).astype(np.int64)
+    domain = np.repeat(np.arange(len(extent)), n_pieces)
+    piece = np.arange(len(domain)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+    piece_from = domain_from[domain] + piece * length
+    piece_to = np.minimum(piece_from + length, domain_to[domain])
+    return domain, piece_from, piece_to
+
+
+def composite_intervals(
+    sample_hole: np.ndarray,
+    sample_from: np.ndarray,
+    sample_to: np.ndarray,
+    grades: np.ndarray,
+    piece_hole: np.ndarray,
+    piece_from: np.ndarray,
+    piece_to: np.ndarray
+):
+    """
+    Length-weighted grades of composite pieces from non-overlapping sample
+    intervals. grades is (n_samples, n_elements) with NaN where not assayed.
+
+    Returns (grade, sampled_length), both (n_pieces, n_elements);
+    grade is NaN where no assayed length falls inside the piece.
+    """
+    grades = np.asarray(grades, dtype=np.float64).reshape(len(sample_hole), -1)
+    order = np.lexsort((sample_from, sample_hole))
+    start = sample_hole[order] * _HOLE_KEY + sample_from[order]
+    length = np.maximum(sample_to[order] - sample_from[order], 0.0)
+    known = np.isfinite(grades[order])
+    rate = np.where(known, grades[order], 0.0)
+
+    # Cumulative integrals at sample starts, with a leading zero row
+    n_elements = grades.shape[1]
+    cumulative_length = np.zeros((len(start) + 1, n_elements))
+    cumulative_metal = np.zeros((len(start) + 1, n_elements))
+    np.cumsum(known * length[:, None], axis=0, out=cumulative_length[1:])
+    np.cumsum(rate * length[:, None], axis=0, out=cumulative_metal[1:])
+    padded_known = np.vstack([np.zeros((1, n_elements)), known])
+    padded_rate = np.vstack([np.zeros((1, n_elements)), rate])
+    padded_start = np.r_[-np.inf, start]
+    padded_length = np.r_[0.0, length]
+
+    def integral(key):
+        # Sample (1-based; 0 = none) starting at or above each key
+        index = np.searchsorted(start, key, side="right")
+        partial = np.clip(key - padded_start[index], 0.0, padded_length[index])[:, None]
+        below = np.maximum(index - 1, 0)
+        return (
+            cumulative_length[below] + padded_known[index] * partial,
+            cumulative_metal[below] + padded_rate[index] * partial
+        )
+
+    top_length, top_metal = integral(piece_hole * _HOLE_KEY + piece_from)
+    bottom_length, bottom_metal = integral(piece_hole * _HOLE_KEY + piece_to)
+    sampled_length = np.maximum(bottom_length - top_length, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grade = np.where(sampled_length > _EPS, (bottom_metal - top_metal) / sampled_length, np.nan)
+    return grade, sampled_length
+
+
+# ==================== DATABASE ====================
+
+def _load_samples(cur, hole_ids: List[str]) -> pd.DataFrame:
+    """Sample intervals with their latest assay"""
+    return copy_query_to_frame(cur, f"""
+        SELECT DISTINCT ON (cs.id)
+            cs.drill_hole_id, cs.from_depth, cs.to_depth,
+            {', '.join('a.' + element for element in COMPOSITE_ELEMENTS)}
+        FROM core_samples cs
+        JOIN assays a ON a.sample_id = cs.id
+        WHERE cs.drill_hole_id = ANY(%s::uuid[])
+          AND cs.to_depth > cs.from_depth
+        ORDER BY cs.id, a.created_at DESC
+    """, (hole_ids,))
+
+
+def _load_domains(cur, method: str, hole_ids: List[str], samples: pd.DataFrame) -> pd.DataFrame:
+    """Domain intervals (drill_hole_id, from_depth, to_depth, domain) for the method"""
+    if method == "lithology":
+        return copy_query_to_frame(cur, """
+            SELECT drill_hole_id, from_depth, to_depth, lithology AS domain
+            FROM geological_units
+            WHERE drill_hole_id = ANY(%s::uuid[])
+              AND to_depth > from_depth
+        """, (hole_ids,))
+    if method == "vein":
+        return copy_query_to_frame(cur, """
+            SELECT drill_hole_id, depth_from_m AS from_depth, depth_to_m AS to_depth,
+                   vein_id::text AS domain
+            FROM vein_intersections
+            WHERE drill_hole_id = ANY(%s::uuid[])
+        """, (hole_ids,))
+    # fixed_length: each hole's sampled extent
+    extent = samples.groupby("drill_hole_id").agg(from_depth=("from_depth", "min"), to_depth=("to_depth", "max"))
+    return extent.reset_index().assign(domain=None)
+
+
+def compute_composites(cur, composite_set: Dict, hole_ids: List[str]) -> pd.DataFrame:
+    """Composites (with desurveyed midpoints) of the given holes for a composite set"""
+    samples = _load_samples(cur, hole_ids)
+    domains = _load_domains(cur, composite_set['method'], hole_ids, samples)
+    columns = ["drill_hole_id", "from_depth", "to_depth", "domain", "coverage",
+               "mid_x", "mid_y", "mid_z"] + COMPOSITE_ELEMENTS
+    if samples.empty or domains.empty:
+        return pd.DataFrame(columns=columns)
+
+    hole_index, collars, stations = load_hole_geometry(cur, hole_ids)
+    hole_names = np.array(sorted(hole_index, key=hole_index.get))
+    sample_hole = samples["drill_hole_id"].astype(str).map(hole_index).to_numpy(dtype=np.int64)
+    domain_hole = domains["drill_hole_id"].astype(str).map(hole_index).to_numpy(dtype=np.int64)
+
+    # Contiguous runs of one domain label form one compositing interval
+    labels = domains["domain"].fillna("").astype(str).to_numpy()
+    order = np.lexsort((domains["from_depth"].to_numpy(), domain_hole))
+    run_hole, run_from, run_to, run_label = _merge_runs(
+        domain_hole[order], domains["from_depth"].to_numpy(dtype=np.float64)[order],
+        domains["to_depth"].to_numpy(dtype=np.float64)[order], labels[order]
+    )
+
+    length = composite_set.get('composite_length')
+    length = float(length) if length else None
+    run, piece_from, piece_to = split_domains(run_from, run_to, length)
+    piece_hole = run_hole[run]
+
+    grade, sampled_length = composite_intervals(
+        sample_hole, samples["from_depth"].to_numpy(dtype=np.float64),
+        samples["to_depth"].to_numpy(dtype=np.float64),
+        samples[COMPOSITE_ELEMENTS].to_numpy(dtype=np.float64),
+        piece_hole, piece_from, piece_to
+    )
+
+    # Composites sampled over less than min_coverage of their length are
+    # dropped (per element: that element's grade is left empty)
+    piece_length = np.maximum(piece_to - piece_from, _EPS)
+    coverage = sampled_length / piece_length[:, None]
+    min_coverage = float(composite_set.get('min_coverage') or 0.0)
+    grade[coverage < min_coverage - _EPS] = np.nan
+    keep = np.isfinite(grade).any(axis=1)
+
+    midpoints = desurvey(
+        collars, stations["hole"], stations["depth"], stations["dip"], stations["azimuth"],
+        piece_hole[keep], ((piece_from + piece_to) / 2.0)[keep]
+    )
+    frame = pd.DataFrame({
+        "drill_hole_id": hole_names[piece_hole[keep]],
+        "from_depth": piece_from[keep],
+        "to_depth": piece_to[keep],
+        "domain": run_label[run][keep],
+        "coverage": coverage.max(axis=1)[keep],
+        "mid_x": midpoints[:, 0],
+        "mid_y": midpoints[:, 1],
+        "mid_z": midpoints[:, 2]
+    })
+    for n, element in enumerate(COMPOSITE_ELEMENTS):
+        frame[element] = grade[keep, n]
+    frame.loc[frame["domain"] == "", "domain"] = None
+    return frame[columns]
+
+
+def refresh_composite_set(conn, composite_set_id: str, force: bool = False) -> Dict:
+    """
+    Recomposite the holes of a composite set that changed since they were
+    last composited (all holes with force=True). Returns the set row plus
+    the number of holes recomposited.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM composite_sets WHERE id = %s FOR UPDATE", (composite_set_id,))
+    composite_set = cur.fetchone()
+    if not composite_set:
+        cur.close()
+        raise LookupError("Composite set not found")
+
+    if force:
+        cur.execute("DELETE FROM composite_set_holes WHERE composite_set_id = %s", (composite_set_id,))
+    cur.execute("""
+        SELECT DISTINCT cs.drill_hole_id
+        FROM core_samples cs
+        JOIN drill_holes dh ON dh.id = cs.drill_hole_id
+        LEFT JOIN composite_set_holes csh
+            ON csh.composite_set_id = %s AND csh.drill_hole_id = cs.drill_hole_id
+        WHERE dh.project_id = %s
+          AND csh.drill_hole_id IS NULL
+    """, (composite_set_id, composite_set['project_id']))
+    stale = [str(row['drill_hole_id']) for row in cur.fetchall()]
+
+    if stale:
+        composites = compute_composites(cur, composite_set, stale)
+        version = int(composite_set['version'] or 0) + 1
+        copy_frame(cur, "composite_set_holes", pd.DataFrame({
+            "composite_set_id": composite_set_id,
+            "drill_hole_id": stale,
+            "version": version
+        }))
+        copy_frame(cur, "composites", composites.assign(composite_set_id=composite_set_id))
+        cur.execute("""
+            UPDATE composite_sets
+            SET version = %s,
+                composites_count = (SELECT COUNT(*) FROM composites WHERE composite_set_id = %s),
+                holes_count = (SELECT COUNT(*) FROM composite_set_holes WHERE composite_set_id = %s),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            RETURNING *
+        """, (version, composite_set_id, composite_set_id, composite_set_id))
+        composite_set = cur.fetchone()
+
+    conn.commit()
+    cur.close()
+    return {**composite_set, "holes_recomposited": len(stale)}
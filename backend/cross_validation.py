@@ -0,0 +1,224 @@
+"""
+GeoForge Cross-Validation
+Leave-one-out and hole-wise k-fold validation of estimation parameters
+
+Every sample is re-estimated from the other samples with the block
+estimation kernel (estimate_chunk), so the search ellipsoid, search passes
+and kriging match what estimate_block_grades would do:
+
+    leave_one_out  one KD-tree over all samples; each sample is dropped
+                   from its own neighbourhood
+    kfold          holes are dealt into k folds; each fold is estimated
+                   from a KD-tree of the other folds, so whole holes are
+                   held out (neighbouring samples of the same hole would
+                   otherwise flatter the errors)
+
+Parameter sets are spread over a process pool. Sample arrays are placed in
+shared memory once; tasks are (parameter set, part of the samples) and each
+worker keeps the KD-tree of the set it is working on.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from estimation import EstimationParams, SharedArrays, estimate_chunk
+
+
+CV_SCHEMES = ["leave_one_out", "kfold"]
+
+# Leave-one-out parts per worker (load balance across parameter sets)
+PARTS_PER_WORKER = 4
+
+
+def hole_folds(holes: np.ndarray, n_folds: int, seed: int = 0) -> np.ndarray:
+    """Fold number of every sample, dealing shuffled holes round-robin into n_folds"""
+    names, hole_index = np.unique(np.asarray(holes).astype(str), return_inverse=True)
+    rank = np.random.default_rng(seed).permutation(len(names))
+    return (rank % max(int(n_folds), 1))[hole_index.ravel()]
+
+
+def _parts(n_samples: int, folds: Optional[np.ndarray], n_parts: int) -> List[np.ndarray]:
+    if folds is not None:
+        return [np.flatnonzero(folds == fold) for fold in np.unique(folds)]
+    return [part for part in np.array_split(np.arange(n_samples), max(n_parts, 1)) if len(part)]
+
+
+def validate_part(
+    sample_xyz: np.ndarray,
+    grades: np.ndarray,
+    params: EstimationParams,
+    targets: np.ndarray,
+    folds: Optional[np.ndarray] = None,
+    cache: Optional[Dict] = None
+):
+    """
+    Estimate the samples `targets` without themselves (leave-one-out) or
+    without their fold (k-fold). Returns (estimate, variance).
+
+    cache (a dict) keeps the search frame and KD-tree between calls with
+    the same params and training samples.
+    """
+    if folds is None:
+        training = None
+        exclude = targets
+    else:
+        training = np.flatnonzero(folds != folds[targets[0]])
+        exclude = None
+
+    key = (id(params), None if folds is None else int(folds[targets[0]]))
+    if cache is None or cache.get("key") != key:
+        train_xyz = sample_xyz if training is None else sample_xyz[training]
+        search_xyz = params.search_ellipsoid().transform(train_xyz)
+        entry = {"key": key, "search_xyz": search_xyz, "tree": cKDTree(search_xyz)}
+        if cache is not None:
+            cache.clear()
+            cache.update(entry)
+    else:
+        entry = cache
+
+    chunk = estimate_chunk(
+        sample_xyz[targets],
+        sample_xyz if training is None else sample_xyz[training],
+        grades if training is None else grades[training],
+        params,
+        tree=entry["tree"],
+        search_xyz=entry["search_xyz"],
+        exclude=exclude
+    )
+    return chunk.estimate, chunk.variance
+
+
+def error_statistics(actual: np.ndarray, estimate: np.ndarray, variance: Optional[np.ndarray] = None) -> Dict:
+    """
+    Cross-validation error summary: bias, MAE, RMSE, correlation and slope
+    of regression of true on estimated values, plus standardized errors
+    (error / kriging standard deviation) when variances are given.
+    """
+    estimated = np.isfinite(estimate)
+    stats = {
+        "samples": int(len(actual)),
+        "estimated": int(np.count_nonzero(estimated)),
+        "coverage": float(np.mean(estimated)) if len(actual) else 0.0
+    }
+    if stats["estimated"] < 2:
+        return stats
+
+    true, predicted = actual[estimated], estimate[estimated]
+    error = predicted - true
+    stats.update({
+        "mean_error": float(np.mean(error)),
+        "mean_absolute_error": float(np.mean(np.abs(error))),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "correlation": float(np.corrcoef(true, predicted)[0, 1]) if np.std(predicted) > 0 else None,
+        "slope_of_regression": float(np.cov(true, predicted)[0, 1] / np.var(predicted, ddof=1))
+        if np.std(predicted) > 0 else None,
+        "mean_actual": float(np.mean(true)),
+        "mean_estimate": float(np.mean(predicted))
+    })
+    if variance is not None:
+        sigma = np.sqrt(variance[estimated])
+        usable = sigma > 0
+        if usable.any():
+            standardized = error[usable] / sigma[usable]
+            stats["mean_standardized_error"] = float(np.mean(standardized))
+            stats["standardized_error_variance"] = float(np.var(standardized))
+    return stats
+
+
+# ==================== PARALLEL SWEEP ====================
+
+# Worker-process state, populated once per process by _init_worker
+_worker_state: Dict[str, object] = {}
+
+
+def _init_worker(specs: dict, param_sets: List[EstimationParams], has_folds: bool, n_parts: int):
+    blocks = {}
+    arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        blocks[name] = block
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    folds = arrays["folds"] if has_folds else None
+    _worker_state.update(
+        blocks=blocks,  # keep mappings alive for the life of the worker
+        arrays=arrays,
+        param_sets=param_sets,
+        folds=folds,
+        parts=_parts(len(arrays["sample_xyz"]), folds, n_parts),
+        cache={}
+    )
+
+
+def _validate_task(task):
+    set_index, part = task
+    arrays = _worker_state["arrays"]
+    targets = _worker_state["parts"][part]
+    estimate, variance = validate_part(
+        arrays["sample_xyz"], arrays["grades"], _worker_state["param_sets"][set_index],
+        targets, _worker_state["folds"], _worker_state["cache"]
+    )
+    return set_index, targets, estimate, variance
+
+
+def cross_validate(
+    sample_xyz: np.ndarray,
+    grades: np.ndarray,
+    param_sets: List[EstimationParams],
+    folds: Optional[np.ndarray] = None,
+    n_workers: int = 1,
+    progress: Optional[Callable[[float], None]] = None
+) -> List[Dict]:
+    """
+    Cross-validate every parameter set (leave-one-out, or k-fold when
+    folds gives each sample's fold). Returns error_statistics per set, in
+    order. n_workers <= 0 uses every available core; results do not depend
+    on the number of workers.
+    """
+    sample_xyz = np.ascontiguousarray(sample_xyz, dtype=np.float64)
+    grades = np.ascontiguousarray(grades, dtype=np.float64)
+    if n_workers <= 0:
+        n_workers = os.cpu_count() or 1
+
+    n_parts = 1 if folds is not None else max(1, -(-n_workers * PARTS_PER_WORKER // len(param_sets)))
+    parts = _parts(len(sample_xyz), folds, n_parts)
+    tasks = [(set_index, part) for set_index in range(len(param_sets)) for part in range(len(parts))]
+    estimates = [np.full(len(sample_xyz), np.nan) for _ in param_sets]
+    variances = [np.full(len(sample_xyz), np.nan) for _ in param_sets]
+
+    def collect(results):
+        for n, (set_index, targets, estimate, variance) in enumerate(results):
+            estimates[set_index][targets] = estimate
+            variances[set_index][targets] = variance
+            if progress:
+                progress((n + 1) / len(tasks))
+
+    if n_workers == 1 or len(tasks) == 1:
+        cache = {}
+        collect(
+            (set_index, parts[part], *validate_part(
+                sample_xyz, grades, param_sets[set_index], parts[part], folds, cache
+            ))
+            for set_index, part in tasks
+        )
+    else:
+        arrays = {"sample_xyz": sample_xyz, "grades": grades}
+        if folds is not None:
+            arrays["folds"] = np.asarray(folds, dtype=np.int32)
+        with SharedArrays(**arrays) as shared:
+            # spawn: never fork a uvicorn worker that may hold threads and DB sockets
+            with ProcessPoolExecutor(
+                max_workers=min(n_workers, len(tasks)),
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(shared.specs, param_sets, folds is not None, n_parts)
+            ) as pool:
+                collect(pool.map(_validate_task, tasks))
+
+    return [
+        error_statistics(grades, estimates[n], variances[n] if params.method != "idw" else None)
+        for n, params in enumerate(param_sets)
+    ]
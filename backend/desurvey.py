@@ -0,0 +1,265 @@
+"""
+GeoForge Desurvey Engine
+3D positions along drill holes from collar and downhole survey records
+
+Each hole is a list of survey stations (measured depth, dip, azimuth):
+the collar orientation at depth 0 plus any drill_hole_surveys rows. The
+trace between stations follows the minimum curvature arc (or the upper
+station's direction with the tangent method) and continues straight
+beyond the last station. Every hole and sample is handled in one set of
+vectorized NumPy operations.
+
+Angles are in degrees; dip is negative downward (-90 = vertical down),
+azimuth clockwise from grid north. Coordinates are easting, northing,
+elevation.
+
+Sample midpoints are cached in sample_coordinates. Triggers on
+drill_holes, drill_hole_surveys and core_samples delete the cached rows
+of any hole whose geometry changes, and ensure_sample_coordinates()
+desurveys only the holes with missing rows.
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from bulk_io import copy_frame, copy_query_to_frame
+
+
+DESURVEY_METHODS = ["minimum_curvature", "tangent"]
+DEFAULT_METHOD = "minimum_curvature"
+
+# Composite sort key spacing: hole_index * _HOLE_KEY + depth (depths < 100 km)
+_HOLE_KEY = 1.0e5
+
+# Doglegs below this (radians) are treated as straight
+_STRAIGHT = 1.0e-9
+
+
+def direction_vectors(dip, azimuth) -> np.ndarray:
+    """(n, 3) unit vectors pointing down-hole"""
+    dip = np.radians(np.asarray(dip, dtype=np.float64))
+    azimuth = np.radians(np.asarray(azimuth, dtype=np.float64))
+    return np.stack([
+        np.cos(dip) * np.sin(azimuth),
+        np.cos(dip) * np.cos(azimuth),
+        np.sin(dip)
+    ], axis=-1)
+
+
+def _dogleg(t1: np.ndarray, t2: np.ndarray) -> np.ndarray:
+    return np.arccos(np.clip(np.sum(t1 * t2, axis=-1), -1.0, 1.0))
+
+
+def _ratio_factor(beta: np.ndarray) -> np.ndarray:
+    """Minimum curvature ratio factor 2/beta * tan(beta/2) (1 for straight segments)"""
+    straight = beta < _STRAIGHT
+    safe = np.where(straight, 1.0, beta)
+    return np.where(straight, 1.0, 2.0 / safe * np.tan(safe / 2.0))
+
+
+def _slerp(t1: np.ndarray, t2: np.ndarray, beta: np.ndarray, fraction: np.ndarray) -> np.ndarray:
+    """Direction a given fraction of the way along the great-circle arc t1 -> t2"""
+    straight = beta < _STRAIGHT
+    safe = np.where(straight, 1.0, beta)
+    w1 = np.where(straight, 1.0 - fraction, np.sin((1.0 - fraction) * safe) / np.sin(safe))
+    w2 = np.where(straight, fraction, np.sin(fraction * safe) / np.sin(safe))
+    t = w1[:, None] * t1 + w2[:, None] * t2
+    return t / np.linalg.norm(t, axis=1, keepdims=True)
+
+
+def _step(t1, t2, length, method):
+    """Displacement over `length` metres from direction t1 arriving at direction t2"""
+    if method == "tangent":
+        return length[:, None] * t1
+    beta = _dogleg(t1, t2)
+    return (length * _ratio_factor(beta) / 2.0)[:, None] * (t1 + t2)
+
+
+def desurvey(
+    collars: np.ndarray,
+    station_hole: np.ndarray,
+    station_depth: np.ndarray,
+    station_dip: np.ndarray,
+    station_azimuth: np.ndarray,
+    point_hole: np.ndarray,
+    point_depth: np.ndarray,
+    method: str = DEFAULT_METHOD
+) -> np.ndarray:
+    """
+    3D positions of points at measured depths along many holes at once.
+
+    collars is (n_holes, 3); station_* describe survey stations and
+    point_* the query points, both with hole indices into collars. Every
+    hole needs at least one station (normally the collar orientation at
+    depth 0). Returns (n_points, 3).
+    """
+    if method not in DESURVEY_METHODS:
+        raise ValueError(f"Unknown desurvey method '{method}'")
+    collars = np.asarray(collars, dtype=np.float64)
+    station_hole = np.asarray(station_hole, dtype=np.int64)
+    point_hole = np.asarray(point_hole, dtype=np.int64)
+    point_depth = np.asarray(point_depth, dtype=np.float64)
+
+    # Stations sorted by (hole, depth)
+    order = np.lexsort((station_depth, station_hole))
+    hole = station_hole[order]
+    depth = np.asarray(station_depth, dtype=np.float64)[order]
+    direction = direction_vectors(np.asarray(station_dip)[order], np.asarray(station_azimuth)[order])
+    if len(np.unique(hole)) != len(collars):
+        raise ValueError("Every hole needs at least one survey station")
+
+    # Station positions: collar + cumulative segment displacements within each hole
+    same_hole = hole[1:] == hole[:-1]
+    steps = np.zeros((len(hole), 3))
+    steps[1:] = np.where(
+        same_hole[:, None],
+        _step(direction[:-1], direction[1:], depth[1:] - depth[:-1], method),
+        0.0
+    )
+    first = np.flatnonzero(np.r_[True, ~same_hole])
+    # The first station may be below the collar: straight from the collar to it
+    steps[first] = depth[first, None] * direction[first]
+    cumulative = np.cumsum(steps, axis=0)
+    offsets = cumulative - np.repeat(cumulative[first] - steps[first], np.diff(np.r_[first, len(hole)]), axis=0)
+    positions = collars[hole] + offsets
+
+    # Station at or above each point (points above the first station use it)
+    keys = hole * _HOLE_KEY + depth
+    upper = np.searchsorted(keys, point_hole * _HOLE_KEY + point_depth, side="right") - 1
+    upper = np.maximum(upper, first[np.searchsorted(hole[first], point_hole)])
+    has_lower = (upper + 1 < len(hole))
+    has_lower[has_lower] = hole[upper[has_lower] + 1] == point_hole[has_lower]
+
+    t1 = direction[upper]
+    length = point_depth - depth[upper]
+    result = positions[upper] + length[:, None] * t1  # straight (below last station / tangent)
+
+    if method == "minimum_curvature" and has_lower.any():
+        seg = upper[has_lower]
+        t2 = direction[seg + 1]
+        beta = _dogleg(t1[has_lower], t2)
+        fraction = length[has_lower] / (depth[seg + 1] - depth[seg])
+        t_point = _slerp(t1[has_lower], t2, beta, fraction)
+        result[has_lower] = positions[seg] + _step(
+            t1[has_lower], t_point, length[has_lower], method
+        )
+    return result
+
+
+# ==================== DATABASE ====================
+
+def load_hole_geometry(cur, hole_ids: Sequence[str]):
+    """
+    Collars and survey stations for the given holes.
+
+    Returns (hole_index {id: n}, collars, station arrays); holes without
+    surveys at depth 0 get their collar dip/azimuth as the first station.
+    """
+    holes = copy_query_to_frame(cur, """
+        SELECT id, easting, northing, elevation, dip, azimuth
+        FROM drill_holes
+        WHERE id = ANY(%s::uuid[])
+    """, (list(hole_ids),))
+    surveys = copy_query_to_frame(cur, """
+        SELECT drill_hole_id, depth_m, dip, azimuth
+        FROM drill_hole_surveys
+        WHERE drill_hole_id = ANY(%s::uuid[])
+    """, (list(hole_ids),))
+
+    hole_index = {str(hole_id): n for n, hole_id in enumerate(holes["id"])}
+    collars = holes[["easting", "northing", "elevation"]].fillna(0.0).to_numpy(dtype=np.float64)
+
+    survey_hole = surveys["drill_hole_id"].astype(str).map(hole_index).to_numpy(dtype=np.int64)
+    surveyed_at_collar = set(survey_hole[surveys["depth_m"].to_numpy() <= 0])
+    collar_station = np.array([n not in surveyed_at_collar for n in range(len(holes))], dtype=bool)
+
+    stations = {
+        "hole": np.r_[np.flatnonzero(collar_station), survey_hole],
+        "depth": np.r_[np.zeros(collar_station.sum()), surveys["depth_m"].to_numpy(dtype=np.float64)],
+        "dip": np.r_[
+            holes["dip"].fillna(-90.0).to_numpy(dtype=np.float64)[collar_station],
+            surveys["dip"].to_numpy(dtype=np.float64)
+        ],
+        "azimuth": np.r_[
+            holes["azimuth"].fillna(0.0).to_numpy(dtype=np.float64)[collar_station],
+            surveys["azimuth"].to_numpy(dtype=np.float64)
+        ]
+    }
+    return hole_index, collars, stations
+
+
+def desurvey_depths(cur, hole_ids: Sequence[str], depths: np.ndarray, method: str = DEFAULT_METHOD) -> np.ndarray:
+    """(n, 3) positions of arbitrary (hole id, measured depth) pairs"""
+    if len(hole_ids) == 0:
+        return np.empty((0, 3))
+    unique_ids = sorted({str(h) for h in hole_ids})
+    hole_index, collars, stations = load_hole_geometry(cur, unique_ids)
+    point_hole = np.array([hole_index[str(h)] for h in hole_ids], dtype=np.int64)
+    return desurvey(
+        collars, stations["hole"], stations["depth"], stations["dip"], stations["azimuth"],
+        point_hole, np.asarray(depths, dtype=np.float64), method
+    )
+
+
+def refresh_sample_coordinates(conn, project_id: str, hole_ids: Optional[Sequence[str]] = None,
+                               method: str = DEFAULT_METHOD) -> Dict:
+    """
+    Desurvey the midpoints of every sample in the given holes (default: all
+    holes of the project) and replace their cached coordinates.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"desurvey:{project_id}",))
+    if hole_ids is None:
+        cur.execute("SELECT id FROM drill_holes WHERE project_id = %s", (project_id,))
+        hole_ids = [str(row['id']) for row in cur.fetchall()]
+    hole_ids = [str(h) for h in hole_ids]
+    if not hole_ids:
+        conn.commit()
+        cur.close()
+        return {"holes": 0, "samples": 0}
+
+    samples = copy_query_to_frame(cur, """
+        SELECT cs.id AS sample_id, cs.drill_hole_id, cs.from_depth, cs.to_depth
+        FROM core_samples cs
+        WHERE cs.drill_hole_id = ANY(%s::uuid[])
+    """, (hole_ids,))
+
+    hole_index, collars, stations = load_hole_geometry(cur, hole_ids)
+    sample_hole = samples["drill_hole_id"].astype(str).map(hole_index).to_numpy(dtype=np.int64)
+    from_depth = samples["from_depth"].to_numpy(dtype=np.float64)
+    to_depth = samples["to_depth"].fillna(samples["from_depth"]).to_numpy(dtype=np.float64)
+    midpoints = desurvey(
+        collars, stations["hole"], stations["depth"], stations["dip"], stations["azimuth"],
+        sample_hole, (from_depth + to_depth) / 2.0, method
+    )
+
+    cur.execute("DELETE FROM sample_coordinates WHERE drill_hole_id = ANY(%s::uuid[])", (hole_ids,))
+    frame = samples.assign(
+        project_id=project_id, mid_x=midpoints[:, 0], mid_y=midpoints[:, 1], mid_z=midpoints[:, 2],
+        to_depth=to_depth, desurvey_method=method
+    )
+    copy_frame(cur, "sample_coordinates", frame[[
+        "sample_id", "drill_hole_id", "project_id", "from_depth", "to_depth",
+        "mid_x", "mid_y", "mid_z", "desurvey_method"
+    ]])
+    conn.commit()
+    cur.close()
+    return {"holes": len(hole_ids), "samples": len(samples)}
+
+
+def ensure_sample_coordinates(conn, project_id: str) -> Dict:
+    """Desurvey only the holes that have samples missing from the cache"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT cs.drill_hole_id
+        FROM core_samples cs
+        JOIN drill_holes dh ON dh.id = cs.drill_hole_id
+        LEFT JOIN sample_coordinates sc ON sc.sample_id = cs.id
+        WHERE dh.project_id = %s
+          AND sc.sample_id IS NULL
+    """, (project_id,))
+    stale = [str(row['drill_hole_id']) for row in cur.fetchall()]
+    cur.close()
+    if not stale:
+        return {"holes": 0, "samples": 0}
+    return refresh_sample_coordinates(conn, project_id, stale)
@@ -0,0 +1,454 @@
+"""
+GeoForge Block Estimation
+Serial and process-parallel grade estimation for block model cells
+
+Samples are searched inside a rotated anisotropic ellipsoid: coordinates
+are transformed into the ellipsoid frame once and searched with an
+ordinary KD-tree. Blocks left unestimated by one search pass are retried
+by the next (larger) pass, so a single run estimates every reachable block.
+
+The block grid is split into spatial slabs along its longest index axis.
+In parallel mode the sample and block arrays are placed in shared memory
+once; worker processes attach to them, build their KD-tree once, and only
+slab bounds are sent per task. Every block is estimated by the same kernel
+in both modes, so parallel results match serial results exactly.
+
+grades may hold one column per element (samples assayed for all of them):
+the neighbour search and kriging systems are then solved once per block
+and the weights applied to every column.
+
+With params.discretization > 1 blocks are kriged for their whole volume
+(block kriging); the discretization and average covariance table are
+built once per block geometry (BlockSupport) and reused by every block.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from multiprocessing import get_context, shared_memory
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geostats import (
+    BlockSupport, KrigingResult, Neighbourhood, SearchEllipsoid, VariogramModel, exclude_neighbours, search_neighbours,
+    idw_estimate, ordinary_kriging
+)
+
+
+# Slabs per worker (more slabs = better load balance on uneven sample density)
+SLABS_PER_WORKER = 4
+
+# Slabs for a serial run that reports progress
+PROGRESS_SLABS = 20
+
+
+@dataclass
+class SearchPass:
+    """One search pass: the search ellipsoid scaled by `scale`, with its own sample limits"""
+    scale: float = 1.0
+    min_samples: int = 3
+    max_samples: int = 12
+
+
+@dataclass
+class EstimationParams:
+    """Search and estimator settings shared by every chunk"""
+    method: str = "ordinary_kriging"  # "ordinary_kriging" or "idw"
+    search_radius: float = 50.0
+    min_samples: int = 3
+    max_samples: int = 12
+    variogram: Optional[VariogramModel] = None
+    ellipsoid: Optional[SearchEllipsoid] = None  # None = sphere of search_radius
+    passes: Optional[List[SearchPass]] = None  # None = one pass with min/max_samples
+    # Multi-element kriging: each grades column's sill. Kriging variances
+    # are scaled by sill / variogram.total_sill (proportional covariances)
+    element_sills: Optional[List[float]] = None
+    # Block kriging: n x n x n discretization points per block (1 = point
+    # kriging at the block centroids)
+    discretization: int = 1
+
+    def search_ellipsoid(self) -> SearchEllipsoid:
+        return self.ellipsoid or SearchEllipsoid(major=self.search_radius)
+
+    def search_passes(self) -> List[SearchPass]:
+        return self.passes or [SearchPass(1.0, self.min_samples, self.max_samples)]
+
+
+@dataclass
+class BlockEstimates:
+    """
+    Per-block estimation outputs, NaN (or 0 count) where not estimated.
+    estimate/variance are (n_blocks, m) for multi-element grades.
+    """
+    estimate: np.ndarray
+    variance: np.ndarray
+    sample_count: np.ndarray
+    search_distance: np.ndarray
+    slope_of_regression: np.ndarray
+    negative_weight_sum: np.ndarray
+    search_pass: np.ndarray
+
+    @classmethod
+    def empty(cls, n_blocks: int, n_elements: Optional[int] = None) -> "BlockEstimates":
+        values = {f.name: np.full(n_blocks, np.nan) for f in fields(cls)}
+        if n_elements is not None:
+            values["estimate"] = np.full((n_blocks, n_elements), np.nan)
+            values["variance"] = np.full((n_blocks, n_elements), np.nan)
+        values["sample_count"] = np.zeros(n_blocks, dtype=np.int32)
+        values["search_pass"] = np.zeros(n_blocks, dtype=np.uint8)
+        return cls(**values)
+
+    @property
+    def estimated(self) -> np.ndarray:
+        return self.sample_count > 0
+
+    def assign(self, selection: np.ndarray, chunk: "BlockEstimates"):
+        """Scatter a chunk's results into this full-model result"""
+        for f in fields(self):
+            getattr(self, f.name)[selection] = getattr(chunk, f.name)
+
+
+def estimate_chunk(
+    block_xyz: np.ndarray,
+    sample_xyz: np.ndarray,
+    grades: np.ndarray,
+    params: EstimationParams,
+    tree: cKDTree = None,
+    search_xyz: np.ndarray = None,
+    exclude: np.ndarray = None,
+    block_size: np.ndarray = None
+) -> BlockEstimates:
+    """
+    Estimate one set of blocks (the kernel used by both serial and parallel modes).
+
+    search_xyz/tree are the samples in the search ellipsoid frame and their
+    KD-tree; both are built here when not supplied. exclude gives, per
+    target, a sample index left out of its neighbourhood (cross-validation).
+    block_size ((n, 3) cell sizes) enables block kriging when
+    params.discretization > 1.
+    """
+    result = BlockEstimates.empty(len(block_xyz), _n_elements(grades))
+    if len(block_xyz) == 0:
+        return result
+
+    ellipsoid = params.search_ellipsoid()
+    if search_xyz is None:
+        search_xyz = ellipsoid.transform(sample_xyz)
+    if tree is None:
+        tree = cKDTree(search_xyz)
+    search_targets = ellipsoid.transform(block_xyz)
+
+    remaining = np.arange(len(block_xyz))
+    for number, search_pass in enumerate(params.search_passes(), start=1):
+        if len(remaining) == 0:
+            break
+        neighbourhood = search_neighbours(
+            search_targets[remaining], search_xyz, ellipsoid.major * search_pass.scale,
+            search_pass.max_samples + (exclude is not None), tree=tree
+        )
+        if exclude is not None:
+            neighbourhood = exclude_neighbours(neighbourhood, exclude[remaining], search_pass.max_samples)
+        estimable = neighbourhood.counts >= search_pass.min_samples
+        if not estimable.any():
+            continue
+
+        selection = remaining[estimable]
+        selected = Neighbourhood(
+            indices=neighbourhood.indices[estimable],
+            distances=neighbourhood.distances[estimable],
+            counts=neighbourhood.counts[estimable],
+            n_samples=neighbourhood.n_samples
+        )
+        _estimate_selected(
+            result, selection, block_xyz[selection], sample_xyz, grades, selected, params, ellipsoid,
+            None if block_size is None else block_size[selection]
+        )
+        result.search_pass[selection] = number
+        remaining = remaining[~estimable]
+
+    return result
+
+
+def _estimate_selected(
+    result: BlockEstimates,
+    selection: np.ndarray,
+    targets: np.ndarray,
+    sample_xyz: np.ndarray,
+    grades: np.ndarray,
+    selected: Neighbourhood,
+    params: EstimationParams,
+    ellipsoid: SearchEllipsoid,
+    block_size: Optional[np.ndarray] = None
+):
+    result.sample_count[selection] = selected.counts
+    if ellipsoid.is_isotropic:
+        distances = selected.distances
+    else:
+        # Search distances are anisotropic; report the true distance
+        points = np.vstack([sample_xyz, np.zeros((1, 3))])[selected.indices]
+        distances = np.linalg.norm(points - targets[:, None, :], axis=-1)
+    result.search_distance[selection] = np.max(np.where(selected.mask, distances, 0.0), axis=1)
+
+    if params.method == "idw":
+        # Inverse anisotropic distance
+        estimates, variances, _ = idw_estimate(grades, selected)
+        result.estimate[selection] = estimates
+        result.variance[selection] = variances
+    else:
+        kriged = _krige(targets, sample_xyz, grades, selected, params, ellipsoid, block_size)
+        result.estimate[selection] = kriged.estimate
+        if np.ndim(grades) == 2:
+            sills = params.element_sills or [params.variogram.total_sill] * grades.shape[1]
+            scale = np.asarray(sills, dtype=np.float64) / params.variogram.total_sill
+            result.variance[selection] = kriged.variance[:, None] * scale
+        else:
+            result.variance[selection] = kriged.variance
+        result.slope_of_regression[selection] = kriged.slope_of_regression
+        result.negative_weight_sum[selection] = kriged.negative_weight_sum
+
+
+# Block supports by (variogram, block size, discretization, reach); sub-blocked
+# models have one geometry per sub-block level
+_block_supports: Dict[tuple, BlockSupport] = {}
+
+
+def block_support(params: EstimationParams, size: np.ndarray, ellipsoid: SearchEllipsoid) -> BlockSupport:
+    """Discretization and average covariances of one block geometry, built once per process"""
+    reach = float(ellipsoid.radii.max() * max(p.scale for p in params.search_passes()))
+    key = (repr(params.variogram.to_dict()), tuple(np.round(size, 9)), params.discretization, reach)
+    if key not in _block_supports:
+        if len(_block_supports) >= 16:
+            _block_supports.clear()
+        _block_supports[key] = BlockSupport(params.variogram, size, params.discretization, reach)
+    return _block_supports[key]
+
+
+def _krige(targets, sample_xyz, grades, selected: Neighbourhood, params: EstimationParams, ellipsoid, block_size):
+    """Point kriging at the targets, or block kriging grouped by block geometry"""
+    if params.discretization <= 1 or block_size is None:
+        return ordinary_kriging(targets, sample_xyz, grades, selected, params.variogram)
+
+    sizes, geometry = np.unique(np.asarray(block_size, dtype=np.float64), axis=0, return_inverse=True)
+    geometry = geometry.ravel()
+    kriged = None
+    for number, size in enumerate(sizes):
+        rows = np.flatnonzero(geometry == number)
+        part = ordinary_kriging(
+            targets[rows], sample_xyz, grades,
+            Neighbourhood(
+                indices=selected.indices[rows], distances=selected.distances[rows],
+                counts=selected.counts[rows], n_samples=selected.n_samples
+            ),
+            params.variogram,
+            support=block_support(params, size, ellipsoid)
+        )
+        if len(sizes) == 1:
+            return part
+        if kriged is None:
+            kriged = KrigingResult(**{
+                f.name: np.full((len(targets),) + getattr(part, f.name).shape[1:], np.nan) for f in fields(part)
+            })
+        for f in fields(part):
+            getattr(kriged, f.name)[rows] = getattr(part, f.name)
+    return kriged
+
+
+def changed_sample_positions(
+    old_xyz: np.ndarray,
+    old_grades: np.ndarray,
+    new_xyz: np.ndarray,
+    new_grades: np.ndarray
+) -> np.ndarray:
+    """
+    Positions of samples added, removed or changed between two sample sets
+    (rows compared on position and every grade, duplicates counted).
+    """
+    old_rows = _row_keys(old_xyz, old_grades)
+    new_rows = _row_keys(new_xyz, new_grades)
+    _, inverse = np.unique(np.concatenate([old_rows, new_rows]), return_inverse=True)
+    inverse = inverse.ravel()
+    n_keys = int(inverse.max()) + 1 if len(inverse) else 0
+    changed = (
+        np.bincount(inverse[:len(old_rows)], minlength=n_keys)
+        != np.bincount(inverse[len(old_rows):], minlength=n_keys)
+    )
+    return np.vstack([
+        np.asarray(old_xyz, dtype=np.float64).reshape(-1, 3)[changed[inverse[:len(old_rows)]]],
+        np.asarray(new_xyz, dtype=np.float64).reshape(-1, 3)[changed[inverse[len(old_rows):]]]
+    ])
+
+
+def _row_keys(xyz: np.ndarray, grades: np.ndarray) -> np.ndarray:
+    rows = np.ascontiguousarray(np.hstack([
+        np.asarray(xyz, dtype=np.float64).reshape(-1, 3),
+        np.asarray(grades, dtype=np.float64).reshape(len(xyz), -1)
+    ]))
+    return rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+
+
+def affected_blocks(block_xyz: np.ndarray, changed_xyz: np.ndarray, params: EstimationParams) -> np.ndarray:
+    """
+    Indices of the blocks whose neighbourhood in any search pass can
+    include one of the changed sample positions (every other block's
+    estimate cannot change).
+    """
+    if len(changed_xyz) == 0 or len(block_xyz) == 0:
+        return np.empty(0, dtype=np.int64)
+    ellipsoid = params.search_ellipsoid()
+    reach = ellipsoid.major * max(p.scale for p in params.search_passes())
+    tree = cKDTree(ellipsoid.transform(changed_xyz))
+    distance, _ = tree.query(
+        ellipsoid.transform(block_xyz), k=1,
+        distance_upper_bound=np.nextafter(reach, np.inf), workers=-1
+    )
+    return np.flatnonzero(np.isfinite(distance))
+
+
+def _n_elements(grades: np.ndarray) -> Optional[int]:
+    return grades.shape[1] if np.ndim(grades) == 2 else None
+
+
+def slab_bounds(block_ijk: np.ndarray, n_slabs: int):
+    """Split the grid into contiguous index slabs along its longest axis"""
+    extents = block_ijk.max(axis=0) - block_ijk.min(axis=0) + 1
+    axis = int(np.argmax(extents))
+    low = int(block_ijk[:, axis].min())
+    edges = np.unique(np.linspace(low, low + extents[axis], n_slabs + 1).astype(int))
+    return [(axis, int(lo), int(hi)) for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+# ==================== SHARED MEMORY ====================
+
+class SharedArrays:
+    """Parent-side owner of NumPy arrays copied into named shared memory blocks"""
+
+    def __init__(self, **arrays: np.ndarray):
+        self._blocks = []
+        self.specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker-process state, populated once per process by _init_worker
+_worker_state: Dict[str, object] = {}
+
+
+def _init_worker(specs: dict, params: EstimationParams):
+    blocks = {}
+    arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        blocks[name] = block
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    search_xyz = params.search_ellipsoid().transform(arrays["sample_xyz"])
+    _worker_state.update(
+        blocks=blocks,  # keep mappings alive for the life of the worker
+        arrays=arrays,
+        params=params,
+        search_xyz=search_xyz,
+        tree=cKDTree(search_xyz)
+    )
+
+
+def _estimate_slab(bounds):
+    axis, lo, hi = bounds
+    arrays = _worker_state["arrays"]
+    axis_index = arrays["block_ijk"][:, axis]
+    selection = np.flatnonzero((axis_index >= lo) & (axis_index < hi))
+    chunk = estimate_chunk(
+        arrays["block_xyz"][selection],
+        arrays["sample_xyz"],
+        arrays["grades"],
+        _worker_state["params"],
+        tree=_worker_state["tree"],
+        search_xyz=_worker_state["search_xyz"],
+        block_size=arrays["block_size"][selection] if "block_size" in arrays else None
+    )
+    return selection, chunk
+
+
+def estimate_blocks(
+    block_xyz: np.ndarray,
+    block_ijk: np.ndarray,
+    sample_xyz: np.ndarray,
+    grades: np.ndarray,
+    params: EstimationParams,
+    n_workers: int = 1,
+    progress: Optional[Callable[[float], None]] = None,
+    block_size: Optional[np.ndarray] = None
+) -> BlockEstimates:
+    """
+    Estimate every block, serially or across a process pool of spatial slabs.
+
+    block_size ((n, 3) cell sizes) is needed for block kriging
+    (params.discretization > 1). n_workers <= 0 uses every available core. progress, if given, is called
+    with the completed fraction after each slab (an exception raised by it,
+    e.g. a job cancellation, stops the run).
+    """
+    block_xyz = np.asarray(block_xyz, dtype=np.float64)
+    sample_xyz = np.asarray(sample_xyz, dtype=np.float64)
+    grades = np.asarray(grades, dtype=np.float64)
+
+    if n_workers <= 0:
+        n_workers = os.cpu_count() or 1
+    if len(block_xyz) == 0 or (n_workers == 1 and progress is None):
+        return estimate_chunk(block_xyz, sample_xyz, grades, params, block_size=block_size)
+
+    result = BlockEstimates.empty(len(block_xyz), _n_elements(grades))
+
+    if n_workers == 1:
+        # Same kernel slab by slab, so progress can be reported
+        search_xyz = params.search_ellipsoid().transform(sample_xyz)
+        tree = cKDTree(search_xyz)
+        slabs = slab_bounds(np.asarray(block_ijk), PROGRESS_SLABS)
+        for n, (axis, lo, hi) in enumerate(slabs):
+            axis_index = np.asarray(block_ijk)[:, axis]
+            selection = np.flatnonzero((axis_index >= lo) & (axis_index < hi))
+            result.assign(selection, estimate_chunk(
+                block_xyz[selection], sample_xyz, grades, params, tree=tree, search_xyz=search_xyz,
+                block_size=None if block_size is None else block_size[selection]
+            ))
+            progress((n + 1) / len(slabs))
+        return result
+
+    slabs = slab_bounds(np.asarray(block_ijk), n_workers * SLABS_PER_WORKER)
+
+    arrays = dict(
+        block_xyz=block_xyz,
+        block_ijk=np.asarray(block_ijk, dtype=np.int32),
+        sample_xyz=sample_xyz,
+        grades=grades
+    )
+    if block_size is not None:
+        arrays["block_size"] = np.asarray(block_size, dtype=np.float64)
+    with SharedArrays(**arrays) as shared:
+        # spawn: never fork a uvicorn worker that may hold threads and DB sockets
+        with ProcessPoolExecutor(
+            max_workers=min(n_workers, len(slabs)),
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(shared.specs, params)
+        ) as pool:
+            for n, (selection, chunk) in enumerate(pool.map(_estimate_slab, slabs)):
+                result.assign(selection, chunk)
+                if progress:
+                    progress((n + 1) / len(slabs))
+
+    return result
@@ -0,0 +1,795 @@
+"""
+GeoForge Geostatistics Engine
+Vectorized neighbourhood search and grade estimation kernels
+
+Pure NumPy/SciPy functions with no database access, shared by the
+block model and section-grade endpoints in main.py.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+# Blocks queried per KD-tree call (bounds temporary memory on large models)
+QUERY_CHUNK_SIZE = 200000
+
+
+@dataclass
+class Neighbourhood:
+    """
+    Neighbour sets for a batch of target locations.
+
+    indices/distances are (n_targets, max_samples), closest first. Unused
+    slots are padded with index == n_samples and distance == inf.
+    """
+    indices: np.ndarray
+    distances: np.ndarray
+    counts: np.ndarray
+    n_samples: int
+
+    @property
+    def mask(self) -> np.ndarray:
+        """Boolean (n_targets, max_samples) mask of real neighbours"""
+        return self.indices < self.n_samples
+
+
+def search_neighbours(
+    targets: np.ndarray,
+    samples: np.ndarray,
+    search_radius: float,
+    max_samples: int,
+    tree: cKDTree = None
+) -> Neighbourhood:
+    """
+    Find up to max_samples closest samples within search_radius of every target.
+
+    Uses one batched cKDTree query instead of a full distance row + argsort
+    per target. Samples at exactly search_radius are included.
+    """
+    targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+    samples = np.atleast_2d(np.asarray(samples, dtype=np.float64))
+    n_samples = len(samples)
+    k = max(1, min(int(max_samples), n_samples))
+
+    if tree is None:
+        tree = cKDTree(samples)
+
+    # cKDTree excludes points at exactly the bound; nudge it so d <= radius is kept
+    upper_bound = np.nextafter(float(search_radius), np.inf)
+
+    indices = np.full((len(targets), k), n_samples, dtype=np.int64)
+    distances = np.full((len(targets), k), np.inf)
+    for start in range(0, len(targets), QUERY_CHUNK_SIZE):
+        stop = start + QUERY_CHUNK_SIZE
+        dist, idx = tree.query(
+            targets[start:stop], k=k, distance_upper_bound=upper_bound, workers=-1
+        )
+        indices[start:stop] = np.asarray(idx).reshape(-1, k)
+        distances[start:stop] = np.asarray(dist).reshape(-1, k)
+
+    counts = np.sum(indices < n_samples, axis=1)
+    return Neighbourhood(indices=indices, distances=distances, counts=counts, n_samples=n_samples)
+
+
+def exclude_neighbours(neighbourhood: Neighbourhood, excluded: np.ndarray, max_samples: int) -> Neighbourhood:
+    """
+    Drop one sample from each target's neighbours (e.g. the target itself
+    for leave-one-out) and keep the closest max_samples of the rest.
+    """
+    n_samples = neighbourhood.n_samples
+    keep = neighbourhood.indices != np.asarray(excluded)[:, None]
+    order = np.argsort(~keep, axis=1, kind="stable")
+    indices = np.take_along_axis(np.where(keep, neighbourhood.indices, n_samples), order, axis=1)[:, :max_samples]
+    distances = np.take_along_axis(np.where(keep, neighbourhood.distances, np.inf), order, axis=1)[:, :max_samples]
+    return Neighbourhood(
+        indices=indices, distances=distances, counts=np.sum(indices < n_samples, axis=1), n_samples=n_samples
+    )
+
+
+def gather(values: np.ndarray, neighbourhood: Neighbourhood, fill: float = 0.0) -> np.ndarray:
+    """
+    Gather per-sample values into the (n_targets, max_samples) neighbour
+    layout; (n_samples, m) values give (n_targets, max_samples, m).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    padded = np.concatenate([values, np.full((1,) + values.shape[1:], fill)])
+    return padded[neighbourhood.indices]
+
+
+@dataclass
+class SearchEllipsoid:
+    """
+    Rotated anisotropic search volume: radii along the major, semi-major
+    and minor axes of (azimuth, dip, rake), same conventions as variogram
+    anisotropy.
+
+    transform() maps coordinates into a frame where the ellipsoid is a
+    sphere of radius `major`, so an ordinary KD-tree radius search finds
+    exactly the samples inside the ellipsoid and distances there are
+    anisotropic distances in metres along the major axis.
+    """
+    major: float = 50.0
+    semi: Optional[float] = None
+    minor: Optional[float] = None
+    azimuth: float = 0.0
+    dip: float = 0.0
+    rake: float = 0.0
+
+    @property
+    def radii(self) -> np.ndarray:
+        return np.array([self.major, self.semi or self.major, self.minor or self.major], dtype=np.float64)
+
+    @property
+    def is_isotropic(self) -> bool:
+        return bool(np.all(self.radii == self.major))
+
+    def transform(self, coords: np.ndarray) -> np.ndarray:
+        coords = np.asarray(coords, dtype=np.float64)
+        if self.is_isotropic:
+            return coords
+        scale = self.major / self.radii
+        return coords @ (rotation_matrix(self.azimuth, self.dip, self.rake).T * scale)
+
+
+def idw_estimate(grades: np.ndarray, neighbourhood: Neighbourhood, power: float = 2.0):
+    """
+    Inverse distance weighted estimate for every target at once.
+
+    grades may be (n_samples, m) to estimate m elements with the same
+    weights. Returns (estimate, neighbour variance, furthest neighbour
+    distance), NaN where a target has no neighbours.
+    """
+    mask = neighbourhood.mask
+    distances = np.where(mask, neighbourhood.distances, 0.0)
+    values = gather(grades, neighbourhood)
+
+    weights = np.where(mask, 1.0 / (distances ** power + 1e-10), 0.0)
+    weight_sum = weights.sum(axis=1)
+    if values.ndim == 3:
+        # One column per element: broadcast the shared weights
+        weights, mask, weight_sum = weights[:, :, None], mask[:, :, None], weight_sum[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        estimate = (weights * values).sum(axis=1) / weight_sum
+        counts = neighbourhood.counts.reshape((-1,) + (1,) * (values.ndim - 2))
+        mean = np.where(mask, values, 0.0).sum(axis=1) / counts
+        variance = np.where(mask, (values - mean[:, None]) ** 2, 0.0).sum(axis=1) / counts
+
+    max_distance = np.where(neighbourhood.counts > 0, distances.max(axis=1), np.nan)
+    return estimate, variance, max_distance
+
+
+# ==================== VARIOGRAMS ====================
+
+VARIOGRAM_TYPES = ["spherical", "exponential", "gaussian"]
+
+
+def rotation_matrix(azimuth: float = 0.0, dip: float = 0.0, rake: float = 0.0) -> np.ndarray:
+    """
+    Rows are the major, semi-major and minor axes as world unit vectors.
+
+    The major axis points along azimuth (degrees clockwise from north) and
+    dip (degrees, negative downward, as for drill holes); rake turns the
+    semi-major axis about the major axis from the horizontal.
+    """
+    az, dp, rk = np.radians([azimuth, dip, rake])
+    major = np.array([np.cos(dp) * np.sin(az), np.cos(dp) * np.cos(az), np.sin(dp)])
+    horizontal = np.array([np.cos(az), -np.sin(az), 0.0])
+    vertical = np.cross(horizontal, major)
+    semi = np.cos(rk) * horizontal + np.sin(rk) * vertical
+    minor = np.cross(major, semi)
+    return np.vstack([major, semi, minor])
+
+
+@dataclass
+class VariogramStructure:
+    """
+    One nested structure: a unit-sill shape scaled by sill, with practical
+    ranges along the major, semi-major and minor axes (semi/minor default
+    to the major range, i.e. isotropic).
+    """
+    model_type: str = "spherical"
+    sill: float = 1.0
+    range: float = 100.0
+    range_semi: Optional[float] = None
+    range_minor: Optional[float] = None
+
+    @property
+    def ranges(self) -> np.ndarray:
+        return np.array([
+            self.range,
+            self.range_semi or self.range,
+            self.range_minor or self.range
+        ], dtype=np.float64)
+
+    def to_dict(self) -> dict:
+        return {
+            "model_type": self.model_type,
+            "sill": float(self.sill),
+            "range": float(self.range),
+            "range_semi": float(self.ranges[1]),
+            "range_minor": float(self.ranges[2])
+        }
+
+
+@dataclass
+class VariogramModel:
+    """
+    Nugget plus nested structures sharing one anisotropy orientation.
+
+    Total sill = nugget + sum of structure sills. gamma(h) takes scalar
+    distances along the major axis; gamma_vectors() takes lag vectors and
+    applies each structure's anisotropy.
+    """
+    nugget: float = 0.0
+    structures: List[VariogramStructure] = field(default_factory=lambda: [VariogramStructure()])
+    azimuth: float = 0.0
+    dip: float = 0.0
+    rake: float = 0.0
+
+    @classmethod
+    def isotropic(cls, model_type: str = "spherical", nugget: float = 0.0,
+                  sill: float = 1.0, range: float = 100.0) -> "VariogramModel":
+        return cls(nugget=nugget, structures=[VariogramStructure(model_type, sill, range)])
+
+    @property
+    def total_sill(self) -> float:
+        return self.nugget + sum(s.sill for s in self.structures)
+
+    @property
+    def is_isotropic(self) -> bool:
+        return all(np.all(s.ranges == s.range) for s in self.structures)
+
+    @property
+    def max_range(self) -> float:
+        return max(float(s.ranges.max()) for s in self.structures)
+
+    def gamma(self, h: np.ndarray) -> np.ndarray:
+        """Semivariance at lag distance h along the major axis (gamma(0) = 0)"""
+        h = np.asarray(h, dtype=np.float64)
+        structure = sum(s.sill * _structure_gamma(s.model_type, h, s.range) for s in self.structures)
+        return np.where(h > 0, self.nugget + structure, 0.0)
+
+    def gamma_vectors(self, lag: np.ndarray) -> np.ndarray:
+        """Semivariance for lag vectors (..., 3) in world coordinates"""
+        lag = np.asarray(lag, dtype=np.float64)
+        if self.is_isotropic:
+            return self.gamma(np.linalg.norm(lag, axis=-1))
+        local = lag @ rotation_matrix(self.azimuth, self.dip, self.rake).T
+        total = np.zeros(lag.shape[:-1])
+        for s in self.structures:
+            h = np.linalg.norm(local / s.ranges, axis=-1)
+            total += s.sill * _structure_gamma(s.model_type, h, 1.0)
+        return np.where(np.any(lag != 0, axis=-1), self.nugget + total, 0.0)
+
+    def covariance(self, h: np.ndarray) -> np.ndarray:
+        """Covariance C(h) = total sill - gamma(h)"""
+        return self.total_sill - self.gamma(h)
+
+    def covariance_vectors(self, lag: np.ndarray) -> np.ndarray:
+        return self.total_sill - self.gamma_vectors(lag)
+
+    def scaled(self, factor: float) -> "VariogramModel":
+        """Same shape and anisotropy with every sill multiplied by factor"""
+        return VariogramModel(
+            nugget=self.nugget * factor,
+            structures=[
+                VariogramStructure(s.model_type, s.sill * factor, s.range, s.range_semi, s.range_minor)
+                for s in self.structures
+            ],
+            azimuth=self.azimuth, dip=self.dip, rake=self.rake
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "nugget": float(self.nugget),
+            "structures": [s.to_dict() for s in self.structures],
+            "azimuth": float(self.azimuth),
+            "dip": float(self.dip),
+            "rake": float(self.rake),
+            "total_sill": float(self.total_sill)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VariogramModel":
+        structures = [
+            VariogramStructure(
+                model_type=s.get("model_type", "spherical"),
+                sill=float(s["sill"]),
+                range=float(s["range"]),
+                range_semi=s.get("range_semi"),
+                range_minor=s.get("range_minor")
+            )
+            for s in data["structures"]
+        ]
+        for s in structures:
+            _structure_gamma(s.model_type, np.zeros(1), s.range)  # validates the type
+        return cls(
+            nugget=float(data.get("nugget") or 0.0),
+            structures=structures,
+            azimuth=float(data.get("azimuth") or 0.0),
+            dip=float(data.get("dip") or 0.0),
+            rake=float(data.get("rake") or 0.0)
+        )
+
+
+def _structure_gamma(model_type: str, h: np.ndarray, a: float) -> np.ndarray:
+    """Unit-sill structure value at lag h for practical range a"""
+    a = max(float(a), 1e-9)
+    if model_type == "spherical":
+        r = np.minimum(h / a, 1.0)
+        return 1.5 * r - 0.5 * r ** 3
+    if model_type == "exponential":
+        return 1.0 - np.exp(-3.0 * h / a)
+    if model_type == "gaussian":
+        return 1.0 - np.exp(-3.0 * (h / a) ** 2)
+    raise ValueError(f"Unknown variogram model '{model_type}'. Must be one of: {', '.join(VARIOGRAM_TYPES)}")
+
+
+def variogram_pairs(
+    coords: np.ndarray,
+    max_lag: float,
+    max_pairs: int = 1000000,
+    seed: int = 0
+):
+    """
+    Sample pairs closer than max_lag, found with a KD-tree.
+
+    All pairs are used when there are at most max_pairs of them; otherwise
+    a random subset of anchor samples is paired with every sample within
+    max_lag of it, so short lags stay fully represented (unlike uniformly
+    random pairs, which are mostly long-range). Returns (first, second).
+    """
+    n = len(coords)
+    tree = cKDTree(coords)
+    rng = np.random.default_rng(seed)
+
+    # Expected neighbours per sample, from a small probe
+    probe = rng.choice(n, size=min(n, 500), replace=False)
+    mean_neighbours = max(float(np.mean(tree.query_ball_point(coords[probe], max_lag, return_length=True))) - 1, 1.0)
+    n_anchors = int(min(n, max(1, max_pairs / mean_neighbours)))
+
+    if n_anchors >= n:
+        pairs = tree.query_pairs(max_lag, output_type="ndarray")
+        return pairs[:, 0], pairs[:, 1]
+
+    anchors = np.sort(rng.choice(n, size=n_anchors, replace=False))
+    matches = cKDTree(coords[anchors]).sparse_distance_matrix(tree, max_lag, output_type="ndarray")
+    first = anchors[matches["i"]]
+    second = matches["j"].astype(np.int64)
+    # Drop self pairs; anchor-anchor pairs are kept once
+    is_anchor = np.zeros(n, dtype=bool)
+    is_anchor[anchors] = True
+    keep = (first != second) & (~is_anchor[second] | (second > first))
+    return first[keep], second[keep]
+
+
+def experimental_variogram(
+    coords: np.ndarray,
+    values: np.ndarray,
+    n_lags: int = 15,
+    max_lag: float = None,
+    max_pairs: int = 1000000,
+    seed: int = 0,
+    direction: Optional[Sequence[float]] = None,
+    tolerance: float = 22.5,
+    bandwidth: Optional[float] = None
+):
+    """
+    Binned experimental semivariogram from KD-tree pairs within max_lag.
+
+    direction = (azimuth, dip) restricts pairs to lag vectors within
+    `tolerance` degrees of that direction (either sense) and, if given,
+    within `bandwidth` metres of its axis. Returns (lag centres,
+    semivariance, pair counts) for non-empty bins.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if max_lag is None:
+        extent = coords.max(axis=0) - coords.min(axis=0)
+        max_lag = float(np.linalg.norm(extent)) / 2.0
+    max_lag = max(float(max_lag), 1e-9)
+
+    first, second = variogram_pairs(coords, max_lag, max_pairs, seed)
+    lag = coords[second] - coords[first]
+    h = np.linalg.norm(lag, axis=1)
+    sq_diff = 0.5 * (values[first] - values[second]) ** 2
+
+    if direction is not None:
+        axis = rotation_matrix(direction[0], direction[1])[0]
+        along = np.abs(lag @ axis)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            in_cone = along >= np.cos(np.radians(tolerance)) * h
+        if bandwidth is not None:
+            in_cone &= np.sqrt(np.maximum(h ** 2 - along ** 2, 0.0)) <= bandwidth
+        in_cone &= h > 0
+        h, sq_diff = h[in_cone], sq_diff[in_cone]
+
+    return _bin_semivariance(h, sq_diff, n_lags, max_lag)
+
+
+def _bin_semivariance(h: np.ndarray, sq_diff: np.ndarray, n_lags: int, max_lag: float):
+    """Average half squared differences into equal-width lag bins"""
+    edges = np.linspace(0.0, max_lag, n_lags + 1)
+    bins = np.digitize(h, edges) - 1
+    in_range = (bins >= 0) & (bins < n_lags)
+    counts = np.bincount(bins[in_range], minlength=n_lags)
+    sums = np.bincount(bins[in_range], weights=sq_diff[in_range], minlength=n_lags)
+    lag_sums = np.bincount(bins[in_range], weights=h[in_range], minlength=n_lags)
+    populated = counts > 0
+    return (
+        lag_sums[populated] / counts[populated],
+        sums[populated] / counts[populated],
+        counts[populated]
+    )
+
+
+def fit_variogram(
+    lags,
+    semivariance,
+    counts,
+    model_type="spherical",
+    azimuth: float = 0.0,
+    dip: float = 0.0,
+    rake: float = 0.0
+) -> VariogramModel:
+    """
+    Pair-count weighted least-squares fit of a nugget plus nested structures.
+
+    model_type is one structure type or a list of them (nested, shortest
+    range first). For an anisotropic fit pass lags/semivariance/counts as
+    lists of three experimental variograms along the major, semi-major and
+    minor axes of (azimuth, dip, rake): sills are shared across directions
+    and each structure gets its own range per axis.
+    """
+    from scipy.optimize import curve_fit
+
+    types = [model_type] if isinstance(model_type, str) else list(model_type)
+    for structure_type in types:
+        _structure_gamma(structure_type, np.zeros(1), 1.0)
+    directional = len(lags) == 3 and np.ndim(lags[0]) == 1 and not np.isscalar(lags[0])
+    if not directional:
+        lags, semivariance, counts = [lags], [semivariance], [counts]
+    n_axes = len(lags)
+
+    lag_arrays = [np.asarray(l, dtype=np.float64) for l in lags]
+    axis_of = np.concatenate([np.full(len(l), a) for a, l in enumerate(lag_arrays)]).astype(int)
+    all_lags = np.concatenate(lag_arrays) if lag_arrays else np.empty(0)
+    all_gamma = np.concatenate([np.asarray(g, dtype=np.float64) for g in semivariance])
+    all_counts = np.concatenate([np.asarray(c, dtype=np.float64) for c in counts])
+
+    variance = float(np.max(all_gamma)) if len(all_gamma) else 1.0
+    variance = max(variance, 1e-12)
+    axis_max = [float(np.max(l)) if len(l) else 100.0 for l in lag_arrays]
+    max_lag = max(axis_max)
+    n_types = len(types)
+
+    # Parameters: nugget, then per structure sill and one range per axis
+    def unpack(params):
+        nugget = params[0]
+        sills = params[1:1 + n_types]
+        ranges = np.reshape(params[1 + n_types:], (n_types, n_axes))
+        return nugget, sills, ranges
+
+    def model(h, *params):
+        nugget, sills, ranges = unpack(params)
+        total = np.full(len(h), nugget)
+        for t, structure_type in enumerate(types):
+            total += sills[t] * _structure_gamma(structure_type, h / ranges[t][axis_of], 1.0)
+        return total
+
+    p0 = [0.1 * variance] + [0.9 * variance / n_types] * n_types
+    for t in range(n_types):
+        # Nested structures start at increasing fractions of the lag range
+        p0 += [(t + 1) / (n_types + 1) * axis_max[a] for a in range(n_axes)]
+    lower = [0.0] * (1 + n_types) + [1e-6] * (n_types * n_axes)
+    upper = [variance * 2] * (1 + n_types) + [max_lag * 2] * (n_types * n_axes)
+
+    try:
+        if len(all_lags) < len(p0):
+            raise ValueError("Too few lags to fit")
+        params, _ = curve_fit(
+            model, all_lags, all_gamma,
+            p0=p0, bounds=(lower, upper),
+            sigma=1.0 / np.sqrt(np.maximum(all_counts, 1)),
+            maxfev=10000
+        )
+        nugget, sills, ranges = unpack(params)
+    except (RuntimeError, ValueError):
+        nugget, sills, ranges = unpack(np.array(p0))
+        nugget, sills = 0.0, np.full(n_types, variance / n_types)
+
+    # Ranges of nested structures ordered shortest first; a flat variogram
+    # still needs a positive definite covariance
+    order = np.argsort(ranges[:, 0], kind="stable")
+    structures = []
+    for t in order:
+        axis_ranges = [float(r) for r in ranges[t]]
+        structures.append(VariogramStructure(
+            model_type=types[t],
+            sill=max(float(sills[t]), 1e-6 * variance / n_types),
+            range=axis_ranges[0],
+            range_semi=axis_ranges[1] if n_axes == 3 else None,
+            range_minor=axis_ranges[2] if n_axes == 3 else None
+        ))
+    return VariogramModel(
+        nugget=float(nugget), structures=structures,
+        azimuth=azimuth if n_axes == 3 else 0.0,
+        dip=dip if n_axes == 3 else 0.0,
+        rake=rake if n_axes == 3 else 0.0
+    )
+
+
+# ==================== ORDINARY KRIGING ====================
+
+# Targets solved per batched np.linalg.solve call
+KRIGING_BATCH_SIZE = 20000
+
+# Largest half-width of a block support table, in discretization steps per axis
+MAX_SUPPORT_TABLE_STEPS = 80
+
+
+def _continuous_covariance(variogram: VariogramModel, lag: np.ndarray) -> np.ndarray:
+    """Covariance without the nugget spike at lag 0 (the limit of C(h) as h -> 0)"""
+    return np.where(
+        np.all(lag == 0, axis=-1), variogram.total_sill - variogram.nugget, variogram.covariance_vectors(lag)
+    )
+
+
+class BlockSupport:
+    """
+    Average covariances for blocks of one geometry (size) discretized into
+    n x n x n points, for block kriging.
+
+    within is the mean covariance between all pairs of discretization
+    points, C(V, V), with coincident points taking the continuous limit
+    (no nugget) as everywhere below. average(h) is the mean covariance
+    between the points and a sample at lag h from the block centroid,
+    C(V, x). The latter only depends on h, so it is tabulated once per
+    geometry: point covariances on a lattice with the discretization
+    spacing, box-filtered n wide along each axis, are exact block averages
+    at the lattice nodes; lags between nodes are interpolated trilinearly
+    and lags beyond the table (reach or the variogram range) are averaged
+    directly.
+    """
+
+    def __init__(self, variogram: VariogramModel, size: Sequence[float], n: int = 4, reach: Optional[float] = None):
+        self.variogram = variogram
+        self.size = np.asarray(size, dtype=np.float64)
+        self.n = int(n)
+        self.step = self.size / self.n
+        centres = np.arange(self.n) + 0.5 - self.n / 2
+        self.offsets = np.stack(np.meshgrid(centres, centres, centres, indexing="ij"), axis=-1).reshape(-1, 3) * self.step
+        self.within = float(np.mean(
+            _continuous_covariance(variogram, self.offsets[:, None, :] - self.offsets[None, :, :])
+        ))
+
+        extent = variogram.max_range + 0.5 * float(np.linalg.norm(self.size))
+        if reach is not None:
+            extent = min(extent, float(reach))
+        self.half = np.minimum(np.ceil(extent / self.step), MAX_SUPPORT_TABLE_STEPS).astype(int)
+
+        # Point covariances at m - d for every table node m and discretization
+        # offset d, then the mean over the n offsets along each axis
+        axes = [(np.arange(2 * h + self.n) - h - (self.n - 1) / 2) * s for h, s in zip(self.half, self.step)]
+        table = np.empty([len(a) for a in axes])
+        for i, x in enumerate(axes[0]):
+            lag = np.stack(np.meshgrid([x], axes[1], axes[2], indexing="ij"), axis=-1)[0]
+            table[i] = _continuous_covariance(variogram, lag)
+        for axis in range(3):
+            cumulative = np.cumsum(table, axis=axis)
+            cumulative = np.concatenate([np.zeros_like(np.take(cumulative, [0], axis=axis)), cumulative], axis=axis)
+            size = cumulative.shape[axis]
+            table = (np.take(cumulative, np.arange(self.n, size), axis=axis)
+                     - np.take(cumulative, np.arange(0, size - self.n), axis=axis)) / self.n
+        self.table = table
+
+    def average(self, lags: np.ndarray) -> np.ndarray:
+        """C(V, x) for sample-minus-centroid lag vectors (..., 3)"""
+        lags = np.asarray(lags, dtype=np.float64)
+        shape = lags.shape[:-1]
+        lags = lags.reshape(-1, 3)
+        position = lags / self.step + self.half
+        inside = np.all((position >= 0) & (position <= 2 * self.half), axis=1)
+        result = np.empty(len(lags))
+
+        position = position[inside]
+        corner = np.minimum(np.floor(position).astype(np.int64), np.maximum(2 * self.half - 1, 0))
+        fraction = position - corner
+        strides = np.array([self.table.shape[1] * self.table.shape[2], self.table.shape[2], 1])
+        base = corner @ strides
+        flat_table = self.table.ravel()
+        (fx, fy, fz) = fraction.T
+        value = np.zeros(len(position))
+        for wx, ox in ((1.0 - fx, 0), (fx, strides[0])):
+            for wy, oy in ((1.0 - fy, 0), (fy, strides[1])):
+                wxy = wx * wy
+                value += wxy * ((1.0 - fz) * flat_table[base + ox + oy] + fz * flat_table[base + ox + oy + 1])
+        result[inside] = value
+
+        outside = np.flatnonzero(~inside)
+        for start in range(0, len(outside), 4096):
+            rows = outside[start:start + 4096]
+            result[rows] = np.mean(
+                _continuous_covariance(self.variogram, lags[rows, None, :] - self.offsets[None, :, :]), axis=1
+            )
+        return result.reshape(shape)
+
+
+@dataclass
+class KrigingResult:
+    """Per-target ordinary kriging outputs (NaN where not estimated)"""
+    estimate: np.ndarray
+    variance: np.ndarray
+    slope_of_regression: np.ndarray
+    negative_weight_sum: np.ndarray
+
+
+def ordinary_kriging_weights(
+    targets: np.ndarray,
+    samples: np.ndarray,
+    neighbourhood: Neighbourhood,
+    variogram: VariogramModel,
+    support: Optional[BlockSupport] = None
+):
+    """
+    Solve the ordinary kriging systems for a batch of targets at once.
+
+    Stacks one (k+1)x(k+1) system per target and solves them with a single
+    np.linalg.solve over the leading batch axis. Padded neighbour slots get
+    an identity row/column and a zero right-hand side, so their weight is 0.
+    With a block support the targets are block centroids and the
+    right-hand side holds block-to-sample average covariances.
+
+    Returns (weights (n, k), lagrange multipliers (n,), sample-to-target covariances (n, k)).
+    """
+    mask = neighbourhood.mask
+    n_targets, k = mask.shape
+    padded_samples = np.vstack([samples, np.zeros((1, samples.shape[1]))])
+    points = padded_samples[neighbourhood.indices]
+
+    # Sample-to-sample covariances (anisotropic models use the lag vectors)
+    separation = points[:, :, None, :] - points[:, None, :, :]
+    pair_mask = mask[:, :, None] & mask[:, None, :]
+    lhs = np.zeros((n_targets, k + 1, k + 1))
+    lhs[:, :k, :k] = np.where(pair_mask, variogram.covariance_vectors(separation), 0.0)
+
+    # Tiny diagonal jitter keeps co-located samples solvable
+    diagonal = np.arange(k)
+    lhs[:, diagonal, diagonal] = np.where(
+        mask, lhs[:, diagonal, diagonal] + 1e-10 * variogram.total_sill, 1.0
+    )
+    lhs[:, :k, k] = mask
+    lhs[:, k, :k] = mask
+
+    # Sample-to-target covariances
+    to_target = points - targets[:, None, :]
+    if support is None:
+        target_cov = np.where(mask, variogram.covariance_vectors(to_target), 0.0)
+    else:
+        target_cov = np.zeros((n_targets, k))
+        target_cov[mask] = support.average(to_target[mask])
+    rhs = np.empty((n_targets, k + 1))
+    rhs[:, :k] = target_cov
+    rhs[:, k] = 1.0
+
+    solution = np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+    return solution[:, :k], solution[:, k], target_cov
+
+
+def ordinary_kriging(
+    targets: np.ndarray,
+    samples: np.ndarray,
+    values: np.ndarray,
+    neighbourhood: Neighbourhood,
+    variogram: VariogramModel,
+    batch_size: int = KRIGING_BATCH_SIZE,
+    support: Optional[BlockSupport] = None
+) -> KrigingResult:
+    """
+    Batched 3D ordinary kriging over precomputed neighbourhoods; block
+    kriging of blocks centred on the targets when support is given.
+
+    Every target must have at least one neighbour. Returns the estimate,
+    kriging variance, slope of regression of true on estimated grade and
+    the sum of negative weights for each target.
+
+    values may be (n_samples, m): each system is solved once and its
+    weights applied to all m columns, giving (n_targets, m) estimates.
+    The variance and other outputs belong to the variogram and are
+    shared by the columns.
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    samples = np.asarray(samples, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    n_targets = len(targets)
+    result = KrigingResult(
+        estimate=np.full((n_targets,) + values.shape[1:], np.nan),
+        variance=np.full(n_targets, np.nan),
+        slope_of_regression=np.full(n_targets, np.nan),
+        negative_weight_sum=np.full(n_targets, np.nan)
+    )
+
+    for start in range(0, n_targets, batch_size):
+        batch = slice(start, start + batch_size)
+        batch_neighbourhood = Neighbourhood(
+            indices=neighbourhood.indices[batch],
+            distances=neighbourhood.distances[batch],
+            counts=neighbourhood.counts[batch],
+            n_samples=neighbourhood.n_samples
+        )
+        weights, lagrange, target_cov = ordinary_kriging_weights(
+            targets[batch], samples, batch_neighbourhood, variogram, support
+        )
+        neighbour_values = gather(values, batch_neighbourhood)
+        covariance_sum = np.sum(weights * target_cov, axis=1)
+
+        if neighbour_values.ndim == 3:
+            result.estimate[batch] = np.einsum('tk,tkm->tm', weights, neighbour_values)
+        else:
+            result.estimate[batch] = np.sum(weights * neighbour_values, axis=1)
+        # sigma^2 = C(0) - sum(w * C_i0) - mu  (C(V, V) for blocks)
+        result.variance[batch] = np.maximum(
+            (variogram.total_sill if support is None else support.within) - covariance_sum - lagrange, 0.0
+        )
+        # Cov(Z, Z*) / Var(Z*) with Var(Z*) = sum(w * C_i0) - mu
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result.slope_of_regression[batch] = covariance_sum / (covariance_sum - lagrange)
+        result.negative_weight_sum[batch] = np.sum(np.minimum(weights, 0.0), axis=1)
+
+    return result
+
+
+def neighbourhood_kriging(
+    targets: np.ndarray,
+    samples: np.ndarray,
+    values: np.ndarray,
+    variogram: VariogramModel,
+    max_samples: int = 16,
+    ellipsoid: Optional[SearchEllipsoid] = None,
+    batch_size: int = KRIGING_BATCH_SIZE
+) -> KrigingResult:
+    """
+    Moving-neighbourhood ordinary kriging: every target is kriged from its
+    max_samples closest samples (KD-tree, anisotropic distance when an
+    ellipsoid is given), in batched local systems. Cost grows linearly
+    with the number of targets and logarithmically with the samples.
+    """
+    targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+    samples = np.atleast_2d(np.asarray(samples, dtype=np.float64))
+    ellipsoid = ellipsoid or SearchEllipsoid(major=1.0)
+    neighbourhood = search_neighbours(
+        ellipsoid.transform(targets), ellipsoid.transform(samples), np.inf, max_samples
+    )
+    return ordinary_kriging(targets, samples, values, neighbourhood, variogram, batch_size)
+
+
+def simple_kriging(
+    targets: np.ndarray,
+    points: np.ndarray,
+    values: np.ndarray,
+    mask: np.ndarray,
+    variogram: VariogramModel
+):
+    """
+    Batched simple kriging with a known zero mean (e.g. normal scores).
+
+    Each target has its own neighbour set: points (n, k, 3) and values
+    (n, k), with mask marking the real slots. Targets without neighbours
+    get mean 0 and the full sill. Returns (mean, variance).
+    """
+    n_targets, k = mask.shape
+    separation = points[:, :, None, :] - points[:, None, :, :]
+    pair_mask = mask[:, :, None] & mask[:, None, :]
+    lhs = np.where(pair_mask, variogram.covariance_vectors(separation), 0.0)
+    diagonal = np.arange(k)
+    lhs[:, diagonal, diagonal] = np.where(
+        mask, lhs[:, diagonal, diagonal] + 1e-10 * variogram.total_sill, 1.0
+    )
+    target_cov = np.where(mask, variogram.covariance_vectors(points - targets[:, None, :]), 0.0)
+
+    weights = np.linalg.solve(lhs, target_cov[:, :, None])[:, :, 0]
+    mean = np.sum(weights * np.where(mask, values, 0.0), axis=1)
+    variance = np.maximum(variogram.total_sill - np.sum(weights * target_cov, axis=1), 0.0)
+    return mean, variance
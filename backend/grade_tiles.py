@@ -0,0 +1,149 @@
+"""
+GeoForge Grade Tiles
+XYZ tile pyramid of plan-view grade surfaces, kriged on demand
+
+A project's samples are framed by one square (padded around their plan
+extent): zoom 0 is a single tile covering it and every zoom level splits
+each tile into 2 x 2, with x growing east and y growing south from the
+north-west corner, as in web map tiles. A tile is a size x size grid of
+node values kriged when first requested, so only tiles a viewer actually
+shows are ever computed and deeper zooms cost no more than shallow ones.
+
+The tile source (sample positions, KD-tree, variogram, search ellipsoid)
+is built once per project data version and reused by every tile. Nodes
+with no sample inside the search ellipsoid are left empty rather than
+extrapolated.
+
+Encodings:
+    f16   little-endian float16, size x size, north row first, NaN = no data
+    png   8-bit grey + alpha PNG, grade scaled over the source value range
+          (alpha 0 = no data)
+"""
+import io
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from scipy.spatial import cKDTree
+
+from geostats import Neighbourhood, SearchEllipsoid, VariogramModel, ordinary_kriging, search_neighbours
+
+
+TILE_FORMATS = {"f16": "application/octet-stream", "png": "image/png"}
+TILE_SIZES = (64, 128, 256)
+DEFAULT_TILE_SIZE = 128
+MAX_TILE_ZOOM = 16
+
+# Margin around the sample extent, as a fraction of its larger side
+FRAME_PADDING = 0.05
+
+# Upper end of the png grade scale (quantile of the sample grades)
+PNG_SCALE_QUANTILE = 0.99
+
+# Tile sources kept per process (each holds its samples and KD-tree)
+MAX_TILE_SOURCES = 8
+
+
+class GradeTileSource:
+    """Plan-view samples, search structures and frame shared by every tile of one surface"""
+
+    def __init__(
+        self,
+        xy: np.ndarray,
+        values: np.ndarray,
+        variogram: VariogramModel,
+        ellipsoid: SearchEllipsoid,
+        max_samples: int = 16
+    ):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.samples = np.column_stack([xy, np.zeros(len(xy))])
+        self.variogram = variogram
+        self.ellipsoid = ellipsoid
+        self.max_samples = max_samples
+        self.tree = cKDTree(ellipsoid.transform(self.samples))
+
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        side = float(max(high - low)) or ellipsoid.major
+        self.extent = side * (1 + 2 * FRAME_PADDING)
+        centre = 0.5 * (low + high)
+        self.x_min = float(centre[0] - 0.5 * self.extent)
+        self.y_max = float(centre[1] + 0.5 * self.extent)
+        self.value_range = (float(self.values.min()), float(np.quantile(self.values, PNG_SCALE_QUANTILE)))
+
+    def frame(self) -> dict:
+        return {
+            "x_min": self.x_min,
+            "y_min": self.y_max - self.extent,
+            "x_max": self.x_min + self.extent,
+            "y_max": self.y_max,
+            "extent": self.extent,
+            "value_min": self.value_range[0],
+            "value_max": self.value_range[1],
+            "data_points": len(self.values)
+        }
+
+    def tile_nodes(self, z: int, x: int, y: int, size: int) -> np.ndarray:
+        """(size * size, 3) node centres of a tile, north row first"""
+        side = self.extent / 2 ** z
+        offsets = (np.arange(size) + 0.5) * side / size
+        east, north = np.meshgrid(self.x_min + x * side + offsets, self.y_max - y * side - offsets)
+        return np.column_stack([east.ravel(), north.ravel(), np.zeros(size * size)])
+
+    def render(self, z: int, x: int, y: int, size: int = DEFAULT_TILE_SIZE) -> np.ndarray:
+        """Kriged (size, size) grades of one tile, NaN beyond the search ellipsoid"""
+        nodes = self.tile_nodes(z, x, y, size)
+        neighbourhood = search_neighbours(
+            self.ellipsoid.transform(nodes), self.tree.data, self.ellipsoid.major, self.max_samples, tree=self.tree
+        )
+        grades = np.full(len(nodes), np.nan)
+        covered = neighbourhood.counts > 0
+        if covered.any():
+            covered_neighbourhood = Neighbourhood(
+                indices=neighbourhood.indices[covered],
+                distances=neighbourhood.distances[covered],
+                counts=neighbourhood.counts[covered],
+                n_samples=neighbourhood.n_samples
+            )
+            kriged = ordinary_kriging(
+                nodes[covered], self.samples, self.values, covered_neighbourhood, self.variogram
+            )
+            grades[covered] = kriged.estimate
+        return grades.reshape(size, size)
+
+
+class TileSourceCache:
+    """Most recently used tile sources, built on first use"""
+
+    def __init__(self, max_sources: int = MAX_TILE_SOURCES):
+        self.max_sources = max_sources
+        self._sources: "OrderedDict[Hashable, GradeTileSource]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], GradeTileSource]) -> GradeTileSource:
+        with self._lock:
+            source = self._sources.get(key)
+            if source is not None:
+                self._sources.move_to_end(key)
+                return source
+        # Built outside the lock: concurrent first requests may both build
+        source = build()
+        with self._lock:
+            self._sources[key] = source
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return source
+
+
+def encode_tile(grades: np.ndarray, fmt: str, value_range: Optional[Tuple[float, float]] = None) -> bytes:
+    """Tile bytes in one of TILE_FORMATS"""
+    if fmt == "f16":
+        return grades.astype("<f2").tobytes()
+    low, high = value_range
+    scaled = np.clip((grades - low) / ((high - low) or 1.0), 0.0, 1.0)
+    grey = np.round(np.nan_to_num(scaled) * 255).astype(np.uint8)
+    alpha = np.where(np.isnan(grades), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.dstack([grey, alpha])).save(buffer, format="PNG", compress_level=6)
+    return buffer.getvalue()
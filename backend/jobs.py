@@ -0,0 +1,309 @@
+"""
+GeoForge Modelling Jobs
+PostgreSQL-backed queue for long-running modelling work
+
+Endpoints enqueue a row in modelling_jobs and return its id; worker.py
+processes claim queued rows with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of workers can share the queue without double-running a job and
+without any service besides PostgreSQL. NOTIFY modelling_jobs wakes idle
+workers immediately; they also poll as a fallback.
+
+Handlers report progress through a JobContext, which is also where a
+cancellation request surfaces (as JobCancelled) and where follow-up work
+(store sync, pyramid rebuild) is deferred until the result is saved, or
+registered to run whatever the outcome once the handler has changed
+shared state that must be propagated.
+
+Progress, heartbeats and the final status only touch the row while the
+claiming worker still owns it (same worker_id, still running): a worker
+whose job was requeued as stale stops at its next progress report
+(JobLost) and cannot overwrite the outcome of the worker that re-ran it.
+"""
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import Json
+
+
+JOB_CHANNEL = "modelling_jobs"
+
+JOB_STATUSES = ["queued", "running", "succeeded", "failed", "cancelled"]
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+# A running job whose heartbeat is older than this is assumed orphaned
+# (worker killed) and is requeued, up to MAX_ATTEMPTS runs in total
+HEARTBEAT_SECONDS = 30
+STALE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+# Minimum seconds between progress writes (the final update always lands)
+PROGRESS_INTERVAL = 0.5
+
+# job_type -> handler(params, job) returning a JSON-serializable result
+JOB_HANDLERS: Dict[str, Callable] = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when the job's cancellation was requested"""
+
+
+class JobLost(JobCancelled):
+    """Raised inside a handler when the job is no longer owned by this worker (requeued as stale)"""
+
+
+def job_handler(job_type: str):
+    """Register a function as the handler for a job type"""
+    def register(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return register
+
+
+# ==================== QUEUE OPERATIONS ====================
+
+def enqueue_job(
+    conn,
+    job_type: str,
+    params: Dict,
+    project_id: Optional[str] = None,
+    block_model_id: Optional[str] = None
+) -> Dict:
+    """Insert a queued job and wake a worker; commits the connection"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type '{job_type}'")
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO modelling_jobs (job_type, project_id, block_model_id, params)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id, job_type, status, created_at
+    """, (job_type, project_id, block_model_id, Json(params)))
+    job = cur.fetchone()
+    cur.execute("SELECT pg_notify(%s, %s)", (JOB_CHANNEL, str(job['id'])))
+    conn.commit()
+    cur.close()
+    return job
+
+
+def claim_job(conn, worker_id: str) -> Optional[Dict]:
+    """Atomically move the oldest queued job to running; None if the queue is empty"""
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE modelling_jobs
+        SET status = 'running',
+            worker_id = %s,
+            attempts = attempts + 1,
+            started_at = CURRENT_TIMESTAMP,
+            heartbeat_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM modelling_jobs
+            WHERE status = 'queued'
+            ORDER BY created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+    """, (worker_id,))
+    job = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return job
+
+
+def requeue_stale_jobs(conn) -> int:
+    """Requeue running jobs whose worker stopped heartbeating (or fail them after MAX_ATTEMPTS)"""
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE modelling_jobs
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+            error = CASE WHEN attempts >= %s THEN 'Worker stopped responding' ELSE error END,
+            finished_at = CASE WHEN attempts >= %s THEN CURRENT_TIMESTAMP ELSE NULL END,
+            worker_id = NULL
+        WHERE status = 'running'
+          AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    """, (MAX_ATTEMPTS, MAX_ATTEMPTS, MAX_ATTEMPTS, STALE_SECONDS))
+    count = cur.rowcount
+    conn.commit()
+    cur.close()
+    return count
+
+
+def finish_job(
+    conn, job_id: str, status: str, result=None, error: Optional[str] = None, worker_id: Optional[str] = None
+) -> bool:
+    """
+    Record a job's outcome. With worker_id, only while that worker still
+    owns the running job; returns whether the row was updated.
+    """
+    ownership = " AND worker_id = %s AND status = 'running'" if worker_id is not None else ""
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE modelling_jobs
+        SET status = %s,
+            result = %s,
+            error = %s,
+            progress = CASE WHEN %s = 'succeeded' THEN 1 ELSE progress END,
+            finished_at = CURRENT_TIMESTAMP
+        WHERE id = %s{ownership}
+    """, (status, Json(result) if result is not None else None, error, status, job_id)
+        + ((worker_id,) if worker_id is not None else ()))
+    updated = cur.rowcount > 0
+    conn.commit()
+    cur.close()
+    return updated
+
+
+def request_cancel(conn, job_id: str) -> Optional[Dict]:
+    """
+    Cancel a job: queued jobs are cancelled immediately, running jobs are
+    flagged and stop at their next progress report. Returns the job row.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE modelling_jobs
+        SET cancel_requested = TRUE,
+            status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+            finished_at = CASE WHEN status = 'queued' THEN CURRENT_TIMESTAMP ELSE finished_at END
+        WHERE id = %s
+        RETURNING id, job_type, status, cancel_requested
+    """, (job_id,))
+    job = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return job
+
+
+def get_job(conn, job_id: str, include_result: bool = False) -> Optional[Dict]:
+    columns = """
+        id, job_type, project_id, block_model_id, status, progress, progress_message,
+        cancel_requested, attempts, error, created_at, started_at, finished_at
+    """
+    if include_result:
+        columns += ", result"
+    cur = conn.cursor()
+    cur.execute(f"SELECT {columns} FROM modelling_jobs WHERE id = %s", (job_id,))
+    job = cur.fetchone()
+    cur.close()
+    return job
+
+
+# ==================== RUNNING JOBS ====================
+
+class JobContext:
+    """
+    Handed to job handlers. progress() records how far the job got and
+    raises JobCancelled once cancellation was requested (JobLost once the
+    job was taken from this worker); a heartbeat thread keeps the job
+    marked alive between progress reports.
+    """
+
+    def __init__(self, connect: Callable, job: Dict):
+        self.job_id = str(job['id'])
+        self.worker_id = job.get('worker_id')
+        self.params = job['params']
+        self.deferred: List = []  # (func, args, always)
+        self._connect = connect
+        self._conn = connect()
+        self._conn.autocommit = True
+        self._last_report = 0.0
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+
+    def progress(self, fraction: float, message: Optional[str] = None, force: bool = False):
+        now = time.monotonic()
+        if not force and fraction < 1 and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        cur = self._conn.cursor()
+        cur.execute("""
+            UPDATE modelling_jobs
+            SET progress = %s,
+                progress_message = COALESCE(%s, progress_message),
+                heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND worker_id IS NOT DISTINCT FROM %s AND status = 'running'
+            RETURNING cancel_requested
+        """, (float(min(max(fraction, 0.0), 1.0)), message, self.job_id, self.worker_id))
+        row = cur.fetchone()
+        cur.close()
+        if row is None:
+            raise JobLost()
+        if row['cancel_requested']:
+            raise JobCancelled()
+
+    def defer(self, func: Callable, *args, always: bool = False):
+        """
+        Run func(*args) after the job's result has been stored; with
+        always=True also when the job fails, is cancelled or was lost.
+        """
+        self.deferred.append((func, args, always))
+
+    def _beat(self):
+        conn = None
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE modelling_jobs SET heartbeat_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND worker_id IS NOT DISTINCT FROM %s AND status = 'running'
+                """, (self.job_id, self.worker_id))
+                cur.close()
+            except Exception as e:
+                # Retry on a fresh connection at the next beat; STALE_SECONDS
+                # leaves room for several missed beats before a requeue
+                print(f"Heartbeat failed for job {self.job_id}: {e}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        self._stop.set()
+        self._heartbeat.join()
+        self._conn.close()
+
+
+def run_job(connect: Callable, conn, job: Dict) -> str:
+    """
+    Execute one claimed job and record its outcome; returns the final
+    status ("lost" when the job was taken from this worker meanwhile, in
+    which case nothing is recorded and only always-deferred work runs).
+    """
+    context = JobContext(connect, job)
+    try:
+        handler = JOB_HANDLERS[job['job_type']]
+        result = handler(job['params'], context)
+        # Round-trip through JSON so NumPy scalars or dates fail here, not in the driver
+        result = json.loads(json.dumps(result, default=str))
+        status, error = "succeeded", None
+    except JobLost:
+        result, status, error = None, "lost", None
+    except JobCancelled:
+        result, status, error = None, "cancelled", None
+    except Exception as e:
+        result, status = None, "failed"
+        error = str(getattr(e, "detail", None) or e)
+    finally:
+        context.close()
+
+    if status != "lost" and not finish_job(conn, job['id'], status, result, error, worker_id=context.worker_id):
+        status = "lost"
+    if status == "lost":
+        print(f"Job {job['id']} is no longer owned by worker {context.worker_id}; outcome discarded")
+
+    for func, args, always in context.deferred:
+        if not (always or status == "succeeded"):
+            continue
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Deferred task {func.__name__} failed for job {job['id']}: {e}")
+    return status
@@ -3,8 +3,9 @@ GeoForge Backend API
 Open-Source Micromine-Class Architecture
 Python FastAPI Backend
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from typing import List, Optional, Dict
 import os
 from dotenv import load_dotenv
@@ -12,9 +13,44 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from pydantic import BaseModel
 import numpy as np
-from pykrige.ok import OrdinaryKriging
-from scipy.interpolate import griddata
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import cKDTree
 import json
+import itertools
+from bulk_io import copy_query_to_frame
+from block_store import (
+    BlockModelStore, ColumnUpdate, GRADE_COLUMNS, CLASSIFICATIONS, CLASSIFICATION_CODES,
+    MAX_SUB_BLOCK_LEVEL, StoreVersionConflict, build_octree, summarize, sync_to_postgres, load_from_rows as load_store_from_rows,
+    columns_to_select as store_columns_to_select
+)
+from block_stream import stream_cells
+from block_lod import (
+    build_pyramid as build_lod_pyramid, load_pyramid as load_lod_pyramid,
+    choose_level as choose_lod_level, count_level as count_lod_level,
+    query_level as query_lod_level
+)
+from cross_validation import CV_SCHEMES, cross_validate, hole_folds
+from geostats import (
+    SearchEllipsoid, VariogramModel, experimental_variogram, fit_variogram, idw_estimate, ordinary_kriging,
+    rotation_matrix, search_neighbours
+)
+from estimation import EstimationParams, SearchPass, affected_blocks, changed_sample_positions, estimate_blocks
+from desurvey import (
+    DESURVEY_METHODS, desurvey_depths, ensure_sample_coordinates, refresh_sample_coordinates
+)
+from compositing import COMPOSITE_METHODS, refresh_composite_set
+from indicator_kriging import (
+    MAX_CUTOFFS, MIN_CUTOFFS, IndicatorDistribution, correct_order_relations, decode_ccdf, encode_ccdf,
+    median_indicator
+)
+from grade_tiles import (
+    DEFAULT_TILE_SIZE, MAX_TILE_ZOOM, TILE_FORMATS, TILE_SIZES, GradeTileSource, TileSourceCache, encode_tile
+)
+from result_cache import RESULT_CACHE_MB, ResultCache, bump_data_version, data_version
+from simulation import SimulationGrid, SimulationSummary, NormalScoreTransform, simulate
+from jobs import (
+    JobCancelled, JobContext, JOB_STATUSES, job_handler, enqueue_job, request_cancel, get_job as get_job_row
+)
 
 # Load environment variables
 load_dotenv()
@@ -77,12 +113,89 @@ class DrillHole(BaseModel):
     status: Optional[str] = "planned"
 
 
+class DrillHoleSurvey(BaseModel):
+    depth_m: float
+    dip: float  # Negative downward
+    azimuth: float  # Degrees clockwise from grid north
+    survey_method: Optional[str] = None  # e.g. "gyro", "multishot"
+
+
 class GradeInterpolationRequest(BaseModel):
     project_id: str
     element: str  # e.g., "au_ppm", "cu_ppm"
     grid_resolution: Optional[int] = 50  # Grid cells per axis
     interpolation_method: Optional[str] = "kriging"  # "kriging" or "idw"
-    section_line: Optional[Dict[str, float]] = None  # For 2D section: {x1, y1, x2, y2}
+    section_line: Optional[Dict[str, float]] = None  # Vertical section: {x1, y1, x2, y2}
+    section_corridor: Optional[float] = 25.0  # Half-width (m) of the sample corridor around section_line
+    composite_set_id: Optional[str] = None  # Interpolate composites instead of raw assays
+    variogram_model_id: Optional[str] = None  # Stored variogram (default: fitted to the samples)
+    max_samples: Optional[int] = 16  # Kriging: closest samples per grid node
+    background: Optional[bool] = False  # Run as a modelling job and return a job id
+
+
+class CompositeSetRequest(BaseModel):
+    project_id: str
+    name: str
+    method: str = "fixed_length"  # "fixed_length", "lithology" or "vein"
+    composite_length: Optional[float] = 2.0  # None = one composite per lithology run / vein intercept
+    min_coverage: Optional[float] = 0.5  # Minimum assayed fraction of a composite
+
+
+class VariogramRequest(BaseModel):
+    project_id: str
+    element: str = "au_ppm"
+    composite_set_id: Optional[str] = None
+    n_lags: Optional[int] = 15
+    max_lag: Optional[float] = None  # Default: half the sample extent
+    directions: Optional[List[Dict[str, float]]] = None  # [{"azimuth": 0, "dip": 0}, ...]; None = omnidirectional
+    tolerance: Optional[float] = 22.5  # Angular tolerance (degrees) of directional variograms
+    bandwidth: Optional[float] = None  # Maximum distance (m) from the direction axis
+
+
+class VariogramModelCreate(BaseModel):
+    project_id: str
+    name: str
+    element: str = "au_ppm"
+    composite_set_id: Optional[str] = None
+    structures: Optional[List[str]] = ["spherical"]  # Nested structure types to fit
+    anisotropic: Optional[bool] = False  # Fit along the major/semi/minor axes of azimuth/dip/rake
+    azimuth: Optional[float] = 0.0
+    dip: Optional[float] = 0.0
+    rake: Optional[float] = 0.0
+    n_lags: Optional[int] = 15
+    max_lag: Optional[float] = None
+    tolerance: Optional[float] = 22.5
+    bandwidth: Optional[float] = None
+    model: Optional[Dict] = None  # Manual model {nugget, structures, azimuth, dip, rake}; skips fitting
+
+
+class CrossValidationRequest(BaseModel):
+    project_id: str
+    element: str = "au_ppm"
+    composite_set_id: Optional[str] = None
+    scheme: Optional[str] = "leave_one_out"  # "leave_one_out" or "kfold" (whole holes held out)
+    folds: Optional[int] = 5  # kfold only
+    seed: Optional[int] = 0  # kfold hole shuffle
+    variogram_model_id: Optional[str] = None  # Default variogram (else fitted to the samples)
+    # Base parameter set: interpolation_method, search_radius, min_samples,
+    # max_samples, search_radius_semi/minor, search_azimuth/dip/rake,
+    # search_passes, variogram_model_id or variogram (model dict)
+    parameters: Optional[Dict] = None
+    grid: Optional[Dict[str, List]] = None  # Values to sweep over the base set (every combination)
+    parameter_sets: Optional[List[Dict]] = None  # Explicit sets (merged over the base set)
+    n_workers: Optional[int] = 0  # Processes (0 = all cores)
+
+
+class SimulationRequest(BaseModel):
+    element: str = "au_ppm"
+    n_realizations: int = 100
+    cutoffs: List[float] = [0.5, 1.0, 2.0]  # In sample units (ppm)
+    composite_set_id: Optional[str] = None
+    variogram_model_id: Optional[str] = None  # Normal-score variogram (else fitted to the normal scores)
+    max_data: int = 12  # Conditioning samples per node
+    max_simulated: int = 12  # Previously simulated nodes per node
+    seed: int = 0
+    n_workers: int = 0  # Processes (0 = all cores)
 
 
 class BlockModelRequest(BaseModel):
@@ -104,13 +217,32 @@ class BlockModelRequest(BaseModel):
     block_size_z: float = 5.0
     
     # Estimation parameters
-    interpolation_method: Optional[str] = "ordinary_kriging"
-    search_radius: Optional[float] = 50.0
+    interpolation_method: Optional[str] = "ordinary_kriging"  # "ordinary_kriging" or "idw"
+    search_radius: Optional[float] = 50.0  # Major semi-axis of the search ellipsoid
     min_samples: Optional[int] = 3
     max_samples: Optional[int] = 12
     
+    # Anisotropic search ellipsoid (semi/minor default to search_radius),
+    # oriented like a variogram: major axis along azimuth/dip, semi-major
+    # axis rotated about it by rake
+    search_radius_semi: Optional[float] = None
+    search_radius_minor: Optional[float] = None
+    search_azimuth: Optional[float] = 0.0
+    search_dip: Optional[float] = 0.0
+    search_rake: Optional[float] = 0.0
+    
+    # Search passes, tightest first: blocks a pass cannot estimate are
+    # retried by the next. [{scale, min_samples, max_samples}, ...] with
+    # scale multiplying the ellipsoid radii; default one pass at scale 1
+    search_passes: Optional[List[Dict[str, float]]] = None
+    
     # Elements to estimate
     elements: Optional[List[str]] = ["au_ppm"]
+    
+    # Sub-blocking: parents are split into octree children (edge / 2^level)
+    # around the selected features; 0 levels keeps a regular model
+    sub_block_levels: Optional[int] = 0  # up to 4 (1/16 of the parent block)
+    sub_block_on: Optional[List[str]] = ["lithology", "veins"]  # also "samples"
 
 
 class ResourceEstimateRequest(BaseModel):
@@ -441,6 +573,83 @@ def create_drill_hole(hole: DrillHole):
         raise HTTPException(status_code=500, detail=f"Failed to create drill hole: {str(e)}")
 
 
+@app.get("/api/drill-holes/{hole_id}/surveys")
+def get_drill_hole_surveys(hole_id: str):
+    """Downhole survey stations of a drill hole, shallowest first"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT id, drill_hole_id, depth_m, dip, azimuth, survey_method, created_at
+            FROM drill_hole_surveys
+            WHERE drill_hole_id = %s
+            ORDER BY depth_m
+        """, (hole_id,))
+        
+        surveys = cur.fetchall()
+        cur.close()
+        conn.close()
+        
+        return {"surveys": surveys, "count": len(surveys)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch surveys: {str(e)}")
+
+
+@app.post("/api/drill-holes/{hole_id}/surveys")
+def create_drill_hole_surveys(hole_id: str, surveys: List[DrillHoleSurvey]):
+    """
+    Add or replace downhole survey stations (matched on depth). The hole's
+    cached sample coordinates are invalidated and re-desurveyed on next use.
+    """
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        for survey in surveys:
+            cur.execute("""
+                INSERT INTO drill_hole_surveys (drill_hole_id, depth_m, dip, azimuth, survey_method)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (drill_hole_id, depth_m) DO UPDATE SET
+                    dip = EXCLUDED.dip,
+                    azimuth = EXCLUDED.azimuth,
+                    survey_method = EXCLUDED.survey_method
+            """, (hole_id, survey.depth_m, survey.dip, survey.azimuth, survey.survey_method))
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return {"message": f"{len(surveys)} survey stations saved", "drill_hole_id": hole_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save surveys: {str(e)}")
+
+
+@app.post("/api/projects/{project_id}/desurvey")
+def desurvey_project(project_id: str, method: str = "minimum_curvature"):
+    """
+    Recompute the cached 3D sample midpoints of every hole in a project.
+    
+    Modelling endpoints refresh stale holes automatically; this forces a
+    full rebuild, e.g. to switch between minimum_curvature and tangent.
+    """
+    if method not in DESURVEY_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid method. Must be one of: {', '.join(DESURVEY_METHODS)}"
+        )
+    try:
+        conn = get_db_connection()
+        result = refresh_sample_coordinates(conn, project_id, method=method)
+        # Positions may move without any drilling data changing
+        bump_data_version(conn, project_id)
+        conn.close()
+        
+        return {"project_id": project_id, "method": method, **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to desurvey project: {str(e)}")
+
+
 # ==================== ASSAYS ENDPOINTS ====================
 
 @app.get("/api/assays")
@@ -599,336 +808,1652 @@ def get_drill_holes_3d(project_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to fetch 3D drill hole data: {str(e)}")
 
 
-# ==================== GEOSTATISTICS & MODELING ENDPOINTS ====================
+# ==================== SAMPLES & COMPOSITES ====================
 
-@app.post("/api/model/section-grade")
-def interpolate_grade(request: GradeInterpolationRequest):
+def fetch_samples(
+    conn, project_id: str, elements: List[str], composite_set_id: Optional[str] = None,
+    with_holes: bool = False, corridor: Optional[tuple] = None
+):
     """
-    PHASE 4: Grade Interpolation using PyKrige (Ordinary Kriging)
+    Positive grades of several elements with their 3D positions, read in
+    one query, as (xyz (n, 3), grades (n, len(elements))) arrays with NaN
+    where an element is missing or not positive: desurveyed assay
+    midpoints, or the composites of a composite set (stale holes are
+    recomposited first). with_holes adds each sample's drill hole id.
     
-    Interpolates element grades across a 2D grid for visualization.
-    Returns a grid of estimated grades that can be visualized as a heatmap.
+    corridor = (x1, y1, x2, y2, half_width) keeps only samples within
+    half_width (plan distance) of that line segment, through the GiST
+    indexes of migration 020.
+    """
+    corridor_params = tuple(float(v) for v in corridor) if corridor is not None else ()
+    
+    def corridor_filter(prefix: str = "") -> str:
+        if corridor is None:
+            return ""
+        return f"""
+              AND ST_DWithin(ST_Point({prefix}mid_x, {prefix}mid_y),
+                             ST_MakeLine(ST_Point(%s, %s), ST_Point(%s, %s)), %s)"""
+    
+    cur = conn.cursor()
+    if composite_set_id:
+        try:
+            composite_set = refresh_composite_set(conn, composite_set_id)
+        except LookupError:
+            raise HTTPException(status_code=404, detail="Composite set not found")
+        if str(composite_set['project_id']) != str(project_id):
+            raise HTTPException(status_code=400, detail="Composite set belongs to another project")
+        samples = copy_query_to_frame(cur, f"""
+            SELECT mid_x AS x, mid_y AS y, mid_z AS z, drill_hole_id,
+                   {', '.join(f'CASE WHEN {e} > 0 THEN {e} END AS {e}' for e in elements)}
+            FROM composites
+            WHERE composite_set_id = %s
+              AND ({' OR '.join(f'{e} > 0' for e in elements)}){corridor_filter()}
+        """, (composite_set_id,) + corridor_params)
+    else:
+        ensure_sample_coordinates(conn, project_id)
+        samples = copy_query_to_frame(cur, f"""
+            SELECT sc.mid_x AS x, sc.mid_y AS y, sc.mid_z AS z, sc.drill_hole_id,
+                   {', '.join(f'CASE WHEN a.{e} > 0 THEN a.{e} END AS {e}' for e in elements)}
+            FROM assays a
+            JOIN sample_coordinates sc ON sc.sample_id = a.sample_id
+            WHERE sc.project_id = %s
+              AND ({' OR '.join(f'a.{e} > 0' for e in elements)}){corridor_filter('sc.')}
+        """, (project_id,) + corridor_params)
+    cur.close()
+    xyz = samples[["x", "y", "z"]].to_numpy(dtype=np.float64)
+    grades = samples[elements].to_numpy(dtype=np.float64)
+    if with_holes:
+        return xyz, grades, samples["drill_hole_id"].astype(str).to_numpy()
+    return xyz, grades
+
+
+def fetch_element_samples(
+    conn, project_id: str, element: str, composite_set_id: Optional[str] = None, corridor: Optional[tuple] = None
+):
+    """Positive grades of one element with their 3D positions, as (xyz (n, 3), grades (n,))"""
+    xyz, grades = fetch_samples(conn, project_id, [element], composite_set_id, corridor=corridor)
+    return xyz, grades[:, 0]
+
+
+@app.post("/api/composite-sets")
+def create_composite_set(request: CompositeSetRequest):
     """
+    Create a composite set and composite every hole of the project.
+    
+    Composites are length-weighted over the assay intervals they overlap;
+    select the set with composite_set_id in estimation or section-grade.
+    """
+    if request.method not in COMPOSITE_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid method. Must be one of: {', '.join(COMPOSITE_METHODS)}"
+        )
+    if request.method == "fixed_length" and not request.composite_length:
+        raise HTTPException(status_code=400, detail="fixed_length compositing needs a composite_length")
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Validate element column exists
-        valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
-        if request.element not in valid_elements:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
-            )
-        
-        # Fetch assay data with spatial coordinates
-        # Join: assays -> core_samples -> drill_holes
-        cur.execute(f"""
-            SELECT 
-                dh.easting,
-                dh.northing,
-                cs.from_depth,
-                cs.to_depth,
-                a.{request.element} as grade
-            FROM assays a
-            JOIN core_samples cs ON cs.id = a.sample_id
-            JOIN drill_holes dh ON dh.id = cs.drill_hole_id
-            WHERE dh.project_id = %s
-              AND a.{request.element} IS NOT NULL
-              AND a.{request.element} > 0
-        """, (request.project_id,))
-        
-        assay_data = cur.fetchall()
+        cur.execute("""
+            INSERT INTO composite_sets (project_id, name, method, composite_length, min_coverage)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id
+        """, (request.project_id, request.name, request.method,
+              request.composite_length, request.min_coverage or 0.0))
+        composite_set_id = cur.fetchone()['id']
+        conn.commit()
         cur.close()
-        conn.close()
-        
-        if len(assay_data) < 3:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Not enough data points for interpolation. Found {len(assay_data)}, need at least 3."
-            )
         
-        # Extract coordinates and grades
-        x = np.array([float(row['easting']) for row in assay_data])
-        y = np.array([float(row['northing']) for row in assay_data])
-        z = np.array([float(row['grade']) for row in assay_data])
+        composite_set = refresh_composite_set(conn, composite_set_id)
+        conn.close()
         
-        # Create interpolation grid
-        grid_resolution = request.grid_resolution
-        xi = np.linspace(x.min(), x.max(), grid_resolution)
-        yi = np.linspace(y.min(), y.max(), grid_resolution)
-        xi_grid, yi_grid = np.meshgrid(xi, yi)
+        return {"composite_set": composite_set, "message": "Composite set created successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create composite set: {str(e)}")
+
+
+@app.get("/api/composite-sets")
+def list_composite_sets(project_id: Optional[str] = None):
+    """Get composite sets, optionally filtered by project"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
         
-        # Perform interpolation
-        if request.interpolation_method == "kriging":
-            # Ordinary Kriging (geostatistical interpolation)
-            try:
-                OK = OrdinaryKriging(
-                    x, y, z,
-                    variogram_model='spherical',  # Can be: linear, power, gaussian, spherical, exponential
-                    verbose=False,
-                    enable_plotting=False
-                )
-                zi, ss = OK.execute('grid', xi, yi)
-                zi_grid = zi.data  # Extract masked array data
-            except Exception as e:
-                # Fallback to IDW if kriging fails
-                print(f"Kriging failed: {e}. Falling back to IDW.")
-                zi_grid = griddata((x, y), z, (xi_grid, yi_grid), method='linear')
+        if project_id:
+            cur.execute("""
+                SELECT * FROM composite_sets WHERE project_id = %s ORDER BY created_at DESC
+            """, (project_id,))
         else:
-            # Inverse Distance Weighting (simpler, faster)
-            zi_grid = griddata((x, y), z, (xi_grid, yi_grid), method='linear')
-        
-        # Handle NaN values (areas outside data coverage)
-        zi_grid = np.nan_to_num(zi_grid, nan=0.0)
-        
-        # Calculate statistics
-        stats = {
-            "min": float(np.min(z)),
-            "max": float(np.max(z)),
-            "mean": float(np.mean(z)),
-            "median": float(np.median(z)),
-            "std_dev": float(np.std(z)),
-            "data_points": len(assay_data)
-        }
+            cur.execute("SELECT * FROM composite_sets ORDER BY created_at DESC")
         
-        # Return grid data and metadata
-        return {
-            "success": True,
-            "element": request.element,
-            "method": request.interpolation_method,
-            "grid": {
-                "x_min": float(xi.min()),
-                "x_max": float(xi.max()),
-                "y_min": float(yi.min()),
-                "y_max": float(yi.max()),
-                "resolution": grid_resolution,
-                "values": zi_grid.tolist()  # 2D array of interpolated grades
-            },
-            "statistics": stats,
-            "sample_locations": [
-                {"x": float(xi), "y": float(yi), "grade": float(gi)} 
-                for xi, yi, gi in zip(x, y, z)
-            ]
-        }
+        composite_sets = cur.fetchall()
+        cur.close()
+        conn.close()
         
-    except HTTPException:
-        raise
+        return {"composite_sets": composite_sets, "count": len(composite_sets)}
     except Exception as e:
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Grade interpolation failed: {str(e)}"
-        )
+        raise HTTPException(status_code=500, detail=f"Failed to fetch composite sets: {str(e)}")
 
 
-@app.get("/api/model/available-elements/{project_id}")
-def get_available_elements(project_id: str):
+@app.post("/api/composite-sets/{composite_set_id}/refresh")
+def refresh_composites(composite_set_id: str, force: bool = False):
     """
-    Get list of elements with data for a project
-    Helps frontend know which elements can be interpolated
+    Recomposite holes whose samples, assays, domains or survey changed
+    (every hole with force=true). Estimation refreshes automatically.
     """
+    try:
+        conn = get_db_connection()
+        composite_set = refresh_composite_set(conn, composite_set_id, force=force)
+        conn.close()
+        
+        return {"composite_set": composite_set}
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Composite set not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to refresh composite set: {str(e)}")
+
+
+@app.get("/api/composite-sets/{composite_set_id}/composites")
+def get_composites(composite_set_id: str, drill_hole_id: Optional[str] = None, limit: int = 10000):
+    """Composites of a set, optionally for one hole"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Check which element columns have data
-        cur.execute("""
-            SELECT 
-                COUNT(CASE WHEN a.au_ppm IS NOT NULL AND a.au_ppm > 0 THEN 1 END) as au_count,
-                COUNT(CASE WHEN a.ag_ppm IS NOT NULL AND a.ag_ppm > 0 THEN 1 END) as ag_count,
-                COUNT(CASE WHEN a.cu_ppm IS NOT NULL AND a.cu_ppm > 0 THEN 1 END) as cu_count,
-                COUNT(CASE WHEN a.pb_ppm IS NOT NULL AND a.pb_ppm > 0 THEN 1 END) as pb_count,
-                COUNT(CASE WHEN a.zn_ppm IS NOT NULL AND a.zn_ppm > 0 THEN 1 END) as zn_count
-            FROM assays a
-            JOIN core_samples cs ON cs.id = a.sample_id
-            JOIN drill_holes dh ON dh.id = cs.drill_hole_id
-            WHERE dh.project_id = %s
-        """, (project_id,))
+        query = "SELECT * FROM composites WHERE composite_set_id = %s"
+        query_params = [composite_set_id]
+        if drill_hole_id:
+            query += " AND drill_hole_id = %s"
+            query_params.append(drill_hole_id)
+        query += " ORDER BY drill_hole_id, from_depth LIMIT %s"
+        query_params.append(limit)
         
-        counts = cur.fetchone()
+        cur.execute(query, query_params)
+        composites = cur.fetchall()
         cur.close()
         conn.close()
         
-        elements = []
-        element_map = {
-            "au_ppm": {"name": "Gold (Au)", "unit": "ppm", "count": counts['au_count']},
-            "ag_ppm": {"name": "Silver (Ag)", "unit": "ppm", "count": counts['ag_count']},
-            "cu_ppm": {"name": "Copper (Cu)", "unit": "ppm", "count": counts['cu_count']},
-            "pb_ppm": {"name": "Lead (Pb)", "unit": "ppm", "count": counts['pb_count']},
-            "zn_ppm": {"name": "Zinc (Zn)", "unit": "ppm", "count": counts['zn_count']}
-        }
-        
-        for key, value in element_map.items():
-            if value['count'] > 0:
-                elements.append({
-                    "id": key,
-                    "name": value['name'],
-                    "unit": value['unit'],
-                    "sample_count": value['count']
-                })
-        
-        return {"elements": elements, "count": len(elements)}
-        
+        return {"composites": composites, "count": len(composites)}
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to fetch available elements: {str(e)}"
+        raise HTTPException(status_code=500, detail=f"Failed to fetch composites: {str(e)}")
+
+
+# ==================== VARIOGRAM MODELS ====================
+
+def load_variogram_model(cur, variogram_model_id: str, project_id: Optional[str] = None):
+    """Stored variogram model row and its VariogramModel; 404 if missing"""
+    cur.execute("SELECT * FROM variogram_models WHERE id = %s", (variogram_model_id,))
+    row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail=f"Variogram model {variogram_model_id} not found")
+    if project_id and str(row['project_id']) != str(project_id):
+        raise HTTPException(status_code=400, detail="Variogram model belongs to another project")
+    return row, VariogramModel.from_dict(row)
+
+
+def experimental_for_request(sample_xyz: np.ndarray, sample_grades: np.ndarray, request, directions):
+    """Experimental variograms (one per direction; None = omnidirectional) as JSON-ready dicts"""
+    results = []
+    for direction in directions:
+        lags, semivariance, pair_counts = experimental_variogram(
+            sample_xyz, sample_grades,
+            n_lags=request.n_lags or 15,
+            max_lag=request.max_lag,
+            direction=(direction['azimuth'], direction['dip']) if direction else None,
+            tolerance=request.tolerance or 22.5,
+            bandwidth=request.bandwidth
         )
+        results.append({
+            "direction": direction,
+            "lags": lags.tolist(),
+            "semivariance": semivariance.tolist(),
+            "pair_counts": pair_counts.tolist()
+        })
+    return results
 
 
-# ==================== BLOCK MODEL & RESOURCE ESTIMATION ENDPOINTS (PHASE 5) ====================
+@app.post("/api/variograms/experimental")
+def compute_experimental_variogram(request: VariogramRequest):
+    """
+    Binned experimental variogram(s) of one element.
+    
+    Pairs within max_lag come from a KD-tree search (subsampled around
+    random anchors beyond a million pairs), so this scales to large
+    sample sets. Pass directions for directional variograms.
+    """
+    valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+    if request.element not in valid_elements:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
+        )
+    try:
+        conn = get_db_connection()
+        sample_xyz, sample_grades = fetch_element_samples(
+            conn, request.project_id, request.element, request.composite_set_id
+        )
+        conn.close()
+        
+        if len(sample_grades) < 3:
+            raise HTTPException(status_code=400, detail="Not enough samples for a variogram")
+        
+        variograms = experimental_for_request(
+            sample_xyz, sample_grades, request, request.directions or [None]
+        )
+        return {
+            "element": request.element,
+            "sample_count": len(sample_grades),
+            "sample_variance": float(np.var(sample_grades)),
+            "variograms": variograms
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute variogram: {str(e)}")
 
-@app.post("/api/block-models/create")
-def create_block_model(request: BlockModelRequest):
+
+@app.post("/api/variogram-models")
+def create_variogram_model(request: VariogramModelCreate):
     """
-    PHASE 5: Create a 3D block model grid
+    Fit and store a variogram model (or store a manual one).
     
-    Generates a regular 3D grid of blocks (voxels) for resource estimation.
-    Each block will later be populated with grade estimates via kriging.
+    Isotropic fits use the omnidirectional variogram; anisotropic fits use
+    experimental variograms along the major, semi-major and minor axes of
+    azimuth/dip/rake. Each entry of structures adds a nested structure.
     """
+    valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+    if request.element not in valid_elements:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
+        )
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Calculate grid dimensions
-        nx = int(np.ceil((request.x_max - request.x_min) / request.block_size_x))
-        ny = int(np.ceil((request.y_max - request.y_min) / request.block_size_y))
-        nz = int(np.ceil((request.z_max - request.z_min) / request.block_size_z))
-        
-        total_blocks = nx * ny * nz
+        sample_xyz, sample_grades = fetch_element_samples(
+            conn, request.project_id, request.element, request.composite_set_id
+        )
+        experimental = None
         
-        # Limit block count for performance
-        if total_blocks > 1000000:  # 1 million blocks
-            raise HTTPException(
-                status_code=400,
-                detail=f"Block model too large: {total_blocks:,} blocks. Maximum is 1,000,000. "
-                       f"Increase block size or reduce extents."
+        if request.model:
+            try:
+                variogram = VariogramModel.from_dict(request.model)
+            except (KeyError, TypeError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=f"Invalid variogram model: {str(e)}")
+        else:
+            if len(sample_grades) < 3:
+                raise HTTPException(status_code=400, detail="Not enough samples to fit a variogram")
+            if request.anisotropic:
+                axes = rotation_matrix(request.azimuth, request.dip, request.rake)
+                # (azimuth, dip) of each principal axis
+                directions = [
+                    {
+                        "azimuth": float(np.degrees(np.arctan2(axis[0], axis[1])) % 360),
+                        "dip": float(np.degrees(np.arcsin(np.clip(axis[2], -1, 1))))
+                    }
+                    for axis in axes
+                ]
+            else:
+                directions = [None]
+            experimental = experimental_for_request(sample_xyz, sample_grades, request, directions)
+            fit_input = {
+                key: [e[key] for e in experimental] if request.anisotropic else experimental[0][key]
+                for key in ("lags", "semivariance", "pair_counts")
+            }
+            variogram = fit_variogram(
+                fit_input['lags'], fit_input['semivariance'], fit_input['pair_counts'],
+                model_type=request.structures or ["spherical"],
+                azimuth=request.azimuth or 0.0,
+                dip=request.dip or 0.0,
+                rake=request.rake or 0.0
             )
         
-        # Create block model definition
+        model = variogram.to_dict()
         cur.execute("""
-            INSERT INTO block_models (
-                project_id, model_name, description,
-                x_min, x_max, y_min, y_max, z_min, z_max,
-                block_size_x, block_size_y, block_size_z,
-                nx, ny, nz,
-                interpolation_method, search_radius, min_samples, max_samples,
-                status
-            ) VALUES (
-                %s, %s, %s,
-                %s, %s, %s, %s, %s, %s,
-                %s, %s, %s,
-                %s, %s, %s,
-                %s, %s, %s, %s,
-                'draft'
-            ) RETURNING id, model_name, total_blocks, created_at
+            INSERT INTO variogram_models (
+                project_id, name, element, composite_set_id,
+                nugget, structures, azimuth, dip, rake, total_sill,
+                fitted, experimental, sample_count
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING *
         """, (
-            request.project_id, request.model_name, request.description,
-            request.x_min, request.x_max, request.y_min, request.y_max, request.z_min, request.z_max,
-            request.block_size_x, request.block_size_y, request.block_size_z,
-            nx, ny, nz,
-            request.interpolation_method, request.search_radius, request.min_samples, request.max_samples
+            request.project_id, request.name, request.element, request.composite_set_id,
+            model['nugget'], json.dumps(model['structures']), model['azimuth'], model['dip'],
+            model['rake'], model['total_sill'], request.model is None,
+            json.dumps(experimental) if experimental else None, len(sample_grades)
         ))
         
-        block_model = cur.fetchone()
-        block_model_id = block_model['id']
-        
+        variogram_model = cur.fetchone()
         conn.commit()
-        
-        # Generate individual block cells (voxels)
-        # For large models, this could be done asynchronously
-        blocks_created = 0
-        batch_size = 1000
-        blocks_batch = []
-        
-        for i in range(nx):
-            for j in range(ny):
-                for k in range(nz):
-                    # Calculate block centroid
-                    centroid_x = request.x_min + (i + 0.5) * request.block_size_x
-                    centroid_y = request.y_min + (j + 0.5) * request.block_size_y
-                    centroid_z = request.z_min + (k + 0.5) * request.block_size_z
-                    
-                    # Calculate block volume
-                    volume = request.block_size_x * request.block_size_y * request.block_size_z
-                    
-                    blocks_batch.append((
-                        block_model_id, i, j, k,
-                        centroid_x, centroid_y, centroid_z,
-                        volume
-                    ))
-                    
-                    # Insert in batches for performance
-                    if len(blocks_batch) >= batch_size:
-                        cur.executemany("""
-                            INSERT INTO block_model_cells (
-                                block_model_id, i, j, k,
-                                centroid_x, centroid_y, centroid_z,
-                                volume_m3,
-                                geometry
-                            ) VALUES (
-                                %s, %s, %s, %s,
-                                %s, %s, %s,
-                                %s,
-                                ST_SetSRID(ST_MakePoint(%s, %s, %s), 4326)
-                            )
-                        """, [(b[0], b[1], b[2], b[3], b[4], b[5], b[6], b[7], b[4], b[5], b[6]) for b in blocks_batch])
-                        blocks_created += len(blocks_batch)
-                        conn.commit()
-                        blocks_batch = []
-        
-        # Insert remaining blocks
-        if blocks_batch:
-            cur.executemany("""
-                INSERT INTO block_model_cells (
-                    block_model_id, i, j, k,
-                    centroid_x, centroid_y, centroid_z,
-                    volume_m3,
-                    geometry
-                ) VALUES (
-                    %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s,
-                    ST_SetSRID(ST_MakePoint(%s, %s, %s), 4326)
-                )
-            """, [(b[0], b[1], b[2], b[3], b[4], b[5], b[6], b[7], b[4], b[5], b[6]) for b in blocks_batch])
-            blocks_created += len(blocks_batch)
-            conn.commit()
-        
         cur.close()
         conn.close()
         
-        return {
-            "success": True,
-            "block_model_id": block_model_id,
-            "model_name": block_model['model_name'],
-            "grid_dimensions": {
-                "nx": nx,
-                "ny": ny,
-                "nz": nz
-            },
-            "total_blocks": block_model['total_blocks'],
-            "blocks_created": blocks_created,
-            "message": f"Block model '{block_model['model_name']}' created with {blocks_created:,} blocks"
-        }
-        
+        return {"variogram_model": variogram_model, "message": "Variogram model saved successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
+        raise HTTPException(status_code=500, detail=f"Failed to create variogram model: {str(e)}")
+
+
+@app.get("/api/variogram-models")
+def list_variogram_models(project_id: Optional[str] = None, element: Optional[str] = None):
+    """Get stored variogram models, optionally filtered by project and element"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        query = """
+            SELECT id, project_id, name, element, composite_set_id, nugget, structures,
+                   azimuth, dip, rake, total_sill, fitted, sample_count, created_at
+            FROM variogram_models
+            WHERE 1 = 1
+        """
+        query_params = []
+        if project_id:
+            query += " AND project_id = %s"
+            query_params.append(project_id)
+        if element:
+            query += " AND element = %s"
+            query_params.append(element)
+        query += " ORDER BY created_at DESC"
+        
+        cur.execute(query, query_params)
+        variogram_models = cur.fetchall()
+        cur.close()
+        conn.close()
+        
+        return {"variogram_models": variogram_models, "count": len(variogram_models)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch variogram models: {str(e)}")
+
+
+@app.get("/api/variogram-models/{variogram_model_id}")
+def get_variogram_model(variogram_model_id: str):
+    """Get a stored variogram model with the experimental variograms it was fitted to"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        variogram_model, _ = load_variogram_model(cur, variogram_model_id)
+        cur.close()
+        conn.close()
+        
+        return {"variogram_model": variogram_model}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch variogram model: {str(e)}")
+
+
+# ==================== CROSS-VALIDATION ====================
+
+# Most parameter sets one cross-validation job evaluates
+MAX_CV_PARAMETER_SETS = 500
+
+
+def cross_validation_sets(request: CrossValidationRequest) -> List[Dict]:
+    """Parameter sets to evaluate: the base set swept over the grid, plus explicit sets"""
+    base = {
+        "interpolation_method": "ordinary_kriging",
+        "search_radius": 50.0,
+        "min_samples": 3,
+        "max_samples": 12,
+        **(request.parameters or {})
+    }
+    sets = []
+    if request.grid:
+        names = list(request.grid)
+        for values in itertools.product(*(request.grid[name] for name in names)):
+            sets.append({**base, **dict(zip(names, values))})
+    for explicit in request.parameter_sets or []:
+        sets.append({**base, **explicit})
+    return sets or [base]
+
+
+@app.post("/api/cross-validation", status_code=202)
+def cross_validate_parameters(request: CrossValidationRequest):
+    """
+    Cross-validate estimation parameters on the samples of one element.
+    
+    Every sample is re-estimated from its neighbours with the block
+    estimation kernel: leave_one_out excludes the sample itself, kfold
+    deals the holes into `folds` groups and excludes the sample's whole
+    group. parameters is the base set, grid sweeps values over it (every
+    combination) and parameter_sets adds explicit sets; sets run in
+    parallel processes (n_workers, 0 = all cores).
+    
+    Runs as a modelling job: the result lists error statistics (bias, MAE,
+    RMSE, correlation, slope of regression, standardized errors for
+    kriging) per parameter set, best (lowest RMSE) first.
+    """
+    valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+    if request.element not in valid_elements:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
+        )
+    if request.scheme not in CV_SCHEMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid scheme. Must be one of: {', '.join(CV_SCHEMES)}"
+        )
+    if request.scheme == "kfold" and (request.folds or 0) < 2:
+        raise HTTPException(status_code=400, detail="kfold needs at least 2 folds")
+    
+    sets = cross_validation_sets(request)
+    if len(sets) > MAX_CV_PARAMETER_SETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(sets)} parameter sets requested; the limit is {MAX_CV_PARAMETER_SETS}"
+        )
+    for values in sets:
+        if values.get('interpolation_method') not in ("ordinary_kriging", "idw"):
+            raise HTTPException(status_code=400, detail="interpolation_method must be 'ordinary_kriging' or 'idw'")
+        try:
+            search_settings(values)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid parameter set {values}: {str(e)}")
+    
+    return submit_job('cross_validation', request.model_dump(), project_id=request.project_id)
+
+
+@job_handler('cross_validation')
+def run_cross_validation(params: Dict, job: JobContext):
+    request = CrossValidationRequest(**params)
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        job.progress(0.0, "Loading samples", force=True)
+        sample_xyz, sample_grades, holes = fetch_samples(
+            conn, request.project_id, [request.element], request.composite_set_id, with_holes=True
+        )
+        grades = sample_grades[:, 0]
+        if len(grades) < 3:
+            raise HTTPException(status_code=400, detail="Not enough samples for cross-validation (need at least 3)")
+        
+        # Variograms: inline models, stored models (loaded once each), or
+        # one model fitted to the samples shared by every other set
+        stored = {}
+        fitted = []
+        
+        def variogram_for(values):
+            if values.get('variogram'):
+                return VariogramModel.from_dict(values['variogram'])
+            variogram_model_id = values.get('variogram_model_id') or request.variogram_model_id
+            if variogram_model_id:
+                if variogram_model_id not in stored:
+                    stored[variogram_model_id] = load_variogram_model(cur, variogram_model_id, request.project_id)[1]
+                return stored[variogram_model_id]
+            if not fitted:
+                lags, semivariance, pair_counts = experimental_variogram(sample_xyz, grades)
+                fitted.append(fit_variogram(lags, semivariance, pair_counts))
+            return fitted[0]
+        
+        sets = cross_validation_sets(request)
+        param_sets = []
+        for values in sets:
+            ellipsoid, passes = search_settings(values)
+            method = values.get('interpolation_method') or 'ordinary_kriging'
+            param_sets.append(EstimationParams(
+                method=method,
+                search_radius=float(values['search_radius']),
+                min_samples=int(values['min_samples']),
+                max_samples=int(values['max_samples']),
+                variogram=variogram_for(values) if method != 'idw' else None,
+                ellipsoid=ellipsoid,
+                passes=passes
+            ))
+        cur.close()
+        conn.close()
+        
+        folds = hole_folds(holes, request.folds, request.seed) if request.scheme == "kfold" else None
+        job.progress(0.05, f"Cross-validating {len(param_sets)} parameter sets", force=True)
+        statistics = cross_validate(
+            sample_xyz, grades, param_sets, folds=folds,
+            n_workers=int(request.n_workers or 0),
+            progress=lambda fraction: job.progress(0.05 + 0.95 * fraction, "Cross-validating")
+        )
+        
+        results = [
+            {
+                "parameters": values,
+                "variogram": params.variogram.to_dict() if params.variogram else None,
+                **stats
+            }
+            for values, params, stats in zip(sets, param_sets, statistics)
+        ]
+        results.sort(key=lambda result: result.get('rmse', np.inf))
+        
+        return {
+            "success": True,
+            "project_id": request.project_id,
+            "element": request.element,
+            "composite_set_id": request.composite_set_id,
+            "scheme": request.scheme,
+            "folds": int(request.folds) if folds is not None else None,
+            "sample_count": len(grades),
+            "hole_count": int(len(np.unique(holes))),
+            "results": results,
+            "best": results[0]
+        }
+    except (HTTPException, JobCancelled):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cross-validate: {str(e)}")
+
+
+# ==================== MODELLING JOB ENDPOINTS ====================
+
+def submit_job(job_type: str, params: Dict, project_id: Optional[str] = None, block_model_id: Optional[str] = None):
+    """Queue a modelling job for worker.py and describe it to the client"""
+    try:
+        conn = get_db_connection()
+        job = enqueue_job(conn, job_type, params, project_id=project_id, block_model_id=block_model_id)
+        conn.close()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to queue {job_type} job: {str(e)}"
+        )
+    
+    return {
+        "success": True,
+        "job_id": job['id'],
+        "job_type": job['job_type'],
+        "status": job['status'],
+        "status_url": f"/api/jobs/{job['id']}",
+        "result_url": f"/api/jobs/{job['id']}/result"
+    }
+
+
+def fetch_block_model(block_model_id: str):
+    """block_models row, or 404"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+    block_model = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not block_model:
+        raise HTTPException(status_code=404, detail="Block model not found")
+    return block_model
+
+
+@app.get("/api/jobs")
+def list_jobs(project_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    """List recent modelling jobs, optionally filtered by project and status"""
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {', '.join(JOB_STATUSES)}")
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT id, job_type, project_id, block_model_id, status, progress, progress_message,
+                   error, created_at, started_at, finished_at
+            FROM modelling_jobs
+            WHERE (%s::uuid IS NULL OR project_id = %s::uuid)
+              AND (%s::text IS NULL OR status = %s)
+            ORDER BY created_at DESC
+            LIMIT %s
+        """, (project_id, project_id, status, status, min(max(limit, 1), 500)))
+        
+        jobs = cur.fetchall()
+        cur.close()
+        conn.close()
+        
+        return {"jobs": jobs, "count": len(jobs)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch jobs: {str(e)}")
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status and progress (0..1) of a modelling job"""
+    try:
+        conn = get_db_connection()
+        job = get_job_row(conn, job_id)
+        conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch job: {str(e)}")
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """
+    Cancel a modelling job. Queued jobs are cancelled at once; running jobs
+    stop at their next progress report without saving partial results.
+    """
+    try:
+        conn = get_db_connection()
+        job = request_cancel(conn, job_id)
+        conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cancel job: {str(e)}")
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, **job}
+
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """Result of a finished job (the response the endpoint used to return inline)"""
+    try:
+        conn = get_db_connection()
+        job = get_job_row(conn, job_id, include_result=True)
+        conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch job result: {str(e)}")
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] != 'succeeded':
+        raise HTTPException(
+            status_code=409,
+            detail={"status": job['status'], "progress": job['progress'], "error": job['error']}
+        )
+    return job['result']
+
+
+# ==================== GEOSTATISTICS & MODELING ENDPOINTS ====================
+
+# Section-grade results by request parameters and project data version
+section_grade_cache = ResultCache("section_grade", int(RESULT_CACHE_MB * 1024 * 1024))
+
+
+def section_geometry(section_line: Dict) -> Dict:
+    """Start, end, unit direction and length of a section line {x1, y1, x2, y2} (400 if invalid)"""
+    try:
+        start = np.array([float(section_line['x1']), float(section_line['y1'])])
+        end = np.array([float(section_line['x2']), float(section_line['y2'])])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="section_line needs numeric x1, y1, x2 and y2")
+    length = float(np.linalg.norm(end - start))
+    if length <= 0:
+        raise HTTPException(status_code=400, detail="section_line must have two distinct end points")
+    return {"start": start, "end": end, "direction": (end - start) / length, "length": length}
+
+
+def variogram_search_ellipsoid(variogram: VariogramModel) -> SearchEllipsoid:
+    """Search ellipsoid with the ranges and orientation of the variogram's longest structure"""
+    structure = variogram.structures[-1]
+    return SearchEllipsoid(
+        major=float(structure.ranges[0]), semi=float(structure.ranges[1]),
+        minor=float(structure.ranges[2]),
+        azimuth=variogram.azimuth, dip=variogram.dip, rake=variogram.rake
+    )
+
+
+def section_points(section: Dict, along: np.ndarray, elevation: np.ndarray) -> np.ndarray:
+    """World coordinates of (distance along, elevation) positions on the section plane"""
+    plan = section["start"] + np.asarray(along)[:, None] * section["direction"]
+    return np.column_stack([plan, elevation])
+
+
+@app.post("/api/model/section-grade")
+def interpolate_grade(request: GradeInterpolationRequest):
+    """
+    PHASE 4: Grade Interpolation (Ordinary Kriging)
+    
+    Interpolates element grades across a 2D grid for visualization.
+    Returns a grid of estimated grades that can be visualized as a heatmap.
+    Kriging uses a moving neighbourhood: each grid node is estimated from
+    its max_samples closest samples, so large projects stay fast.
+    
+    With section_line {x1, y1, x2, y2} the grid is a vertical section:
+    samples within section_corridor metres of the line (read through a
+    spatial index) are projected onto it at their desurveyed positions
+    and interpolated on a (distance along, elevation) grid.
+    
+    Results are cached per project data version (migration 021), so a
+    repeat request on unchanged data is served without recomputation.
+    
+    With background=true the interpolation runs as a modelling job and a
+    job id is returned instead (result via /api/jobs/{job_id}/result).
+    """
+    if request.section_line:
+        section_geometry(request.section_line)
+    if request.background:
+        return submit_job('section_grade', request.model_dump(), project_id=request.project_id)
+    return Response(content=section_grade_payload(request.model_dump()), media_type="application/json")
+
+
+@job_handler('section_grade')
+def run_section_grade(params: Dict, job: Optional[JobContext] = None):
+    """Section-grade interpolation as a modelling job"""
+    return json.loads(section_grade_payload(params))
+
+
+def section_grade_payload(params: Dict) -> bytes:
+    """
+    Section-grade result as JSON bytes: from the result cache when the
+    project's data version and the request parameters match a previous
+    run, otherwise interpolated and cached.
+    """
+    request = GradeInterpolationRequest(**params)
+    try:
+        conn = get_db_connection()
+        version = data_version(conn, request.project_id)
+        key = section_grade_cache.key(request.project_id, version, request.model_dump(exclude={"background"}))
+        payload = section_grade_cache.get(conn, key)
+        if payload is None:
+            payload = json.dumps(interpolate_section_grade(conn, request)).encode()
+            section_grade_cache.put(conn, key, request.project_id, version, payload)
+        conn.close()
+        return payload
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Grade interpolation failed: {str(e)}"
+        )
+
+
+def prepare_section_grade(conn, request: GradeInterpolationRequest) -> Dict:
+    """
+    Everything a section-grade grid needs before nodes are estimated:
+    samples in grid coordinates, node axes, and the variogram with its
+    KD-tree search (kriging) or the triangulation (idw). Node estimates
+    at any subset of the grid then reuse these, level after level.
+    """
+    cur = conn.cursor()
+    
+    # Validate element column exists
+    valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+    if request.element not in valid_elements:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
+        )
+    
+    # Vertical section: only samples in the corridor around the line
+    section = section_geometry(request.section_line) if request.section_line else None
+    corridor = None
+    if section is not None:
+        corridor = (*section["start"], *section["end"], float(request.section_corridor or 25.0))
+    
+    # Desurveyed assay midpoints, or composites of the selected set
+    sample_xyz, sample_grades = fetch_element_samples(
+        conn, request.project_id, request.element, request.composite_set_id, corridor=corridor
+    )
+    variogram = None
+    if request.variogram_model_id:
+        _, variogram = load_variogram_model(cur, request.variogram_model_id, request.project_id)
+    cur.close()
+    
+    if section is not None:
+        # Project onto the section plane: distance along the line and
+        # elevation; samples beyond the line ends are dropped
+        along = (sample_xyz[:, :2] - section["start"]) @ section["direction"]
+        keep = (along >= 0) & (along <= section["length"])
+        sample_xyz, sample_grades, along = sample_xyz[keep], sample_grades[keep], along[keep]
+    
+    if len(sample_grades) < 3:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough data points for interpolation. Found {len(sample_grades)}, need at least 3."
+        )
+    
+    # Extract coordinates and grades: plan x/y, or distance along the
+    # section and elevation
+    if section is not None:
+        x = along
+        y = sample_xyz[:, 2]
+    else:
+        x = sample_xyz[:, 0]
+        y = sample_xyz[:, 1]
+    z = sample_grades
+    
+    # Grid axes
+    grid_resolution = request.grid_resolution
+    xi = np.linspace(0.0, section["length"], grid_resolution) if section is not None else np.linspace(x.min(), x.max(), grid_resolution)
+    yi = np.linspace(y.min(), y.max(), grid_resolution)
+    
+    return {
+        "section": section, "corridor": corridor, "x": x, "y": y, "z": z,
+        "sample_xyz": sample_xyz, "xi": xi, "yi": yi, "variogram": variogram
+    }
+
+
+def section_grade_estimator(request: GradeInterpolationRequest, prepared: Dict) -> Dict:
+    """
+    Fit the variogram (unless stored) and build the search structure once:
+    KD-tree in the variogram's anisotropy for kriging, Delaunay
+    triangulation for idw. Adds them to prepared and returns it.
+    """
+    x, y, z, section = prepared["x"], prepared["y"], prepared["z"], prepared["section"]
+    if request.interpolation_method == "kriging":
+        # Ordinary Kriging (geostatistical interpolation) with the stored
+        # variogram, or one fitted once here from KD-tree pairs (seeded,
+        # so repeated requests give the same grid)
+        # Samples in 3D: on the section plane (so the 3D variogram
+        # anisotropy applies), or projected onto one level
+        if section is not None:
+            points = section_points(section, x, y)
+        else:
+            points = np.column_stack([x, y, np.zeros(len(x))])
+        if prepared["variogram"] is None:
+            lags, semivariance, pair_counts = experimental_variogram(
+                points if section is not None else prepared["sample_xyz"][:, :2], z
+            )
+            prepared["variogram"] = fit_variogram(lags, semivariance, pair_counts)
+        ellipsoid = variogram_search_ellipsoid(prepared["variogram"])
+        prepared["points"] = points
+        prepared["ellipsoid"] = ellipsoid
+        prepared["tree"] = cKDTree(ellipsoid.transform(points))
+    else:
+        # Inverse Distance Weighting (simpler, faster): linear
+        # interpolation over the Delaunay triangulation of the samples
+        prepared["interpolator"] = LinearNDInterpolator(np.column_stack([x, y]), z)
+    return prepared
+
+
+def estimate_section_nodes(
+    request: GradeInterpolationRequest, prepared: Dict, rows: np.ndarray, cols: np.ndarray
+) -> np.ndarray:
+    """Estimates at grid nodes (yi[rows], xi[cols]), NaN outside data coverage"""
+    node_x, node_y = prepared["xi"][cols], prepared["yi"][rows]
+    if request.interpolation_method != "kriging":
+        return prepared["interpolator"](node_x, node_y)
+    
+    if prepared["section"] is not None:
+        nodes = section_points(prepared["section"], node_x, node_y)
+    else:
+        nodes = np.column_stack([node_x, node_y, np.zeros(len(node_x))])
+    # Moving neighbourhood: each node is kriged from its max_samples
+    # closest samples (in the anisotropy of the longest structure), so
+    # cost does not grow with the square of the sample count
+    tree = prepared["tree"]
+    neighbourhood = search_neighbours(
+        prepared["ellipsoid"].transform(nodes), tree.data, np.inf, int(request.max_samples or 16), tree=tree
+    )
+    return ordinary_kriging(nodes, prepared["points"], prepared["z"], neighbourhood, prepared["variogram"]).estimate
+
+
+def section_grade_response(request: GradeInterpolationRequest, prepared: Dict, zi_grid: np.ndarray) -> Dict:
+    """Section-grade result for a full grid of estimates"""
+    x, y, z = prepared["x"], prepared["y"], prepared["z"]
+    section, corridor, variogram = prepared["section"], prepared["corridor"], prepared["variogram"]
+    xi, yi = prepared["xi"], prepared["yi"]
+    
+    # Handle NaN values (areas outside data coverage)
+    zi_grid = np.nan_to_num(zi_grid, nan=0.0)
+    
+    # Calculate statistics
+    stats = {
+        "min": float(np.min(z)),
+        "max": float(np.max(z)),
+        "mean": float(np.mean(z)),
+        "median": float(np.median(z)),
+        "std_dev": float(np.std(z)),
+        "data_points": len(z)
+    }
+    
+    # Return grid data and metadata
+    return {
+        "success": True,
+        "element": request.element,
+        "method": request.interpolation_method,
+        "variogram_model_id": request.variogram_model_id,
+        "variogram": variogram.to_dict() if variogram else None,
+        "section": {
+            "x1": float(section["start"][0]), "y1": float(section["start"][1]),
+            "x2": float(section["end"][0]), "y2": float(section["end"][1]),
+            "length": float(section["length"]),
+            "corridor": corridor[4]
+        } if section is not None else None,
+        "grid": {
+            # Section grids: x is distance along the line, y elevation
+            "axes": ["distance_along", "elevation"] if section is not None else ["x", "y"],
+            "x_min": float(xi.min()),
+            "x_max": float(xi.max()),
+            "y_min": float(yi.min()),
+            "y_max": float(yi.max()),
+            "resolution": request.grid_resolution,
+            "values": zi_grid.tolist()  # 2D array of interpolated grades
+        },
+        "statistics": stats,
+        "sample_locations": [
+            {"x": float(xi), "y": float(yi), "grade": float(gi)} 
+            for xi, yi, gi in zip(x, y, z)
+        ]
+    }
+
+
+def interpolate_section_grade(conn, request: GradeInterpolationRequest) -> Dict:
+    """Interpolate a section-grade grid (plan view or vertical section)"""
+    try:
+        prepared = section_grade_estimator(request, prepare_section_grade(conn, request))
+        rows, cols = np.indices((request.grid_resolution, request.grid_resolution))
+        zi_grid = estimate_section_nodes(request, prepared, rows.ravel(), cols.ravel())
+        return section_grade_response(request, prepared, zi_grid.reshape(rows.shape))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Grade interpolation failed: {str(e)}"
+        )
+
+
+# Coarsest progressive level: at most this many nodes per axis
+PROGRESSIVE_FIRST_RESOLUTION = 32
+
+
+def progressive_strides(resolution: int) -> List[int]:
+    """Node strides of the progressive levels, coarsest first and ending at 1"""
+    stride = 1
+    while -(-resolution // stride) > PROGRESSIVE_FIRST_RESOLUTION:
+        stride *= 2
+    strides = []
+    while stride >= 1:
+        strides.append(stride)
+        stride //= 2
+    return strides
+
+
+def sse_event(event: str, data) -> bytes:
+    """One Server-Sent Event; data is a JSON-ready dict or already encoded JSON bytes"""
+    if not isinstance(data, bytes):
+        data = json.dumps(data).encode()
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+def section_level_event(prepared: Dict, index: np.ndarray, values: np.ndarray, level: int, stride: int, method: str) -> bytes:
+    """A coarse grid of the progressive stream: every stride-th node of the final grid"""
+    xi, yi = prepared["xi"][index], prepared["yi"][index]
+    return sse_event("level", {
+        "level": level,
+        "stride": stride,
+        "method": method,
+        "grid": {
+            "axes": ["distance_along", "elevation"] if prepared["section"] is not None else ["x", "y"],
+            "x_min": float(xi[0]),
+            "x_max": float(xi[-1]),
+            "y_min": float(yi[0]),
+            "y_max": float(yi[-1]),
+            "resolution": len(index),
+            "values": np.nan_to_num(values, nan=0.0).tolist()
+        }
+    })
+
+
+def section_grade_events(params: Dict):
+    """
+    Server-Sent Events of a progressive section-grade interpolation:
+    a "level" preview (inverse distance from the nearest samples, before
+    any variogram fit), "level" grids of every stride-th node refined
+    coarse to fine, then the full "result" (as the non-streamed endpoint
+    returns). Each level estimates only nodes its coarser levels did not,
+    with one sample query, variogram and KD-tree for all levels. Cached
+    results are sent as the result straight away; failures end the stream
+    with an "error" event.
+    """
+    request = GradeInterpolationRequest(**params)
+    conn = None
+    try:
+        conn = get_db_connection()
+        version = data_version(conn, request.project_id)
+        key = section_grade_cache.key(request.project_id, version, request.model_dump(exclude={"background"}))
+        payload = section_grade_cache.get(conn, key)
+        if payload is not None:
+            yield sse_event("result", payload)
+            return
+        
+        prepared = prepare_section_grade(conn, request)
+        n = request.grid_resolution
+        strides = progressive_strides(n)
+        
+        # Preview on the coarsest level while nothing is fitted yet
+        index = np.arange(0, n, strides[0])
+        rows, cols = np.meshgrid(index, index, indexing="ij")
+        neighbourhood = search_neighbours(
+            np.column_stack([prepared["xi"][cols.ravel()], prepared["yi"][rows.ravel()]]),
+            np.column_stack([prepared["x"], prepared["y"]]), np.inf, int(request.max_samples or 16)
+        )
+        preview, _, _ = idw_estimate(prepared["z"], neighbourhood)
+        yield section_level_event(prepared, index, preview.reshape(rows.shape), 0, strides[0], "preview")
+        
+        section_grade_estimator(request, prepared)
+        zi_grid = np.full((n, n), np.nan)
+        estimated = np.zeros((n, n), dtype=bool)
+        for level, stride in enumerate(strides, start=1):
+            index = np.arange(0, n, stride)
+            rows, cols = np.meshgrid(index, index, indexing="ij")
+            new = ~estimated[rows, cols]
+            rows, cols = rows[new], cols[new]
+            zi_grid[rows, cols] = estimate_section_nodes(request, prepared, rows, cols)
+            estimated[rows, cols] = True
+            if stride > 1:
+                yield section_level_event(
+                    prepared, index, zi_grid[np.ix_(index, index)], level, stride, request.interpolation_method
+                )
+        
+        payload = json.dumps(section_grade_response(request, prepared, zi_grid)).encode()
+        section_grade_cache.put(conn, key, request.project_id, version, payload)
+        yield sse_event("result", payload)
+    except HTTPException as e:
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        yield sse_event("error", {"status_code": 500, "detail": f"Grade interpolation failed: {str(e)}"})
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+@app.post("/api/model/section-grade/stream")
+def stream_section_grade(request: GradeInterpolationRequest):
+    """
+    Section-grade interpolation streamed coarse to fine as Server-Sent
+    Events (text/event-stream; read with fetch, as EventSource cannot
+    POST). See section_grade_events for the events.
+    """
+    if request.section_line:
+        section_geometry(request.section_line)
+    return StreamingResponse(
+        section_grade_events(request.model_dump()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Plan-view grade tile sources and encoded tiles, per project data version
+grade_tile_sources = TileSourceCache()
+grade_tile_cache = ResultCache("grade_tiles", int(RESULT_CACHE_MB * 1024 * 1024))
+
+
+def grade_tile_source(
+    conn, project_id: str, element: str, composite_set_id: Optional[str],
+    variogram_model_id: Optional[str], max_samples: int, version: int
+) -> GradeTileSource:
+    """Samples, variogram and search of one plan-view grade surface, built once per data version"""
+    valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+    if element not in valid_elements:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
+        )
+    if not 1 <= max_samples <= 64:
+        raise HTTPException(status_code=400, detail="max_samples must be between 1 and 64")
+    
+    def build():
+        sample_xyz, sample_grades = fetch_element_samples(conn, project_id, element, composite_set_id)
+        if len(sample_grades) < 3:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough data points for interpolation. Found {len(sample_grades)}, need at least 3."
+            )
+        if variogram_model_id:
+            cur = conn.cursor()
+            _, variogram = load_variogram_model(cur, variogram_model_id, project_id)
+            cur.close()
+        else:
+            lags, semivariance, pair_counts = experimental_variogram(sample_xyz[:, :2], sample_grades)
+            variogram = fit_variogram(lags, semivariance, pair_counts)
+        return GradeTileSource(
+            sample_xyz[:, :2], sample_grades, variogram, variogram_search_ellipsoid(variogram), max_samples
+        )
+    
+    key = (str(project_id), element, composite_set_id, variogram_model_id, max_samples, version)
+    return grade_tile_sources.get(key, build)
+
+
+@app.get("/api/projects/{project_id}/grade-tiles/{element}")
+def get_grade_tile_frame(
+    project_id: str,
+    element: str,
+    composite_set_id: Optional[str] = None,
+    variogram_model_id: Optional[str] = None,
+    max_samples: int = 16
+):
+    """
+    Frame of the plan-view grade tile pyramid of an element: the square
+    covered by zoom 0, the png grade scale and the tile URL template.
+    
+    Tiles (z/x/y, x east and y south from the north-west corner) are
+    kriged on demand with a moving neighbourhood when first requested and
+    cached per project data version, so a viewer only ever pays for the
+    tiles it shows.
+    """
+    try:
+        conn = get_db_connection()
+        version = data_version(conn, project_id)
+        source = grade_tile_source(
+            conn, project_id, element, composite_set_id, variogram_model_id, max_samples, version
+        )
+        conn.close()
+        
+        return {
+            "project_id": project_id,
+            "element": element,
+            "data_version": version,
+            **source.frame(),
+            "variogram": source.variogram.to_dict(),
+            "tile_sizes": list(TILE_SIZES),
+            "default_tile_size": DEFAULT_TILE_SIZE,
+            "max_zoom": MAX_TILE_ZOOM,
+            "formats": list(TILE_FORMATS),
+            "tile_url": f"/api/projects/{project_id}/grade-tiles/{element}/{{z}}/{{x}}/{{y}}"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to prepare grade tiles: {str(e)}")
+
+
+@app.get("/api/projects/{project_id}/grade-tiles/{element}/{z}/{x}/{y}")
+def get_grade_tile(
+    project_id: str,
+    element: str,
+    z: int,
+    x: int,
+    y: int,
+    format: str = "png",
+    size: int = DEFAULT_TILE_SIZE,
+    composite_set_id: Optional[str] = None,
+    variogram_model_id: Optional[str] = None,
+    max_samples: int = 16
+):
+    """
+    One plan-view grade tile, kriged on first request and then served
+    from the result cache until the project's data changes.
+    
+    format=png is 8-bit grey + alpha scaled over the frame's value range
+    (alpha 0 where no sample is within search reach); format=f16 is raw
+    little-endian float16 grades, north row first, NaN where empty.
+    """
+    if format not in TILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(TILE_FORMATS)}")
+    if size not in TILE_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(TILE_SIZES)}")
+    if not 0 <= z <= MAX_TILE_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Tile {z}/{x}/{y} is outside the pyramid (max zoom {MAX_TILE_ZOOM})")
+    try:
+        conn = get_db_connection()
+        version = data_version(conn, project_id)
+        key = grade_tile_cache.key(project_id, version, {
+            "element": element, "composite_set_id": composite_set_id, "variogram_model_id": variogram_model_id,
+            "max_samples": max_samples, "z": z, "x": x, "y": y, "size": size, "format": format
+        })
+        payload = grade_tile_cache.get(conn, key)
+        if payload is None:
+            source = grade_tile_source(
+                conn, project_id, element, composite_set_id, variogram_model_id, max_samples, version
+            )
+            payload = encode_tile(source.render(z, x, y, size), format, source.value_range)
+            grade_tile_cache.put(conn, key, project_id, version, payload)
+        conn.close()
+        
+        return Response(content=payload, media_type=TILE_FORMATS[format], headers={"ETag": f'"{key}"'})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to render grade tile: {str(e)}")
+
+
+@app.get("/api/model/available-elements/{project_id}")
+def get_available_elements(project_id: str):
+    """
+    Get list of elements with data for a project
+    Helps frontend know which elements can be interpolated
+    """
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        # Check which element columns have data
+        cur.execute("""
+            SELECT 
+                COUNT(CASE WHEN a.au_ppm IS NOT NULL AND a.au_ppm > 0 THEN 1 END) as au_count,
+                COUNT(CASE WHEN a.ag_ppm IS NOT NULL AND a.ag_ppm > 0 THEN 1 END) as ag_count,
+                COUNT(CASE WHEN a.cu_ppm IS NOT NULL AND a.cu_ppm > 0 THEN 1 END) as cu_count,
+                COUNT(CASE WHEN a.pb_ppm IS NOT NULL AND a.pb_ppm > 0 THEN 1 END) as pb_count,
+                COUNT(CASE WHEN a.zn_ppm IS NOT NULL AND a.zn_ppm > 0 THEN 1 END) as zn_count
+            FROM assays a
+            JOIN core_samples cs ON cs.id = a.sample_id
+            JOIN drill_holes dh ON dh.id = cs.drill_hole_id
+            WHERE dh.project_id = %s
+        """, (project_id,))
+        
+        counts = cur.fetchone()
+        cur.close()
+        conn.close()
+        
+        elements = []
+        element_map = {
+            "au_ppm": {"name": "Gold (Au)", "unit": "ppm", "count": counts['au_count']},
+            "ag_ppm": {"name": "Silver (Ag)", "unit": "ppm", "count": counts['ag_count']},
+            "cu_ppm": {"name": "Copper (Cu)", "unit": "ppm", "count": counts['cu_count']},
+            "pb_ppm": {"name": "Lead (Pb)", "unit": "ppm", "count": counts['pb_count']},
+            "zn_ppm": {"name": "Zinc (Zn)", "unit": "ppm", "count": counts['zn_count']}
+        }
+        
+        for key, value in element_map.items():
+            if value['count'] > 0:
+                elements.append({
+                    "id": key,
+                    "name": value['name'],
+                    "unit": value['unit'],
+                    "sample_count": value['count']
+                })
+        
+        return {"elements": elements, "count": len(elements)}
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch available elements: {str(e)}"
+        )
+
+
+# ==================== BLOCK MODEL & RESOURCE ESTIMATION ENDPOINTS (PHASE 5) ====================
+
+def block_grid_dimensions(request: BlockModelRequest):
+    """Parent grid nx, ny, nz of a block model request (400 if over the limits)"""
+    nx = int(np.ceil((request.x_max - request.x_min) / request.block_size_x))
+    ny = int(np.ceil((request.y_max - request.y_min) / request.block_size_y))
+    nz = int(np.ceil((request.z_max - request.z_min) / request.block_size_z))
+    
+    total_blocks = nx * ny * nz
+    
+    # Limit block count for performance
+    if total_blocks > 1000000:  # 1 million blocks
+        raise HTTPException(
+            status_code=400,
+            detail=f"Block model too large: {total_blocks:,} blocks. Maximum is 1,000,000. "
+                   f"Increase block size or reduce extents."
+        )
+    
+    if not 0 <= int(request.sub_block_levels or 0) <= MAX_SUB_BLOCK_LEVEL:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sub_block_levels must be between 0 and {MAX_SUB_BLOCK_LEVEL}"
+        )
+    return nx, ny, nz
+
+
+def search_settings(block_model: Dict):
+    """
+    Search ellipsoid and passes of a block model (row or create request).
+    Raises ValueError on invalid settings.
+    """
+    radius = float(block_model.get('search_radius') or 50.0)
+    ellipsoid = SearchEllipsoid(
+        major=radius,
+        semi=block_model.get('search_radius_semi'),
+        minor=block_model.get('search_radius_minor'),
+        azimuth=float(block_model.get('search_azimuth') or 0.0),
+        dip=float(block_model.get('search_dip') or 0.0),
+        rake=float(block_model.get('search_rake') or 0.0)
+    )
+    if min(ellipsoid.radii) <= 0:
+        raise ValueError("Search radii must be positive")
+
+    passes = block_model.get('search_passes')
+    if isinstance(passes, str):
+        passes = json.loads(passes)
+    if not passes:
+        return ellipsoid, None
+    search_passes = [
+        SearchPass(
+            scale=float(p.get('scale', 1.0)),
+            min_samples=int(p.get('min_samples', block_model.get('min_samples') or 3)),
+            max_samples=int(p.get('max_samples', block_model.get('max_samples') or 12))
+        )
+        for p in passes
+    ]
+    if len(search_passes) > 255:
+        raise ValueError("At most 255 search passes are supported")
+    for search_pass in search_passes:
+        if search_pass.scale <= 0 or search_pass.min_samples < 1 or search_pass.max_samples < search_pass.min_samples:
+            raise ValueError("Each search pass needs scale > 0 and 1 <= min_samples <= max_samples")
+    return ellipsoid, search_passes
+
+
+@app.post("/api/block-models/create", status_code=202)
+def create_block_model(request: BlockModelRequest):
+    """
+    PHASE 5: Create a 3D block model grid
+    
+    Generates a regular 3D grid of blocks (voxels) for resource estimation.
+    Each block will later be populated with grade estimates via kriging.
+    
+    With sub_block_levels > 0 the grid becomes the parent grid of an octree:
+    parents containing lithology contacts, vein intercepts or samples
+    (sub_block_on) are split down to sub_block_levels, everything else stays
+    one parent block. The 1,000,000 limit then applies to parent blocks.
+    
+    Runs as a modelling job: returns a job id; the model summary is the
+    job result (/api/jobs/{job_id}/result).
+    """
+    block_grid_dimensions(request)
+    try:
+        search_settings(request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return submit_job('create_block_model', request.model_dump(), project_id=request.project_id)
+
+
+@job_handler('create_block_model')
+def run_create_block_model(params: Dict, job: JobContext):
+    request = BlockModelRequest(**params)
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        nx, ny, nz = block_grid_dimensions(request)
+        total_blocks = nx * ny * nz
+        sub_block_levels = int(request.sub_block_levels or 0)
+        
+        grid = {
+            "x_min": request.x_min, "y_min": request.y_min, "z_min": request.z_min,
+            "block_size_x": request.block_size_x,
+            "block_size_y": request.block_size_y,
+            "block_size_z": request.block_size_z,
+            "nx": nx, "ny": ny, "nz": nz
+        }
+        
+        # Octree cells refined around contacts/veins/samples
+        cells = None
+        if sub_block_levels > 0:
+            job.progress(0.1, "Sub-blocking around geological features", force=True)
+            # Finest cell edge along any axis, so sampled veins miss no finest cell
+            finest_step = min(
+                request.block_size_x, request.block_size_y, request.block_size_z
+            ) / (1 << sub_block_levels)
+            if "samples" in (request.sub_block_on or []):
+                ensure_sample_coordinates(conn, request.project_id)
+            seeds = fetch_sub_block_seeds(
+                cur, request.project_id, request.sub_block_on or [], finest_step
+            )
+            cells = build_octree(grid, seeds, sub_block_levels)
+            if len(cells['cell_parent']) > MAX_BLOCK_CELLS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Sub-blocked model too large: {len(cells['cell_parent']):,} cells. "
+                           f"Maximum is {MAX_BLOCK_CELLS:,}. Reduce sub_block_levels."
+                )
+        total_cells = len(cells['cell_parent']) if cells is not None else total_blocks
+        
+        # Create block model definition
+        cur.execute("""
+            INSERT INTO block_models (
+                project_id, model_name, description, model_type,
+                x_min, x_max, y_min, y_max, z_min, z_max,
+                block_size_x, block_size_y, block_size_z,
+                nx, ny, nz, sub_block_levels, total_cells,
+                interpolation_method, search_radius, min_samples, max_samples,
+                search_radius_semi, search_radius_minor,
+                search_azimuth, search_dip, search_rake, search_passes,
+                status
+            ) VALUES (
+                %s, %s, %s, %s,
+                %s, %s, %s, %s, %s, %s,
+                %s, %s, %s,
+                %s, %s, %s, %s, %s,
+                %s, %s, %s, %s,
+                %s, %s,
+                %s, %s, %s, %s,
+                'draft'
+            ) RETURNING id, model_name, total_blocks, created_at
+        """, (
+            request.project_id, request.model_name, request.description,
+            'subblock' if cells is not None else 'regular',
+            request.x_min, request.x_max, request.y_min, request.y_max, request.z_min, request.z_max,
+            request.block_size_x, request.block_size_y, request.block_size_z,
+            nx, ny, nz, sub_block_levels, total_cells,
+            request.interpolation_method, request.search_radius, request.min_samples, request.max_samples,
+            request.search_radius_semi, request.search_radius_minor,
+            request.search_azimuth, request.search_dip, request.search_rake,
+            json.dumps(request.search_passes) if request.search_passes else None
+        ))
+        
+        block_model = cur.fetchone()
+        block_model_id = block_model['id']
+        
+        # Block cells live in the columnar store; block_model_cells is
+        # populated by a follow-up sync for SQL consumers
+        job.progress(0.5, "Creating block store", force=True)
+        store = BlockModelStore.create(block_model_id, grid, cells=cells)
+        blocks_created = store.n_blocks
+        
+        conn.commit()
+        job.defer(sync_block_store, block_model_id)
+        
+        cur.close()
+        conn.close()
+        
+        return {
+            "success": True,
+            "block_model_id": block_model_id,
+            "model_name": block_model['model_name'],
+            "grid_dimensions": {
+                "nx": nx,
+                "ny": ny,
+                "nz": nz
+            },
+            "total_blocks": block_model['total_blocks'],
+            "sub_block_levels": sub_block_levels,
+            "blocks_created": blocks_created,
+            "postgres_sync": "scheduled",
+            "message": f"Block model '{block_model['model_name']}' created with {blocks_created:,} blocks"
+        }
+        
+    except (HTTPException, JobCancelled):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
             detail=f"Failed to create block model: {str(e)}"
         )
 
 
-@app.post("/api/block-models/{block_model_id}/estimate")
-def estimate_block_grades(block_model_id: str, elements: List[str] = ["au_ppm"]):
+# Upper bound on leaf cells of a sub-blocked model
+MAX_BLOCK_CELLS = 10000000
+
+
+def fetch_sub_block_seeds(cur, project_id: str, features: List[str], step: float) -> np.ndarray:
+    """
+    3D points that trigger sub-blocking: lithology contacts (where the logged
+    unit changes down-hole), vein intercepts and sample positions, all at
+    their desurveyed positions along the hole trace.
+    
+    Vein intervals are sampled every `step` metres so every finest-level
+    cell crossed by the vein is refined, not just its end points.
+    """
+    seeds = [np.empty((0, 3))]
+    
+    if "lithology" in features:
+        cur.execute("""
+            SELECT gu.drill_hole_id, gu.from_depth
+            FROM (
+                SELECT g.drill_hole_id, g.from_depth, g.lithology,
+                       LAG(g.lithology) OVER (PARTITION BY g.drill_hole_id ORDER BY g.from_depth) AS previous
+                FROM geological_units g
+                JOIN drill_holes dh ON dh.id = g.drill_hole_id
+                WHERE dh.project_id = %s
+            ) gu
+            WHERE gu.previous IS DISTINCT FROM gu.lithology
+              AND gu.previous IS NOT NULL
+        """, (project_id,))
+        rows = cur.fetchall()
+        seeds.append(desurvey_depths(
+            cur, [r['drill_hole_id'] for r in rows], [float(r['from_depth']) for r in rows]
+        ))
+    
+    if "veins" in features:
+        cur.execute("""
+            SELECT vi.drill_hole_id, vi.depth_from_m, vi.depth_to_m
+            FROM vein_intersections vi
+            JOIN drill_holes dh ON dh.id = vi.drill_hole_id
+            WHERE dh.project_id = %s
+        """, (project_id,))
+        rows = cur.fetchall()
+        if rows:
+            depth_from = np.array([float(r['depth_from_m']) for r in rows])
+            depth_to = np.array([float(r['depth_to_m']) for r in rows])
+            n_points = np.ceil(np.abs(depth_to - depth_from) / step).astype(int) + 1
+            interval = np.repeat(np.arange(len(rows)), n_points)
+            position = np.arange(len(interval)) - np.repeat(np.cumsum(n_points) - n_points, n_points)
+            depth = np.minimum(depth_from[interval] + position * step, depth_to[interval])
+            hole_ids = [rows[n]['drill_hole_id'] for n in interval]
+            seeds.append(desurvey_depths(cur, hole_ids, depth))
+    
+    if "samples" in features:
+        # Desurveyed midpoints (the caller refreshes sample_coordinates first)
+        cur.execute("""
+            SELECT mid_x AS x, mid_y AS y, mid_z AS z
+            FROM sample_coordinates
+            WHERE project_id = %s
+        """, (project_id,))
+        rows = cur.fetchall()
+        seeds.append(np.array([(float(r['x']), float(r['y']), float(r['z'])) for r in rows]).reshape(-1, 3))
+    
+    return np.concatenate(seeds)
+
+
+def get_block_store(cur, block_model) -> BlockModelStore:
+    """
+    Open the columnar store for a block model.
+    
+    Models created before the store existed (or whose store directory was
+    lost) are hydrated once from block_model_cells.
+    """
+    store = BlockModelStore(block_model['id'])
+    if store.exists():
+        return store
+    
+    frame = copy_query_to_frame(cur, f"""
+        SELECT {', '.join(store_columns_to_select())}
+        FROM block_model_cells
+        WHERE block_model_id = %s
+    """, (block_model['id'],))
+    return load_store_from_rows(block_model['id'], block_model, frame)
+
+
+def sync_block_store(block_model_id: str, cells: Optional[np.ndarray] = None, since_version: Optional[int] = None):
+    """Background task: push the columnar store (or the given cells) into block_model_cells"""
+    try:
+        conn = get_db_connection()
+        try:
+            sync_to_postgres(conn, BlockModelStore(block_model_id), cells, since_version)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Block store sync failed for {block_model_id}: {e}")
+
+
+def rebuild_lod_pyramid(block_model_id: str):
+    """Background task: refresh the visualization pyramid after the store changed"""
+    try:
+        build_lod_pyramid(BlockModelStore(block_model_id))
+    except Exception as e:
+        print(f"LOD pyramid rebuild failed for {block_model_id}: {e}")
+
+
+# Largest block kriging discretization (points per block axis)
+MAX_DISCRETIZATION = 10
+
+
+@app.post("/api/block-models/{block_model_id}/estimate", status_code=202)
+def estimate_block_grades(
+    block_model_id: str,
+    elements: List[str] = ["au_ppm"],
+    n_workers: int = 1,
+    composite_set_id: Optional[str] = None,
+    variogram_model_id: Optional[List[str]] = Query(None),
+    multi_element: bool = False,
+    incremental: bool = False,
+    discretization: int = 1,
+    indicator_cutoffs: Optional[List[float]] = Query(None)
+):
     """
     PHASE 5: Estimate grades into block model using 3D Ordinary Kriging
     
     For each block in the model, estimates grade values by interpolating
     from nearby drill hole assay samples using geostatistical kriging.
+    A spherical variogram is fitted per element and the kriging systems for
+    all blocks are solved in vectorized batches, giving kriging variance,
+    slope of regression and sum of negative weights per block.
+    
+    n_workers > 1 splits the grid into i/j/k slabs estimated in a process
+    pool (0 = all cores); results are identical to the serial run.
+    
+    composite_set_id estimates from that composite set instead of the raw
+    assay intervals. variogram_model_id (repeatable, one per element) uses
+    stored variogram models; other elements get a variogram fitted here.
+    Each element gets its own <element>_variance column.
+    
+    multi_element=true estimates elements sampled at the same locations
+    together: one neighbour search and one kriging system per block, with
+    the weights applied to every element (the first element's variogram,
+    scaled to each element's variance). Five elements then cost about as
+    much as one.
+    
+    incremental=true re-estimates only the blocks within search reach of
+    samples added, removed or changed since the last estimation, reusing
+    that run's elements, data source and variograms (other parameters are
+    ignored). The blocks come out identical to re-estimating the whole
+    model with those variograms.
+    
+    discretization > 1 runs block kriging: every cell is discretized into
+    n x n x n points and estimated for its whole volume (average
+    covariances computed once per cell geometry), which gives smaller,
+    block-support kriging variances than point estimates at the centroids.
+    
+    indicator_cutoffs (repeatable, 2-32 values) switches to multiple-indicator
+    kriging: the indicator at every cutoff is kriged with one system per
+    block (median-indicator variogram), order relations are corrected,
+    and each cell keeps its ccdf; the grade column gets the e-type mean.
+    /api/block-models/{id}/recoverable then reports tonnage and grade
+    above any cutoff without re-estimating.
+    
+    Runs as a modelling job: returns a job id; the estimation summary is
+    the job result (/api/jobs/{job_id}/result).
     """
+    if not 1 <= discretization <= MAX_DISCRETIZATION:
+        raise HTTPException(status_code=400, detail=f"discretization must be between 1 and {MAX_DISCRETIZATION}")
+    if indicator_cutoffs:
+        if incremental:
+            raise HTTPException(status_code=400, detail="Indicator kriging does not support incremental runs")
+        if not MIN_CUTOFFS <= len(set(indicator_cutoffs)) <= MAX_CUTOFFS:
+            raise HTTPException(
+                status_code=400, detail=f"Give between {MIN_CUTOFFS} and {MAX_CUTOFFS} distinct indicator cutoffs"
+            )
+    block_model = fetch_block_model(block_model_id)
+    return submit_job(
+        'estimate_block_grades',
+        {"block_model_id": block_model_id, "elements": elements, "n_workers": n_workers,
+         "composite_set_id": composite_set_id, "variogram_model_ids": variogram_model_id or [],
+         "multi_element": multi_element, "incremental": incremental, "discretization": discretization,
+         "indicator_cutoffs": sorted(set(indicator_cutoffs)) if indicator_cutoffs else None},
+        project_id=block_model['project_id'],
+        block_model_id=block_model_id
+    )
+
+
+@job_handler('estimate_block_grades')
+def run_estimate_block_grades(params: Dict, job: JobContext):
+    block_model_id = params['block_model_id']
+    elements = params['elements']
+    n_workers = int(params.get('n_workers', 1))
+    composite_set_id = params.get('composite_set_id')
+    variogram_model_ids = params.get('variogram_model_ids') or []
+    multi_element = bool(params.get('multi_element'))
+    incremental = bool(params.get('incremental'))
+    discretization = int(params.get('discretization') or 1)
+    indicator_cutoffs = params.get('indicator_cutoffs') or None
+    if indicator_cutoffs:
+        multi_element = False  # one set of indicators per element
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -942,138 +2467,278 @@ def estimate_block_grades(block_model_id: str, elements: List[str] = ["au_ppm"])
         if not block_model:
             raise HTTPException(status_code=404, detail="Block model not found")
         
-        # Get all block cells
-        cur.execute("""
-            SELECT id, centroid_x, centroid_y, centroid_z
-            FROM block_model_cells
-            WHERE block_model_id = %s
-            ORDER BY i, j, k
-        """, (block_model_id,))
-        
-        blocks = cur.fetchall()
+        # Block cells come from the columnar store (sub-blocks estimated at
+        # their own centroids; slabs are cut on the parent grid)
+        store = get_block_store(cur, block_model)
+        block_ijk = store.block_ijk()
+        block_xyz = store.centroids()
+        updates = ColumnUpdate(store)
+        
+        # 'idw' runs inverse distance weighting; anything else is ordinary kriging
+        interpolation_method = block_model['interpolation_method'] or 'ordinary_kriging'
+        variograms = {}
+        
+        # Rotated search ellipsoid and expanding search passes
+        search_ellipsoid, search_passes = search_settings(block_model)
+        search = {
+            "radii": search_ellipsoid.radii.tolist(),
+            "azimuth": search_ellipsoid.azimuth,
+            "dip": search_ellipsoid.dip,
+            "rake": search_ellipsoid.rake,
+            "passes": [vars(p) for p in search_passes] if search_passes else None
+        }
+        blocks_by_pass = {}
+        
+        # Incremental runs repeat the last estimation's elements, data source
+        # and variograms, and only re-estimate blocks within reach of samples
+        # that changed since
+        record = None
+        if incremental:
+            estimation_record = store.estimation_record()
+            if estimation_record is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="No previous estimation recorded for this model; run a full estimation first"
+                )
+            record, recorded_xyz, recorded_grades = estimation_record
+            if record.get('indicator_cutoffs'):
+                raise HTTPException(
+                    status_code=400,
+                    detail="The last estimation used indicator kriging; run a full estimation"
+                )
+            if record['interpolation_method'] != interpolation_method or record['search'] != search:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Estimation settings changed since the last estimation; run a full estimation"
+                )
+            elements = record['elements']
+            composite_set_id = record['composite_set_id']
+            multi_element = record['multi_element']
+            discretization = int(record.get('discretization') or 1)
+        
+        # Stored variogram models, keyed by the element they were fitted to
+        stored_variograms = {}
+        for variogram_model_id in ([] if incremental else variogram_model_ids):
+            row, model = load_variogram_model(cur, variogram_model_id, block_model['project_id'])
+            stored_variograms[row['element']] = (str(row['id']), model)
+        
+        composite_set = None
+        if composite_set_id:
+            job.progress(0.0, "Refreshing composites", force=True)
+            composite_set = refresh_composite_set(conn, composite_set_id)
+        
+        # One sample query for every element: desurveyed assay midpoints or
+        # composites with 3D coordinates, NaN where an element is missing
+        valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+        elements = [element for element in elements if element in valid_elements]
+        sample_xyz = np.empty((0, 3))
+        sample_grades = np.empty((0, len(elements)))
+        if elements:
+            sample_xyz, sample_grades = fetch_samples(
+                conn, block_model['project_id'], elements, composite_set_id
+            )
         
-        # For each element, get sample data and run kriging
-        for element in elements:
-            # Validate element
-            valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
-            if element not in valid_elements:
-                continue
-            
-            # Fetch assay sample data with 3D coordinates
-            cur.execute(f"""
-                SELECT 
-                    dh.easting as x,
-                    dh.northing as y,
-                    dh.elevation - cs.from_depth as z,
-                    a.{element} as grade
-                FROM assays a
-                JOIN core_samples cs ON cs.id = a.sample_id
-                JOIN drill_holes dh ON dh.id = cs.drill_hole_id
-                WHERE dh.project_id = %s
-                  AND a.{element} IS NOT NULL
-                  AND a.{element} > 0
-            """, (block_model['project_id'],))
-            
-            samples = cur.fetchall()
+        # Each group of elements is estimated in one pass sharing the
+        # neighbour search and kriging weights: (columns, variogram, sills,
+        # variogram_model_id). multi_element groups elements sampled at the
+        # same locations (unless they are pinned to different stored
+        # variograms); otherwise one group per element
+        groups = []
+        if incremental:
+            # Recorded groups, split where elements are no longer sampled together
+            for recorded in record['groups']:
+                variogram = VariogramModel.from_dict(recorded['variogram']) if recorded['variogram'] else None
+                split = {}
+                for n, element in enumerate(recorded['elements']):
+                    column = elements.index(element)
+                    split.setdefault(np.isfinite(sample_grades[:, column]).tobytes(), []).append(n)
+                for members in split.values():
+                    groups.append((
+                        [elements.index(recorded['elements'][n]) for n in members],
+                        variogram,
+                        [recorded['element_sills'][n] for n in members] if variogram else None,
+                        recorded['variogram_model_id']
+                    ))
+        else:
+            keys = {}
+            for column, element in enumerate(elements):
+                if multi_element:
+                    stored_id = stored_variograms.get(element, (None,))[0] if interpolation_method != 'idw' else None
+                    key = (np.isfinite(sample_grades[:, column]).tobytes(), stored_id)
+                else:
+                    key = column
+                keys.setdefault(key, []).append(column)
+            for columns in keys.values():
+                variogram, sills, variogram_model_id = None, None, None
+                known = np.isfinite(sample_grades[:, columns[0]])
+                if interpolation_method != 'idw' and np.count_nonzero(known) >= 3:
+                    # 3D Ordinary Kriging with the stored variogram, or one fitted
+                    # to the group's first element; the other elements use its
+                    # shape scaled to their own variance
+                    group_grades = sample_grades[known][:, columns]
+                    primary = elements[columns[0]]
+                    if primary in stored_variograms:
+                        variogram_model_id, variogram = stored_variograms[primary]
+                    else:
+                        # Indicator kriging uses the median-indicator variogram
+                        fitted_values = median_indicator(group_grades[:, 0]) if indicator_cutoffs else group_grades[:, 0]
+                        lags, semivariance, pair_counts = experimental_variogram(sample_xyz[known], fitted_values)
+                        variogram = fit_variogram(lags, semivariance, pair_counts)
+                    primary_variance = float(np.var(group_grades[:, 0]))
+                    sills = [
+                        variogram.total_sill * (float(np.var(group_grades[:, n])) / primary_variance if primary_variance > 0 else 1.0)
+                        for n in range(len(columns))
+                    ]
+                groups.append((columns, variogram, sills, variogram_model_id))
+        
+        # Blocks to estimate: all of them, or (incremental) those within the
+        # largest search pass of a sample added, removed or changed
+        base_params = EstimationParams(
+            method=interpolation_method,
+            search_radius=float(block_model['search_radius']),
+            min_samples=int(block_model['min_samples']),
+            max_samples=int(block_model['max_samples']),
+            ellipsoid=search_ellipsoid,
+            passes=search_passes,
+            discretization=discretization
+        )
+        if incremental:
+            changed_xyz = changed_sample_positions(recorded_xyz, recorded_grades, sample_xyz, sample_grades)
+            targets = affected_blocks(block_xyz, changed_xyz, base_params)
+        else:
+            changed_xyz = None
+            targets = np.arange(store.n_blocks)
+        target_xyz = block_xyz[targets]
+        target_ijk = block_ijk[targets]
+        target_size = store.cell_sizes(targets) if discretization > 1 else None
+        written = np.zeros(store.n_blocks, dtype=bool)
+        indicator_results = {}
+        
+        for group_number, (columns, variogram, sills, variogram_model_id) in enumerate(groups):
+            group_elements = [elements[column] for column in columns]
+            for n, element in enumerate(group_elements):
+                if variogram is not None:
+                    variograms[element] = {
+                        **variogram.scaled(sills[n] / variogram.total_sill).to_dict(),
+                        "variogram_model_id": variogram_model_id if n == 0 else None,
+                        "weights_from": group_elements[0]
+                    }
             
-            if len(samples) < 3:
-                continue  # Not enough data for kriging
+            def group_progress(fraction, group_number=group_number, label=', '.join(group_elements)):
+                job.progress(
+                    0.9 * (group_number + fraction) / len(groups),
+                    f"Estimating {label}"
+                )
+            group_progress(0.0)
             
-            # Extract sample coordinates and grades
-            sample_x = np.array([float(s['x']) for s in samples])
-            sample_y = np.array([float(s['y']) for s in samples])
-            sample_z = np.array([float(s['z']) for s in samples])
-            sample_grades = np.array([float(s['grade']) for s in samples])
+            known = np.isfinite(sample_grades[:, columns[0]])
+            group_xyz = sample_xyz[known]
+            group_grades = sample_grades[known][:, columns]
+            if len(group_xyz) < 3 or len(targets) == 0:
+                continue  # Not enough data for kriging (or nothing to re-estimate)
+            if interpolation_method != 'idw' and variogram is None:
+                continue  # Had too few samples at the last full estimation
             
-            # Estimate grades for each block
-            # Note: PyKrige's OrdinaryKriging doesn't support 3D natively in all versions
-            # For true 3D kriging, we'd use PyKrige3D or loop with search ellipsoid
-            # Here we'll use a simplified 3D approach with weighted nearest neighbors
+            values = group_grades if len(columns) > 1 else group_grades[:, 0]
+            distribution = None
+            if indicator_cutoffs:
+                # Multiple-indicator kriging: the cutoff indicators are
+                # kriged as value columns sharing each block's system
+                distribution = IndicatorDistribution(group_grades[:, 0], indicator_cutoffs)
+                values = distribution.indicators(group_grades[:, 0])
             
-            search_radius = float(block_model['search_radius'])
-            min_samples = int(block_model['min_samples'])
-            max_samples = int(block_model['max_samples'])
+            estimation_params = EstimationParams(**{
+                **vars(base_params), "variogram": variogram,
+                "element_sills": None if distribution is not None else sills
+            })
             
-            updates_batch = []
-            for block in blocks:
-                block_x = float(block['centroid_x'])
-                block_y = float(block['centroid_y'])
-                block_z = float(block['centroid_z'])
-                
-                # Calculate 3D distances to all samples
-                distances = np.sqrt(
-                    (sample_x - block_x)**2 +
-                    (sample_y - block_y)**2 +
-                    (sample_z - block_z)**2
-                )
-                
-                # Find samples within search radius
-                within_radius = distances <= search_radius
-                if np.sum(within_radius) < min_samples:
-                    continue  # Not enough samples nearby
-                
-                # Get closest samples (up to max_samples)
-                sorted_indices = np.argsort(distances)
-                selected_indices = sorted_indices[within_radius][:max_samples]
-                
-                if len(selected_indices) < min_samples:
-                    continue
-                
-                # Inverse Distance Weighting (IDW) for 3D estimation
-                # More sophisticated: Use full 3D kriging with PyKrige3D
-                selected_distances = distances[selected_indices]
-                selected_grades = sample_grades[selected_indices]
-                
-                # IDW weights (power = 2)
-                weights = 1.0 / (selected_distances ** 2 + 1e-10)
-                weights /= weights.sum()
-                
-                # Estimated grade
-                estimated_grade = np.sum(weights * selected_grades)
-                
-                # Variance (simplified - use kriging variance for better estimate)
-                variance = np.var(selected_grades)
-                
-                updates_batch.append((
-                    estimated_grade,
-                    variance,
-                    len(selected_indices),
-                    float(np.max(selected_distances)),
-                    block['id']
-                ))
-                
-                # Batch update for performance
-                if len(updates_batch) >= 500:
-                    grade_column = element.replace('_ppm', '_grade')
-                    cur.executemany(f"""
-                        UPDATE block_model_cells
-                        SET {grade_column} = %s,
-                            au_variance = %s,
-                            sample_count = %s,
-                            search_distance = %s,
-                            is_estimated = TRUE,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE id = %s
-                    """, updates_batch)
-                    conn.commit()
-                    updates_batch = []
+            # KD-tree search + estimation, split over spatial slabs when n_workers > 1
+            result = estimate_blocks(
+                target_xyz, target_ijk, group_xyz, values,
+                estimation_params, n_workers=n_workers, progress=group_progress,
+                block_size=target_size
+            )
             
-            # Update remaining blocks
-            if updates_batch:
-                grade_column = element.replace('_ppm', '_grade')
-                cur.executemany(f"""
-                    UPDATE block_model_cells
-                    SET {grade_column} = %s,
-                        au_variance = %s,
-                        sample_count = %s,
-                        search_distance = %s,
-                        is_estimated = TRUE,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, updates_batch)
-                conn.commit()
-        
-        # Update block model status
+            # Only estimated blocks are overwritten; others keep previous values
+            estimated = result.estimated
+            blocks = targets[estimated]
+            written[blocks] = True
+            if distribution is not None:
+                ccdf = correct_order_relations(result.estimate[estimated])
+                estimates = distribution.etype(ccdf)[:, None]
+                variances = distribution.variance(ccdf)[:, None]
+                indicator_results[group_elements[0]] = (blocks, ccdf, distribution)
+            else:
+                estimates = result.estimate.reshape(len(estimated), -1)[estimated]
+                variances = result.variance.reshape(len(estimated), -1)[estimated]
+            for n, element in enumerate(group_elements):
+                updates.set(element.replace('_ppm', '_grade'), blocks, estimates[:, n])
+                updates.set(element.replace('_ppm', '_variance'), blocks, variances[:, n])
+            updates.set('sample_count', blocks, result.sample_count[estimated])
+            updates.set('search_distance', blocks, result.search_distance[estimated])
+            updates.set('slope_of_regression', blocks, result.slope_of_regression[estimated])
+            updates.set('negative_weight_sum', blocks, result.negative_weight_sum[estimated])
+            updates.set('search_pass', blocks, result.search_pass[estimated])
+            updates.set('is_estimated', blocks, True)
+            passes_used = np.bincount(
+                result.search_pass[estimated], minlength=len(search_passes or [None]) + 1
+            )[1:].tolist()
+            for element in group_elements:
+                blocks_by_pass[element] = passes_used
+        
+        # Every element's estimates land as one store version, so a run
+        # failed or cancelled before this commit leaves the store untouched.
+        # Once it lands, PostgreSQL and the LOD pyramid are refreshed even
+        # if a later step (ccdfs, estimation record, status) fails
+        job.progress(0.95, "Saving estimates", force=True)
+        version = updates.commit()
+        if incremental:
+            job.defer(sync_block_store, block_model_id, np.flatnonzero(written), updates.base_version, always=True)
+        else:
+            job.defer(sync_block_store, block_model_id, always=True)
+        job.defer(rebuild_lod_pyramid, block_model_id, always=True)
+        
+        # Indicator ccdfs of this run; elements estimated another way drop
+        # theirs (they no longer match the grade columns)
+        for element in elements:
+            if element in indicator_results:
+                blocks, ccdf, distribution = indicator_results[element]
+                codes = np.zeros((store.n_blocks, len(distribution.cutoffs)), dtype=np.uint16)
+                codes[blocks] = encode_ccdf(ccdf)
+                has_ccdf = np.zeros(store.n_blocks, dtype=bool)
+                has_ccdf[blocks] = True
+                store.write_indicator_ccdf(element, {
+                    "element": element,
+                    "cutoffs": distribution.cutoffs.tolist(),
+                    "variogram": variograms.get(element),
+                    "store_version": version
+                }, codes, has_ccdf, distribution.samples)
+            else:
+                store.clear_indicator_ccdf(element)
+        
+        # Settings and sample set for the next incremental run (recorded
+        # groups keep the elements that were estimated together)
+        if elements:
+            store.write_estimation_record({
+                "elements": elements,
+                "interpolation_method": interpolation_method,
+                "composite_set_id": composite_set_id,
+                "multi_element": multi_element,
+                "discretization": discretization,
+                "indicator_cutoffs": indicator_cutoffs,
+                "search": search,
+                "groups": record['groups'] if incremental else [
+                    {
+                        "elements": [elements[column] for column in columns],
+                        "variogram": variogram.to_dict() if variogram else None,
+                        "element_sills": sills,
+                        "variogram_model_id": variogram_model_id
+                    }
+                    for columns, variogram, sills, variogram_model_id in groups
+                ],
+                "store_version": version
+            }, sample_xyz, sample_grades)
+        
         cur.execute("""
             UPDATE block_models
             SET status = 'estimated',
@@ -1082,27 +2747,39 @@ def estimate_block_grades(block_model_id: str, elements: List[str] = ["au_ppm"])
         """, (block_model_id,))
         conn.commit()
         
-        # Get summary statistics
-        cur.execute("""
-            SELECT 
-                COUNT(*) as total_blocks,
-                COUNT(*) FILTER (WHERE is_estimated = TRUE) as estimated_blocks,
-                AVG(au_grade) FILTER (WHERE au_grade > 0) as avg_au_grade,
-                MAX(au_grade) as max_au_grade,
-                MIN(au_grade) FILTER (WHERE au_grade > 0) as min_au_grade
-            FROM block_model_cells
-            WHERE block_model_id = %s
-        """, (block_model_id,))
-        
-        stats = cur.fetchone()
-        
         cur.close()
         conn.close()
         
+        # Summary statistics straight from the store
+        au_grade = np.asarray(store.column('au_grade'))
+        positive_au = au_grade[au_grade > 0]
+        estimated_blocks = int(np.count_nonzero(store.column('is_estimated')))
+        stats = {
+            'total_blocks': store.n_blocks,
+            'estimated_blocks': estimated_blocks,
+            'avg_au_grade': float(positive_au.mean()) if len(positive_au) else None,
+            'max_au_grade': float(np.nanmax(au_grade)) if np.isfinite(au_grade).any() else None,
+            'min_au_grade': float(positive_au.min()) if len(positive_au) else None
+        }
+        
         return {
             "success": True,
             "block_model_id": block_model_id,
             "elements_estimated": elements,
+            "interpolation_method": interpolation_method,
+            "composite_set": {
+                "id": composite_set['id'], "version": composite_set['version']
+            } if composite_set else None,
+            "multi_element": multi_element,
+            "discretization": discretization,
+            "indicator_cutoffs": indicator_cutoffs,
+            "variograms": variograms,
+            "search": {**search, "blocks_by_pass": blocks_by_pass},
+            "incremental": {
+                "changed_samples": len(changed_xyz),
+                "blocks_searched": len(targets),
+                "blocks_reestimated": int(np.count_nonzero(written))
+            } if incremental else None,
             "statistics": {
                 "total_blocks": stats['total_blocks'],
                 "estimated_blocks": stats['estimated_blocks'],
@@ -1113,7 +2790,7 @@ def estimate_block_grades(block_model_id: str, elements: List[str] = ["au_ppm"])
             "message": f"Estimated grades for {stats['estimated_blocks']:,} blocks"
         }
         
-    except HTTPException:
+    except (HTTPException, JobCancelled):
         raise
     except Exception as e:
         raise HTTPException(
@@ -1122,6 +2799,231 @@ def estimate_block_grades(block_model_id: str, elements: List[str] = ["au_ppm"])
         )
 
 
+# Cells decoded per chunk when reporting recoverable resources
+RECOVERABLE_CHUNK = 200000
+
+
+@app.get("/api/block-models/{block_model_id}/recoverable")
+def get_recoverable_resources(
+    block_model_id: str,
+    element: str = "au_ppm",
+    cutoff: List[float] = Query([0.5]),
+    classification: Optional[str] = None
+):
+    """
+    Recoverable tonnage, grade and metal above each cutoff from the
+    indicator ccdfs of the last indicator kriging run (any cutoff, not
+    only the kriged ones: the sample distribution within each class fills
+    in between thresholds). Optionally limited to one classification.
+    """
+    if classification and classification not in CLASSIFICATION_CODES:
+        raise HTTPException(status_code=400, detail=f"Unknown classification '{classification}'")
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+        block_model = cur.fetchone()
+        if not block_model:
+            raise HTTPException(status_code=404, detail="Block model not found")
+        store = get_block_store(cur, block_model)
+        cur.close()
+        conn.close()
+        
+        stored = store.indicator_ccdf(element)
+        if stored is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No indicator kriging results for {element}; estimate with indicator_cutoffs first"
+            )
+        record, codes, has_ccdf, samples = stored
+        distribution = IndicatorDistribution(samples, record['cutoffs'])
+        
+        cells = np.asarray(has_ccdf)
+        if classification:
+            cells = cells & (np.asarray(store.column('classification')) == CLASSIFICATION_CODES[classification])
+        cells = np.flatnonzero(cells)
+        
+        tonnes = np.zeros(len(cutoff))
+        metal = np.zeros(len(cutoff))
+        total_tonnes = 0.0
+        for start in range(0, len(cells), RECOVERABLE_CHUNK):
+            chunk = cells[start:start + RECOVERABLE_CHUNK]
+            ccdf = decode_ccdf(codes[chunk])
+            tonnage = store.tonnage(chunk)
+            total_tonnes += float(tonnage.sum())
+            for n, value in enumerate(cutoff):
+                proportion, metal_per_tonne = distribution.above(ccdf, value)
+                tonnes[n] += float(tonnage @ proportion)
+                metal[n] += float(tonnage @ metal_per_tonne)
+        
+        return {
+            "block_model_id": block_model_id,
+            "element": element,
+            "classification": classification,
+            "kriged_cutoffs": record['cutoffs'],
+            "cells": len(cells),
+            "total_tonnes": total_tonnes,
+            "grade_tonnage": [
+                {
+                    "cutoff": float(value),
+                    "tonnes": tonnes[n],
+                    "grade": metal[n] / tonnes[n] if tonnes[n] > 0 else None,
+                    "metal": metal[n]
+                }
+                for n, value in enumerate(cutoff)
+            ]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to report recoverable resources: {str(e)}")
+
+
+# Largest number of realizations per simulation run (exceedance counts are uint16)
+MAX_REALIZATIONS = 1000
+MAX_SIMULATION_CUTOFFS = 20
+
+
+@app.post("/api/block-models/{block_model_id}/simulate", status_code=202)
+def simulate_block_model(block_model_id: str, request: SimulationRequest):
+    """
+    Sequential Gaussian simulation of one element on the block model grid
+    
+    Draws n_realizations conditional realizations (normal-score transform,
+    multigrid random path, simple kriging from samples and previously
+    simulated nodes, back-transform) in parallel processes. Realizations
+    are reduced as they are drawn and never stored: the result holds the
+    P10/P50/P90 tonnage, grade and metal above each cutoff, and the block
+    store keeps per-cell e-type mean, variance and P(grade > cutoff).
+    Sub-blocked models are simulated on the parent grid.
+    
+    Runs as a modelling job: returns a job id (also the simulation id);
+    the summary is the job result (/api/jobs/{job_id}/result).
+    """
+    valid_elements = ["au_ppm", "ag_ppm", "cu_ppm", "pb_ppm", "zn_ppm"]
+    if request.element not in valid_elements:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid element. Must be one of: {', '.join(valid_elements)}"
+        )
+    if not 1 <= request.n_realizations <= MAX_REALIZATIONS:
+        raise HTTPException(status_code=400, detail=f"n_realizations must be between 1 and {MAX_REALIZATIONS}")
+    if not 1 <= len(request.cutoffs) <= MAX_SIMULATION_CUTOFFS:
+        raise HTTPException(status_code=400, detail=f"Give between 1 and {MAX_SIMULATION_CUTOFFS} cutoffs")
+    if request.max_data < 1 or request.max_simulated < 0:
+        raise HTTPException(status_code=400, detail="max_data must be >= 1 and max_simulated >= 0")
+    
+    block_model = fetch_block_model(block_model_id)
+    return submit_job(
+        'simulate_block_model',
+        {"block_model_id": block_model_id, **request.model_dump()},
+        project_id=block_model['project_id'],
+        block_model_id=block_model_id
+    )
+
+
+@job_handler('simulate_block_model')
+def run_simulate_block_model(params: Dict, job: JobContext):
+    block_model_id = params.pop('block_model_id')
+    request = SimulationRequest(**params)
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+        block_model = cur.fetchone()
+        if not block_model:
+            raise HTTPException(status_code=404, detail="Block model not found")
+        store = get_block_store(cur, block_model)
+        search_ellipsoid, _ = search_settings(block_model)
+        
+        job.progress(0.0, "Loading samples", force=True)
+        if request.composite_set_id:
+            refresh_composite_set(conn, request.composite_set_id)
+        sample_xyz, sample_grades = fetch_samples(
+            conn, block_model['project_id'], [request.element], request.composite_set_id
+        )
+        known = np.isfinite(sample_grades[:, 0])
+        sample_xyz, grades = sample_xyz[known], sample_grades[known, 0]
+        if len(grades) < 10:
+            raise HTTPException(status_code=400, detail="Not enough samples for simulation (need at least 10)")
+        
+        # Normal-score variogram: a stored model is rescaled to unit sill,
+        # otherwise one is fitted to the samples' normal scores
+        variogram_model_id = request.variogram_model_id
+        if variogram_model_id:
+            variogram = load_variogram_model(cur, variogram_model_id, block_model['project_id'])[1]
+        else:
+            _, scores = NormalScoreTransform.fit(grades, request.seed)
+            lags, semivariance, pair_counts = experimental_variogram(sample_xyz, scores)
+            variogram = fit_variogram(lags, semivariance, pair_counts)
+        variogram = variogram.scaled(1.0 / variogram.total_sill)
+        cur.close()
+        conn.close()
+        
+        # Nodes are the parent blocks; sub-block cells share their parent's
+        # value and add their tonnage to it
+        grid = SimulationGrid(origin=store.origin, size=store.parent_size, shape=store.shape)
+        cell_parent = np.ravel_multi_index(tuple(store.block_ijk().T), store.shape)
+        node_tonnage = np.bincount(cell_parent, weights=store.tonnage(), minlength=grid.n_nodes)
+        summary = SimulationSummary(grid.n_nodes, request.cutoffs, node_tonnage)
+        
+        job.progress(0.02, f"Simulating {request.n_realizations} realizations", force=True)
+        simulate(
+            grid, sample_xyz, grades, variogram, search_ellipsoid, summary,
+            request.n_realizations,
+            max_data=request.max_data,
+            max_simulated=request.max_simulated,
+            seed=request.seed,
+            n_workers=request.n_workers,
+            progress=lambda fraction: job.progress(
+                0.02 + 0.93 * fraction, f"Simulated {summary.count} of {request.n_realizations} realizations"
+            )
+        )
+        
+        job.progress(0.95, "Saving summaries", force=True)
+        result = {
+            "simulation_id": job.job_id,
+            "block_model_id": block_model_id,
+            "element": request.element,
+            "composite_set_id": request.composite_set_id,
+            "n_realizations": summary.count,
+            "seed": request.seed,
+            "sample_count": len(grades),
+            "nodes": grid.n_nodes,
+            "normal_score_variogram": {**variogram.to_dict(), "variogram_model_id": variogram_model_id},
+            "tonnage_grade": summary.tonnage_grade(),
+            "statistics": {
+                "sample_mean": float(np.mean(grades)),
+                "etype_mean": float(np.average(summary.mean, weights=node_tonnage)) if node_tonnage.sum() > 0 else None,
+                "mean_etype_variance": float(np.mean(summary.variance))
+            }
+        }
+        store.write_simulation(job.job_id, result, {
+            "etype_mean": summary.mean[cell_parent],
+            "etype_variance": summary.variance[cell_parent],
+            "probability_above": summary.probability_above[cell_parent].astype(np.float32)
+        })
+        return {"success": True, **result}
+        
+    except (HTTPException, JobCancelled):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to simulate block model: {str(e)}")
+
+
+@app.get("/api/block-models/{block_model_id}/simulations")
+def list_block_model_simulations(block_model_id: str):
+    """Summaries of the simulation runs kept for a block model, oldest first"""
+    block_model = fetch_block_model(block_model_id)
+    try:
+        simulations = BlockModelStore(block_model['id']).simulations()
+        return {"simulations": simulations, "count": len(simulations)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list simulations: {str(e)}")
+
+
 @app.get("/api/block-models")
 def list_block_models(project_id: Optional[str] = None):
     """Get all block models, optionally filtered by project"""
@@ -1168,50 +3070,217 @@ def get_block_model_blocks(
         conn = get_db_connection()
         cur = conn.cursor()
         
-        query = """
-            SELECT 
-                i, j, k,
-                centroid_x, centroid_y, centroid_z,
-                au_grade, cu_grade,
-                classification,
-                tonnage,
-                is_estimated
-            FROM block_model_cells
-            WHERE block_model_id = %s
-        """
+        cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+        block_model = cur.fetchone()
+        if not block_model:
+            raise HTTPException(status_code=404, detail="Block model not found")
         
-        params = [block_model_id]
+        store = get_block_store(cur, block_model)
+        cur.close()
+        conn.close()
         
+        # Filter on the memory-mapped columns
+        au_grade = store.column('au_grade')
+        selection = np.ones(store.n_blocks, dtype=bool)
         if classification:
-            query += " AND classification = %s"
-            params.append(classification)
-        
+            code = CLASSIFICATION_CODES.get(classification)
+            selection &= np.asarray(store.column('classification')) == code
         if min_grade is not None:
-            query += " AND au_grade >= %s"
-            params.append(min_grade)
+            selection &= np.asarray(au_grade) >= min_grade
+        
+        # ORDER BY k DESC, j, i LIMIT 100000 (limit for performance);
+        # sub-blocks stay in storage order within their parent
+        flat = np.flatnonzero(selection)
+        ijk = store.block_ijk(flat)
+        order = np.lexsort((ijk[:, 0], ijk[:, 1], -ijk[:, 2]))[:100000]
+        flat, ijk = flat[order], ijk[order]
+        centroids = store.centroids(flat)
+        
+        def _value(array):
+            return [None if np.isnan(v) else float(v) for v in np.asarray(array)[flat]]
+        
+        columns = {
+            "au_grade": _value(au_grade),
+            "cu_grade": _value(store.column('cu_grade')),
+            "classification": store.classification_labels(np.asarray(store.column('classification'))[flat]),
+            "tonnage": _value(store.tonnage()),
+            "is_estimated": np.asarray(store.column('is_estimated'))[flat].tolist()
+        }
+        if store.is_subblocked:
+            sizes = store.cell_sizes(flat)
+            columns.update(
+                level=store.cell_levels(flat).tolist(),
+                size_x=sizes[:, 0].tolist(),
+                size_y=sizes[:, 1].tolist(),
+                size_z=sizes[:, 2].tolist()
+            )
+        blocks = [
+            {
+                "i": int(ijk[n, 0]), "j": int(ijk[n, 1]), "k": int(ijk[n, 2]),
+                "centroid_x": float(centroids[n, 0]),
+                "centroid_y": float(centroids[n, 1]),
+                "centroid_z": float(centroids[n, 2]),
+                **{name: values[n] for name, values in columns.items()}
+            }
+            for n in range(len(flat))
+        ]
         
-        query += " ORDER BY k DESC, j, i LIMIT 100000"  # Limit for performance
+        return {
+            "blocks": blocks,
+            "count": len(blocks)
+        }
         
-        cur.execute(query, params)
-        blocks = cur.fetchall()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch block model cells: {str(e)}"
+        )
+
+
+@app.get("/api/block-models/{block_model_id}/blocks/binary")
+def stream_block_model_blocks(
+    block_model_id: str,
+    classification: Optional[str] = None,
+    min_grade: Optional[float] = None,
+    grades: str = "au_grade,cu_grade"
+):
+    """
+    Stream every filtered block model cell as packed binary columns
+    
+    Same filters as /blocks but without the 100,000 block limit. Cells are
+    read from the columnar store in fixed-size chunks, so server memory is
+    bounded for any model size. See block_stream.py for the layout.
+    grades is a comma-separated list of grade columns to include.
+    """
+    grade_columns = [name.strip() for name in grades.split(',') if name.strip()]
+    invalid = [name for name in grade_columns if name not in GRADE_COLUMNS]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown grade columns {invalid}. Use any of {GRADE_COLUMNS}"
+        )
+    if classification and classification not in CLASSIFICATION_CODES:
+        raise HTTPException(status_code=400, detail=f"Unknown classification '{classification}'")
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+        block_model = cur.fetchone()
+        if not block_model:
+            raise HTTPException(status_code=404, detail="Block model not found")
+        
+        store = get_block_store(cur, block_model)
+        cur.close()
+        conn.close()
+        
+        return StreamingResponse(
+            stream_cells(store, grade_columns, classification, min_grade),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'inline; filename="{block_model_id}.gfblk"'}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to stream block model cells: {str(e)}"
+        )
+
+
+@app.get("/api/block-models/{block_model_id}/lod")
+def get_block_model_lod(
+    block_model_id: str,
+    level: Optional[int] = None,
+    x_min: Optional[float] = None,
+    x_max: Optional[float] = None,
+    y_min: Optional[float] = None,
+    y_max: Optional[float] = None,
+    z_min: Optional[float] = None,
+    z_max: Optional[float] = None,
+    max_blocks: int = 100000
+):
+    """
+    Get level-of-detail blocks inside a view box for 3D visualization
+    
+    Level 0 is full resolution; each level above merges 2x2x2 cells into
+    one with tonnage-weighted grades and the dominant classification.
+    Without a level, the finest level with at most max_blocks cells in
+    the box is returned. Blocks come back as column arrays.
+    """
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+        block_model = cur.fetchone()
+        if not block_model:
+            raise HTTPException(status_code=404, detail="Block model not found")
         
+        store = get_block_store(cur, block_model)
         cur.close()
         conn.close()
         
+        pyramid = load_lod_pyramid(store)
+        n_levels = int(pyramid['n_levels'])
+        box = {
+            name: value
+            for name, value in {
+                "x_min": x_min, "x_max": x_max, "y_min": y_min,
+                "y_max": y_max, "z_min": z_min, "z_max": z_max
+            }.items()
+            if value is not None
+        }
+        
+        if level is None:
+            level = choose_lod_level(store, pyramid, box, max_blocks)
+        elif not 0 <= level <= n_levels:
+            raise HTTPException(status_code=400, detail=f"level must be between 0 and {n_levels}")
+        elif count_lod_level(store, pyramid, level, box) > max_blocks:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Level {level} has more than {max_blocks:,} blocks in this view box. "
+                       f"Request a coarser level or a smaller box."
+            )
+        
+        cells = query_lod_level(store, pyramid, level, box)
+        
+        def _values(array):
+            array = np.asarray(array)
+            if array.dtype.kind == 'f':
+                return np.where(np.isnan(array), None, array).tolist()
+            return array.tolist()
+        
+        blocks = {name: _values(values) for name, values in cells.items() if name != 'classification'}
+        blocks['classification'] = store.classification_labels(cells['classification']).tolist()
+        
         return {
-            "blocks": blocks,
-            "count": len(blocks)
+            "block_model_id": block_model_id,
+            "level": level,
+            "n_levels": n_levels,
+            "count": len(cells['tonnage']),
+            "blocks": blocks
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to fetch block model cells: {str(e)}"
+            detail=f"Failed to fetch block model LOD: {str(e)}"
         )
 
 
 @app.post("/api/block-models/{block_model_id}/classify")
-def classify_resources(block_model_id: str, cutoff_grade: float = 0.5):
+def classify_resources(
+    block_model_id: str,
+    background_tasks: BackgroundTasks,
+    cutoff_grade: float = 0.5
+):
     """
     PHASE 5: Classify blocks as Measured/Indicated/Inferred based on drill hole spacing
     
@@ -1225,59 +3294,70 @@ def classify_resources(block_model_id: str, cutoff_grade: float = 0.5):
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Classify blocks based on drill hole proximity
-        cur.execute("""
-            UPDATE block_model_cells bmc
-            SET classification = CASE
-                WHEN bmc.search_distance <= 25 AND bmc.sample_count >= 4 THEN 'measured'
-                WHEN bmc.search_distance <= 50 AND bmc.sample_count >= 2 THEN 'indicated'
-                WHEN bmc.search_distance <= 100 AND bmc.sample_count >= 1 THEN 'inferred'
-                ELSE 'unclassified'
-            END
-            WHERE bmc.block_model_id = %s
-              AND bmc.is_estimated = TRUE
-              AND bmc.au_grade >= %s
-        """, (block_model_id, cutoff_grade))
-        
-        conn.commit()
-        
-        # Get classification summary
-        cur.execute("""
-            SELECT 
-                classification,
-                COUNT(*) as block_count,
-                SUM(tonnage) as total_tonnage,
-                AVG(au_grade) as avg_grade,
-                SUM(tonnage * au_grade * 0.029166667) as total_au_oz
-            FROM block_model_cells
-            WHERE block_model_id = %s
-              AND classification IS NOT NULL
-              AND classification != 'unclassified'
-              AND au_grade >= %s
-            GROUP BY classification
-        """, (block_model_id, cutoff_grade))
-        
-        classifications = cur.fetchall()
+        cur.execute("SELECT * FROM block_models WHERE id = %s", (block_model_id,))
+        block_model = cur.fetchone()
+        if not block_model:
+            raise HTTPException(status_code=404, detail="Block model not found")
         
+        store = get_block_store(cur, block_model)
+        updates = ColumnUpdate(store)
         cur.close()
         conn.close()
         
+        # Classify blocks based on drill hole proximity
+        # (NaN distances fail every comparison -> unclassified, like SQL NULLs)
+        au_grade = np.asarray(store.column('au_grade'))
+        search_distance = np.asarray(store.column('search_distance'))
+        sample_count = np.asarray(store.column('sample_count'))
+        eligible = np.asarray(store.column('is_estimated')) & (au_grade >= cutoff_grade)
+        
+        codes = np.select(
+            [
+                (search_distance <= 25) & (sample_count >= 4),
+                (search_distance <= 50) & (sample_count >= 2),
+                (search_distance <= 100) & (sample_count >= 1)
+            ],
+            [
+                CLASSIFICATION_CODES['measured'],
+                CLASSIFICATION_CODES['indicated'],
+                CLASSIFICATION_CODES['inferred']
+            ],
+            default=CLASSIFICATION_CODES['unclassified']
+        )
+        updates.set('classification', eligible, codes[eligible])
+        updates.commit()
+        background_tasks.add_task(sync_block_store, block_model_id)
+        background_tasks.add_task(rebuild_lod_pyramid, block_model_id)
+        
+        # Get classification summary
+        classification = updates.column('classification')
+        reported = (
+            (classification != 0)
+            & (classification != CLASSIFICATION_CODES['unclassified'])
+            & (au_grade >= cutoff_grade)
+        )
+        classifications = summarize(store, 'au_grade', reported, group_codes=classification)
+        
         return {
             "success": True,
             "block_model_id": block_model_id,
             "cutoff_grade": cutoff_grade,
             "classifications": [
                 {
-                    "category": c['classification'],
+                    "category": CLASSIFICATIONS[code],
                     "blocks": c['block_count'],
                     "tonnage": float(c['total_tonnage']) if c['total_tonnage'] else 0,
                     "avg_grade_au": float(c['avg_grade']) if c['avg_grade'] else 0,
-                    "metal_au_oz": float(c['total_au_oz']) if c['total_au_oz'] else 0
+                    "metal_au_oz": float(c['total_oz']) if c['total_oz'] else 0
                 }
-                for c in classifications
+                for code, c in classifications.items()
             ]
         }
         
+    except HTTPException:
+        raise
+    except StoreVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -1306,53 +3386,26 @@ def create_resource_estimate(request: ResourceEstimateRequest):
         if not block_model:
             raise HTTPException(status_code=404, detail="Block model not found")
         
-        # Calculate statistics for each classification
+        # Calculate statistics for each classification from the block store
         element_column = request.element.replace('_ppm', '_grade')
+        if element_column not in GRADE_COLUMNS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid element. Must be one of: {', '.join(c.replace('_grade', '_ppm') for c in GRADE_COLUMNS)}"
+            )
         
-        # Measured resources
-        cur.execute(f"""
-            SELECT 
-                COUNT(*) as block_count,
-                SUM(tonnage) as total_tonnage,
-                AVG({element_column}) as avg_grade,
-                SUM(tonnage * {element_column} * 0.029166667) as total_oz
-            FROM block_model_cells
-            WHERE block_model_id = %s
-              AND classification = 'measured'
-              AND {element_column} >= %s
-        """, (request.block_model_id, request.cutoff_grade))
-        
-        measured = cur.fetchone()
-        
-        # Indicated resources
-        cur.execute(f"""
-            SELECT 
-                COUNT(*) as block_count,
-                SUM(tonnage) as total_tonnage,
-                AVG({element_column}) as avg_grade,
-                SUM(tonnage * {element_column} * 0.029166667) as total_oz
-            FROM block_model_cells
-            WHERE block_model_id = %s
-              AND classification = 'indicated'
-              AND {element_column} >= %s
-        """, (request.block_model_id, request.cutoff_grade))
-        
-        indicated = cur.fetchone()
-        
-        # Inferred resources
-        cur.execute(f"""
-            SELECT 
-                COUNT(*) as block_count,
-                SUM(tonnage) as total_tonnage,
-                AVG({element_column}) as avg_grade,
-                SUM(tonnage * {element_column} * 0.029166667) as total_oz
-            FROM block_model_cells
-            WHERE block_model_id = %s
-              AND classification = 'inferred'
-              AND {element_column} >= %s
-        """, (request.block_model_id, request.cutoff_grade))
-        
-        inferred = cur.fetchone()
+        store = get_block_store(cur, block_model)
+        classification = np.asarray(store.column('classification'))
+        above_cutoff = np.asarray(store.column(element_column)) >= request.cutoff_grade
+        
+        # Measured / Indicated / Inferred resources
+        measured, indicated, inferred = (
+            summarize(
+                store, element_column,
+                above_cutoff & (classification == CLASSIFICATION_CODES[category])
+            )
+            for category in ('measured', 'indicated', 'inferred')
+        )
         
         # Create resource estimate record
         cur.execute("""
@@ -0,0 +1,110 @@
+"""
+GeoForge Result Cache
+Two-tier cache for computed results keyed on project data version
+
+Every project has a data version (project_data_versions, migration 021)
+that database triggers bump whenever its holes, surveys, samples or
+assays change. A result is cached under a hash of its namespace, its
+request parameters and the data version it was computed from, so edits
+invalidate results without any explicit eviction: the next request
+carries a new version and misses.
+
+Results are JSON bytes. The first tier is an in-process LRU bounded by a
+byte budget; the second is the result_cache table, shared by every API
+process and worker. Hits in the shared tier are promoted to memory.
+"""
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+# In-process budget per cache (MB of JSON payloads)
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "128"))
+
+# Payloads larger than this fraction of the budget stay out of memory
+MAX_ENTRY_FRACTION = 0.25
+
+
+def data_version(conn, project_id: str) -> int:
+    """Current data version of a project (0 until its data first changes)"""
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM project_data_versions WHERE project_id = %s", (project_id,))
+    row = cur.fetchone()
+    cur.close()
+    return int(row["version"]) if row else 0
+
+
+def bump_data_version(conn, project_id: str):
+    """Invalidate a project's cached results after a change no trigger sees (e.g. re-desurvey)"""
+    cur = conn.cursor()
+    cur.execute("SELECT bump_project_data_version(%s)", (project_id,))
+    conn.commit()
+    cur.close()
+
+
+class ResultCache:
+    """In-process LRU of JSON payloads in front of the shared result_cache table"""
+
+    def __init__(self, namespace: str, max_bytes: int):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, project_id: str, version: int, params: Dict) -> str:
+        """Hash of namespace, project, data version and (JSON-serializable) parameters"""
+        canonical = json.dumps(
+            [self.namespace, str(project_id), version, params], sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, conn, key: str) -> Optional[bytes]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                return payload
+
+        cur = conn.cursor()
+        cur.execute("SELECT payload FROM result_cache WHERE cache_key = %s", (key,))
+        row = cur.fetchone()
+        cur.close()
+        if row is None:
+            return None
+        payload = zlib.decompress(bytes(row["payload"]))
+        self._remember(key, payload)
+        return payload
+
+    def put(self, conn, key: str, project_id: str, version: int, payload: bytes):
+        """Store a payload in both tiers and drop the project's results of older versions"""
+        self._remember(key, payload)
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM result_cache
+            WHERE project_id = %s AND namespace = %s AND data_version < %s
+        """, (project_id, self.namespace, version))
+        cur.execute("""
+            INSERT INTO result_cache (cache_key, namespace, project_id, data_version, payload)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (cache_key) DO NOTHING
+        """, (key, self.namespace, project_id, version, zlib.compress(payload, 1)))
+        conn.commit()
+        cur.close()
+
+    def _remember(self, key: str, payload: bytes):
+        if len(payload) > self.max_bytes * MAX_ENTRY_FRACTION:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = payload
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
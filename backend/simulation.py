@@ -0,0 +1,385 @@
+"""
+GeoForge Conditional Simulation
+Sequential Gaussian simulation (SGS) on the block model parent grid
+
+    1. Samples are normal-score transformed (ranked onto N(0, 1)).
+    2. Each realization visits the grid nodes along its own random path
+       and draws every node from the simple kriging distribution of its
+       neighbours: the closest normal-score samples (KD-tree, searched once
+       for all realizations) and the closest nodes simulated earlier on
+       the path (spiral search over grid offsets, as in GSLIB sgsim).
+    3. Values are back-transformed through the sample distribution.
+
+The path is multigrid: nodes on every 2**L-th grid line come first,
+coarsest level first, so long-range structure is laid down before the
+detail. Nodes are drawn in batches solved as one stacked kriging system;
+a batch holds at most 1/MIN_BATCHES_PER_LEVEL of its level, and nodes of
+the same batch do not condition each other.
+
+Realizations run in a process pool and are reduced as they arrive
+(SimulationSummary): running e-type mean and variance per node,
+exceedance counts per cutoff, and one tonnage and grade per cutoff and
+realization. Memory holds the accumulators plus one realization per
+worker however many realizations are drawn; nothing per realization is
+written anywhere.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context, shared_memory
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.special import ndtri
+
+from estimation import SharedArrays
+from geostats import SearchEllipsoid, VariogramModel, search_neighbours, simple_kriging
+
+
+# Most nodes drawn together in one stacked kriging solve
+MAX_BATCH_NODES = 4096
+
+# Every multigrid level is split into at least this many batches
+MIN_BATCHES_PER_LEVEL = 64
+
+# Spiral search: grid offsets tested per step, and the largest reach in grid steps
+SPIRAL_CHUNK = 256
+MAX_SPIRAL_REACH = 32
+
+# Percentiles reported for tonnage and grade above each cutoff
+REPORT_PERCENTILES = (10, 50, 90)
+
+
+class NormalScoreTransform:
+    """
+    Rank transform of sample values onto a standard normal distribution.
+
+    back() interpolates linearly between the samples' (score, value)
+    pairs and clamps the tails at the sample minimum and maximum.
+    """
+
+    def __init__(self, values: np.ndarray, scores: np.ndarray):
+        self.values = values
+        self.scores = scores
+
+    @classmethod
+    def fit(cls, data: np.ndarray, seed: int = 0):
+        """(transform, normal scores of data in input order); ties are broken at random"""
+        data = np.asarray(data, dtype=np.float64)
+        n = len(data)
+        order = np.lexsort((np.random.default_rng(seed).random(n), data))
+        sorted_scores = ndtri((np.arange(n) + 0.5) / n)
+        scores = np.empty(n)
+        scores[order] = sorted_scores
+        return cls(data[order], sorted_scores), scores
+
+    def back(self, scores: np.ndarray) -> np.ndarray:
+        return np.interp(scores, self.scores, self.values)
+
+
+@dataclass
+class SimulationGrid:
+    """Regular grid of simulation nodes, flat index (i * ny + j) * nz + k"""
+    origin: np.ndarray  # minimum corner
+    size: np.ndarray  # node spacing (block size)
+    shape: tuple
+
+    @property
+    def n_nodes(self) -> int:
+        return int(np.prod(self.shape))
+
+    def ijk(self, nodes: np.ndarray) -> np.ndarray:
+        return np.stack(np.unravel_index(nodes, self.shape), axis=-1)
+
+    def xyz(self, nodes: np.ndarray) -> np.ndarray:
+        return self.origin + (self.ijk(nodes) + 0.5) * self.size
+
+
+def node_levels(shape: Sequence[int]) -> np.ndarray:
+    """Multigrid level of every node: the largest L with i, j, k all multiples of 2**L"""
+    top = max(int(max(shape) - 1).bit_length() - 1, 0)
+    per_axis = []
+    for n in shape:
+        index = np.arange(n)
+        lowest_bit = index & -index
+        per_axis.append(np.where(index > 0, np.log2(np.maximum(lowest_bit, 1)), top).astype(np.int8))
+    levels = np.minimum(np.minimum.outer(per_axis[0], per_axis[1])[:, :, None], per_axis[2][None, None, :])
+    return np.minimum(levels, top).ravel()
+
+
+def random_path(levels: np.ndarray, rng: np.random.Generator):
+    """
+    Multigrid random path: (order, batches, batch_of). order visits the
+    coarsest level first, shuffled within each level; batches are
+    (start, stop, level) ranges of order; batch_of gives every node's
+    batch number.
+    """
+    order = rng.permutation(len(levels))
+    order = order[np.argsort(-levels[order], kind="stable")]
+    batches = []
+    start = 0
+    for level in range(int(levels.max(initial=0)), -1, -1):
+        count = int(np.count_nonzero(levels == level))
+        size = int(np.clip(count // MIN_BATCHES_PER_LEVEL, 1, MAX_BATCH_NODES))
+        for batch_start in range(start, start + count, size):
+            batches.append((batch_start, min(batch_start + size, start + count), level))
+        start += count
+    batch_of = np.empty(len(levels), dtype=np.int32)
+    for number, (batch_start, batch_stop, _) in enumerate(batches):
+        batch_of[order[batch_start:batch_stop]] = number
+    return order, batches, batch_of
+
+
+def spiral_offsets(grid: SimulationGrid, ellipsoid: SearchEllipsoid, step: int) -> np.ndarray:
+    """Grid offsets (multiples of step) inside the search ellipsoid, closest first"""
+    reach = np.minimum(np.ceil(ellipsoid.radii.max() / (grid.size * step)), MAX_SPIRAL_REACH).astype(int)
+    axes = [np.arange(-r, r + 1) * step for r in reach]
+    offsets = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    distance = np.linalg.norm(ellipsoid.transform(offsets * grid.size), axis=1)
+    keep = (distance > 0) & (distance <= ellipsoid.major)
+    return offsets[keep][np.argsort(distance[keep], kind="stable")]
+
+
+def simulated_neighbours(
+    grid: SimulationGrid,
+    ijk: np.ndarray,
+    offsets: np.ndarray,
+    batch_of: np.ndarray,
+    batch: int,
+    max_nodes: int
+) -> np.ndarray:
+    """
+    Closest nodes simulated before `batch` (batch_of < batch) around each
+    of the given nodes, walking the offsets in distance order.
+    (n, max_nodes) flat indices padded with n_nodes.
+    """
+    shape = np.array(grid.shape)
+    found = np.full((len(ijk), max_nodes), grid.n_nodes, dtype=np.int64)
+    count = np.zeros(len(ijk), dtype=np.int64)
+    active = np.arange(len(ijk))
+    for start in range(0, len(offsets), SPIRAL_CHUNK):
+        if not len(active) or max_nodes == 0:
+            break
+        candidate = ijk[active, None, :] + offsets[None, start:start + SPIRAL_CHUNK, :]
+        inside = np.all((candidate >= 0) & (candidate < shape), axis=-1)
+        flat = np.ravel_multi_index(tuple(np.moveaxis(candidate, -1, 0)), grid.shape, mode="clip")
+        usable = inside & (batch_of[flat] < batch)
+        rank = np.cumsum(usable, axis=1) + count[active, None]
+        take = usable & (rank <= max_nodes)
+        rows, cols = np.nonzero(take)
+        found[active[rows], rank[rows, cols] - 1] = flat[rows, cols]
+        count[active] = np.minimum(rank[:, -1], max_nodes)
+        active = active[count[active] < max_nodes]
+    return found
+
+
+@dataclass
+class SimulationSetup:
+    """Everything a realization needs besides the shared arrays"""
+    grid: SimulationGrid
+    variogram: VariogramModel  # of the normal scores (unit sill)
+    ellipsoid: SearchEllipsoid
+    max_simulated: int
+    transform: NormalScoreTransform
+
+
+def simulate_realization(setup: SimulationSetup, arrays: Dict[str, np.ndarray], seed) -> np.ndarray:
+    """
+    One SGS realization on every grid node, back-transformed.
+
+    arrays holds data_xyz, data_scores and data_neighbours ((n_nodes, k)
+    sample indices per node padded with n_data, from conditioning_neighbours).
+    """
+    grid = setup.grid
+    rng = np.random.default_rng(seed)
+    data_xyz = np.vstack([arrays["data_xyz"], np.zeros((1, 3))])
+    data_scores = np.append(arrays["data_scores"], 0.0)
+    n_data = len(arrays["data_scores"])
+    levels = arrays["levels"]
+    order, batches, batch_of = random_path(levels, rng)
+    spirals = {}
+
+    simulated = np.zeros(grid.n_nodes + 1)
+    for number, (start, stop, level) in enumerate(batches):
+        if level not in spirals:
+            spirals[level] = spiral_offsets(grid, setup.ellipsoid, 2 ** int(level))
+        nodes = order[start:stop]
+        ijk = grid.ijk(nodes)
+        node_neighbours = simulated_neighbours(grid, ijk, spirals[level], batch_of, number, setup.max_simulated)
+        data_neighbours = arrays["data_neighbours"][nodes]
+
+        node_mask = node_neighbours < grid.n_nodes
+        points = np.concatenate([
+            data_xyz[data_neighbours],
+            grid.xyz(np.minimum(node_neighbours, grid.n_nodes - 1))
+        ], axis=1)
+        values = np.concatenate([data_scores[data_neighbours], simulated[node_neighbours]], axis=1)
+        mask = np.concatenate([data_neighbours < n_data, node_mask], axis=1)
+
+        mean, variance = simple_kriging(grid.xyz(nodes), points, values, mask, setup.variogram)
+        simulated[nodes] = mean + np.sqrt(variance) * rng.standard_normal(len(nodes))
+
+    return setup.transform.back(simulated[:grid.n_nodes])
+
+
+def conditioning_neighbours(
+    grid: SimulationGrid,
+    data_xyz: np.ndarray,
+    ellipsoid: SearchEllipsoid,
+    max_data: int
+) -> np.ndarray:
+    """Closest samples inside the search ellipsoid of every node, padded with n_data"""
+    search_data = ellipsoid.transform(data_xyz)
+    neighbours = np.empty((grid.n_nodes, max(1, min(max_data, len(data_xyz)))), dtype=np.int32)
+    for start in range(0, grid.n_nodes, 200000):
+        nodes = np.arange(start, min(start + 200000, grid.n_nodes))
+        neighbourhood = search_neighbours(
+            ellipsoid.transform(grid.xyz(nodes)), search_data, ellipsoid.major, max_data
+        )
+        neighbours[nodes] = neighbourhood.indices
+    return neighbours
+
+
+class SimulationSummary:
+    """
+    Online reduction of realizations: Welford e-type mean/variance per
+    node, exceedance counts per cutoff, and tonnage/grade above each
+    cutoff per realization (weighted by node tonnage).
+    """
+
+    def __init__(self, n_nodes: int, cutoffs: Sequence[float], node_tonnage: np.ndarray):
+        self.cutoffs = np.asarray(cutoffs, dtype=np.float64)
+        self.node_tonnage = np.asarray(node_tonnage, dtype=np.float64)
+        self.count = 0
+        self.mean = np.zeros(n_nodes)
+        self._m2 = np.zeros(n_nodes)
+        self.above = np.zeros((n_nodes, len(self.cutoffs)), dtype=np.uint16)
+        self.tonnage = []
+        self.grade = []
+
+    def add(self, values: np.ndarray):
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (values - self.mean)
+
+        tonnage, grade = [], []
+        for n, cutoff in enumerate(self.cutoffs):
+            above = values > cutoff
+            self.above[:, n] += above
+            tonnes = float(self.node_tonnage[above].sum())
+            tonnage.append(tonnes)
+            grade.append(float(np.dot(self.node_tonnage[above], values[above]) / tonnes) if tonnes > 0 else None)
+        self.tonnage.append(tonnage)
+        self.grade.append(grade)
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self._m2 / max(self.count, 1)
+
+    @property
+    def probability_above(self) -> np.ndarray:
+        return self.above / max(self.count, 1)
+
+    def tonnage_grade(self) -> List[Dict]:
+        """Per cutoff: P10/P50/P90 (percentiles over realizations) of tonnage, grade and metal"""
+        tonnage = np.array(self.tonnage, dtype=np.float64).reshape(-1, len(self.cutoffs))
+        grade = np.array(self.grade, dtype=np.float64).reshape(-1, len(self.cutoffs))
+        metal = tonnage * np.nan_to_num(grade)
+        report = []
+        for n, cutoff in enumerate(self.cutoffs):
+            entry = {"cutoff": float(cutoff)}
+            for name, values in (("tonnage", tonnage[:, n]), ("grade", grade[:, n]), ("metal", metal[:, n])):
+                finite = values[np.isfinite(values)]
+                for p in REPORT_PERCENTILES:
+                    entry[f"{name}_p{p}"] = float(np.percentile(finite, p)) if len(finite) else None
+            report.append(entry)
+        return report
+
+
+# ==================== PARALLEL REALIZATIONS ====================
+
+# Worker-process state, populated once per process by _init_worker
+_worker_state: Dict[str, object] = {}
+
+
+def _init_worker(specs: dict, setup: SimulationSetup):
+    blocks = {}
+    arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        blocks[name] = block
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    _worker_state.update(blocks=blocks, arrays=arrays, setup=setup)
+
+
+def _realization_task(seed):
+    return simulate_realization(_worker_state["setup"], _worker_state["arrays"], seed)
+
+
+def simulate(
+    grid: SimulationGrid,
+    data_xyz: np.ndarray,
+    data_values: np.ndarray,
+    variogram: VariogramModel,
+    ellipsoid: SearchEllipsoid,
+    summary: SimulationSummary,
+    n_realizations: int,
+    max_data: int = 12,
+    max_simulated: int = 12,
+    seed: int = 0,
+    n_workers: int = 1,
+    progress: Optional[Callable[[float], None]] = None
+) -> SimulationSummary:
+    """
+    Draw n_realizations conditional realizations of data_values on the
+    grid and fold each into summary as it arrives.
+
+    variogram must model the normal scores (unit sill). Realization r uses
+    seed stream r of `seed`, so results do not depend on n_workers
+    (n_workers <= 0 uses every available core).
+    """
+    data_xyz = np.ascontiguousarray(data_xyz, dtype=np.float64)
+    transform, scores = NormalScoreTransform.fit(data_values, seed)
+    setup = SimulationSetup(grid, variogram, ellipsoid, int(max_simulated), transform)
+    arrays = {
+        "data_xyz": data_xyz,
+        "data_scores": scores,
+        "data_neighbours": conditioning_neighbours(grid, data_xyz, ellipsoid, max_data),
+        "levels": node_levels(grid.shape)
+    }
+    seeds = np.random.SeedSequence(seed).spawn(n_realizations)
+    if n_workers <= 0:
+        n_workers = os.cpu_count() or 1
+
+    def collect(realizations):
+        for n, values in enumerate(realizations):
+            summary.add(values)
+            if progress:
+                progress((n + 1) / n_realizations)
+
+    if n_workers == 1 or n_realizations == 1:
+        collect(simulate_realization(setup, arrays, s) for s in seeds)
+    else:
+        with SharedArrays(**arrays) as shared:
+            # spawn: never fork a uvicorn worker that may hold threads and DB sockets
+            with ProcessPoolExecutor(
+                max_workers=min(n_workers, n_realizations),
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(shared.specs, setup)
+            ) as pool:
+                collect(_bounded_map(pool, _realization_task, seeds, 2 * n_workers))
+    return summary
+
+
+def _bounded_map(pool: ProcessPoolExecutor, func, items, window: int):
+    """pool.map in order, with at most `window` results in flight or waiting"""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,12 @@
+#!/bin/sh
+# Start the modelling job workers and the API in one container.
+# They must share BLOCK_STORE_DIR, so workers run beside uvicorn rather
+# than as a separate service. Workers are restarted if they exit.
+(
+    while true; do
+        python worker.py --processes "${WORKER_PROCESSES:-1}"
+        sleep 2
+    done
+) &
+
+exec uvicorn main:app --host 0.0.0.0 --port "${PORT:-8000}" --workers "${WEB_CONCURRENCY:-2}"
@@ -0,0 +1,59 @@
+"""
+Shared test setup: backend modules on sys.path, a throwaway block store
+directory, and a scripted stand-in for psycopg2 connections.
+"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("BLOCK_STORE_DIR", tempfile.mkdtemp(prefix="geoforge-store-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """Answers each query with the rows of the first responder whose fragment it contains"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.connection.queries.append((query, params))
+        self.rows = []
+        for fragment, respond in self.connection.responders:
+            if fragment in query:
+                self.rows = respond(params) if callable(respond) else respond
+                break
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """psycopg2-like connection; responders are (query fragment, rows or callable(params)) pairs"""
+
+    def __init__(self, responders=()):
+        self.responders = list(responders)
+        self.queries = []
+        self.autocommit = False
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,38 @@
+"""LOD pyramid builds against concurrent rebuilds"""
+import threading
+
+import numpy as np
+
+from block_lod import build_pyramid, load_pyramid
+from block_store import BlockModelStore
+
+
+GRID = {
+    "x_min": 0.0, "y_min": 0.0, "z_min": 0.0,
+    "block_size_x": 10.0, "block_size_y": 10.0, "block_size_z": 10.0,
+    "nx": 24, "ny": 24, "nz": 12
+}
+
+
+def test_concurrent_rebuilds_leave_a_readable_current_pyramid():
+    store = BlockModelStore.create("lod-concurrent", GRID)
+    errors = []
+
+    def rebuild():
+        try:
+            for _ in range(5):
+                build_pyramid(BlockModelStore("lod-concurrent"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rebuild) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    pyramid = load_pyramid(store)
+    assert int(pyramid["version"]) == store.reload().meta["version"]
+    assert int(pyramid["n_levels"]) > 0
+    assert np.isclose(pyramid[f"l{int(pyramid['n_levels'])}_tonnage"].sum(), store.tonnage().sum())
@@ -0,0 +1,37 @@
+"""Column updates against concurrent writers"""
+import numpy as np
+import pytest
+
+from block_store import BlockModelStore, ColumnUpdate, StoreVersionConflict
+
+
+GRID = {
+    "x_min": 0.0, "y_min": 0.0, "z_min": 0.0,
+    "block_size_x": 10.0, "block_size_y": 10.0, "block_size_z": 10.0,
+    "nx": 4, "ny": 4, "nz": 2
+}
+
+
+def test_commit_rejects_an_update_based_on_a_stale_version():
+    store = BlockModelStore.create("column-conflict", GRID)
+    first = ColumnUpdate(store)
+    second = ColumnUpdate(BlockModelStore("column-conflict"))
+    first.set("au_grade", np.arange(4), 1.0)
+    second.set("ag_grade", np.arange(4, 8), 2.0)
+
+    version = first.commit()
+    with pytest.raises(StoreVersionConflict):
+        second.commit()
+
+    store.reload()
+    assert store.meta["version"] == version
+    assert np.all(np.asarray(store.column("au_grade"))[:4] == 1.0)
+    assert not np.any(np.asarray(store.column("ag_grade")) == 2.0)
+
+
+def test_commit_after_a_fresh_start_succeeds():
+    store = BlockModelStore.create("column-retry", GRID)
+    ColumnUpdate(store).commit()
+    updates = ColumnUpdate(store)
+    updates.set("cu_grade", np.arange(3), 0.5)
+    assert updates.commit() == updates.base_version + 1
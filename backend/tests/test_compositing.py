@@ -0,0 +1,43 @@
+"""Length-weighted composite grades"""
+import numpy as np
+
+from compositing import composite_intervals, split_domains
+
+
+def test_composite_grades_weight_partial_intervals_by_length():
+    # Hole 0: 0-1.5 @ 2, 1.5-2 @ 6, 2-3.2 unassayed, 3.2-4 @ 1 (listed out of order)
+    # Hole 1: 0-4 @ 10
+    sample_hole = np.array([0, 1, 0, 0, 0])
+    sample_from = np.array([1.5, 0.0, 0.0, 3.2, 2.0])
+    sample_to = np.array([2.0, 4.0, 1.5, 4.0, 3.2])
+    grades = np.array([6.0, 10.0, 2.0, 1.0, np.nan])
+
+    grade, sampled_length = composite_intervals(
+        sample_hole, sample_from, sample_to, grades,
+        piece_hole=np.array([0, 0, 0, 1, 0]),
+        piece_from=np.array([0.0, 1.0, 2.0, 1.0, 2.1]),
+        piece_to=np.array([1.0, 2.0, 3.0, 2.5, 3.0])
+    )
+
+    assert np.allclose(sampled_length[:, 0], [1.0, 1.0, 0.0, 1.5, 0.0])
+    assert np.isclose(grade[0, 0], 2.0)
+    assert np.isclose(grade[1, 0], (0.5 * 2.0 + 0.5 * 6.0) / 1.0)
+    assert np.isnan(grade[2, 0]) and np.isnan(grade[4, 0])
+    assert np.isclose(grade[3, 0], 10.0)
+
+
+def test_missing_assays_do_not_count_towards_the_length():
+    grade, sampled_length = composite_intervals(
+        np.zeros(3, dtype=np.int64), np.array([0.0, 1.0, 2.0]), np.array([1.0, 2.0, 3.0]),
+        np.array([[1.0, 5.0], [np.nan, 7.0], [4.0, np.nan]]),
+        piece_hole=np.zeros(1, dtype=np.int64), piece_from=np.array([0.5]), piece_to=np.array([2.5])
+    )
+    assert np.allclose(sampled_length, [[1.0, 1.5]])
+    assert np.allclose(grade, [[(0.5 * 1.0 + 0.5 * 4.0) / 1.0, (0.5 * 5.0 + 1.0 * 7.0) / 1.5]])
+
+
+def test_split_domains_gives_the_remainder_to_the_last_piece():
+    domain, piece_from, piece_to = split_domains(np.array([0.0, 10.0]), np.array([5.0, 12.0]), 2.0)
+    assert domain.tolist() == [0, 0, 0, 1]
+    assert np.allclose(piece_from, [0.0, 2.0, 4.0, 10.0])
+    assert np.allclose(piece_to, [2.0, 4.0, 5.0, 12.0])
@@ -0,0 +1,47 @@
+"""Desurvey traces against known hole geometry"""
+import numpy as np
+
+from desurvey import desurvey
+
+
+def test_minimum_curvature_follows_a_circular_arc():
+    # Vertical at the collar, horizontal heading north after 100 m: a
+    # quarter circle of radius 200 / pi in the north-elevation plane
+    length = 100.0
+    radius = 2.0 * length / np.pi
+    collar = np.array([[1000.0, 2000.0, 300.0]])
+    depths = np.array([0.0, 10.0, 37.5, 50.0, 99.0, 100.0, 130.0])
+
+    positions = desurvey(
+        collar,
+        station_hole=np.array([0, 0]),
+        station_depth=np.array([0.0, length]),
+        station_dip=np.array([-90.0, 0.0]),
+        station_azimuth=np.array([0.0, 0.0]),
+        point_hole=np.zeros(len(depths), dtype=np.int64),
+        point_depth=depths
+    )
+
+    theta = np.minimum(depths, length) / radius
+    beyond = np.maximum(depths - length, 0.0)  # straight north past the last station
+    expected = collar + np.column_stack([
+        np.zeros(len(depths)),
+        radius * (1.0 - np.cos(theta)) + beyond,
+        -radius * np.sin(theta)
+    ])
+    assert np.allclose(positions, expected, atol=1e-9)
+
+
+def test_holes_are_desurveyed_independently():
+    collars = np.array([[0.0, 0.0, 0.0], [50.0, 0.0, 10.0]])
+    positions = desurvey(
+        collars,
+        station_hole=np.array([1, 0, 1]),
+        station_depth=np.array([0.0, 0.0, 40.0]),
+        station_dip=np.array([-60.0, -90.0, -60.0]),
+        station_azimuth=np.array([90.0, 0.0, 90.0]),
+        point_hole=np.array([0, 1]),
+        point_depth=np.array([20.0, 20.0])
+    )
+    assert np.allclose(positions[0], [0.0, 0.0, -20.0])
+    assert np.allclose(positions[1], [50.0 + 10.0, 0.0, 10.0 - 20.0 * np.sin(np.radians(60.0))])
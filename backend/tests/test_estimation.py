@@ -0,0 +1,42 @@
+"""Serial and parallel block estimation"""
+from dataclasses import fields
+
+import numpy as np
+
+from estimation import BlockEstimates, EstimationParams, SearchPass, estimate_blocks
+from geostats import SearchEllipsoid, VariogramModel
+
+
+def grid(nx, ny, nz, size):
+    ijk = np.stack(np.meshgrid(np.arange(nx), np.arange(ny), np.arange(nz), indexing="ij"), axis=-1).reshape(-1, 3)
+    return ijk, (ijk + 0.5) * size
+
+
+def test_parallel_estimates_match_serial_exactly():
+    rng = np.random.default_rng(11)
+    block_ijk, block_xyz = grid(16, 12, 6, np.array([10.0, 10.0, 5.0]))
+    sample_xyz = rng.uniform(0, 1, size=(300, 3)) * [160.0, 120.0, 30.0]
+    grades = np.column_stack([rng.lognormal(0.0, 0.7, 300), rng.normal(5.0, 1.0, 300)])
+    params = EstimationParams(
+        search_radius=40.0,
+        variogram=VariogramModel.isotropic("spherical", nugget=0.1, sill=0.9, range=60.0),
+        ellipsoid=SearchEllipsoid(major=40.0, semi=30.0, minor=15.0, azimuth=20.0),
+        passes=[SearchPass(1.0, 4, 12), SearchPass(2.0, 1, 8)],
+        discretization=2
+    )
+    block_size = np.tile([10.0, 10.0, 5.0], (len(block_xyz), 1))
+
+    serial = estimate_blocks(block_xyz, block_ijk, sample_xyz, grades, params, n_workers=1, block_size=block_size)
+    progress = []
+    slabbed = estimate_blocks(
+        block_xyz, block_ijk, sample_xyz, grades, params, n_workers=1, progress=progress.append,
+        block_size=block_size
+    )
+    parallel = estimate_blocks(block_xyz, block_ijk, sample_xyz, grades, params, n_workers=2, block_size=block_size)
+
+    assert serial.estimated.all()
+    assert progress[-1] == 1.0
+    for f in fields(BlockEstimates):
+        expected = getattr(serial, f.name)
+        np.testing.assert_array_equal(getattr(slabbed, f.name), expected, err_msg=f.name)
+        np.testing.assert_array_equal(getattr(parallel, f.name), expected, err_msg=f.name)
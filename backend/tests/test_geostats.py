@@ -0,0 +1,67 @@
+"""Kriging kernels against direct computations"""
+import numpy as np
+
+from geostats import (
+    BlockSupport, VariogramModel, VariogramStructure, ordinary_kriging, search_neighbours
+)
+
+
+VARIOGRAM = VariogramModel(
+    nugget=0.2,
+    structures=[VariogramStructure("spherical", sill=0.8, range=60.0, range_semi=40.0, range_minor=20.0)],
+    azimuth=30.0, dip=-10.0
+)
+
+
+def direct_ordinary_kriging(target, points, values, variogram):
+    """One textbook OK system: [C 1; 1' 0] [w; mu] = [c0; 1]"""
+    k = len(points)
+    lhs = np.ones((k + 1, k + 1))
+    lhs[:k, :k] = variogram.covariance_vectors(points[:, None, :] - points[None, :, :])
+    lhs[k, k] = 0.0
+    c0 = variogram.covariance_vectors(points - target)
+    solution = np.linalg.solve(lhs, np.r_[c0, 1.0])
+    weights, mu = solution[:k], solution[k]
+    covariance_zz = weights @ c0
+    variance_estimate = weights @ lhs[:k, :k] @ weights
+    return {
+        "estimate": weights @ values,
+        "variance": variogram.total_sill - covariance_zz - mu,
+        "slope_of_regression": covariance_zz / variance_estimate,
+        "negative_weight_sum": np.minimum(weights, 0.0).sum()
+    }
+
+
+def test_batched_ordinary_kriging_matches_a_direct_solve():
+    rng = np.random.default_rng(7)
+    samples = rng.uniform(0, 100, size=(80, 3)) * [1.0, 1.0, 0.4]
+    values = rng.lognormal(0.0, 0.8, size=len(samples))
+    targets = rng.uniform(10, 90, size=(25, 3)) * [1.0, 1.0, 0.4]
+
+    # Radius small enough that neighbour counts differ (padded slots)
+    neighbourhood = search_neighbours(targets, samples, 30.0, 12)
+    assert neighbourhood.counts.min() > 0
+    assert len(np.unique(neighbourhood.counts)) > 1
+    result = ordinary_kriging(targets, samples, values, neighbourhood, VARIOGRAM, batch_size=7)
+    assert (result.negative_weight_sum < 0).any()
+
+    for t, target in enumerate(targets):
+        chosen = neighbourhood.indices[t][neighbourhood.mask[t]]
+        expected = direct_ordinary_kriging(target, samples[chosen], values[chosen], VARIOGRAM)
+        for name, value in expected.items():
+            assert np.isclose(getattr(result, name)[t], value, rtol=1e-6, atol=1e-8), name
+
+
+def test_block_support_within_excludes_the_nugget():
+    structure = VariogramStructure("spherical", sill=0.6, range=80.0)
+    nugget = VariogramModel(nugget=0.4, structures=[structure])
+    continuous = VariogramModel(nugget=0.0, structures=[structure])
+    size = (10.0, 10.0, 5.0)
+
+    support = BlockSupport(nugget, size, n=3)
+    assert np.isclose(support.within, BlockSupport(continuous, size, n=3).within)
+    assert support.within < structure.sill
+
+    # Direct mean over all pairs of discretization points
+    lags = support.offsets[:, None, :] - support.offsets[None, :, :]
+    assert np.isclose(support.within, np.mean(continuous.covariance_vectors(lags)))
@@ -0,0 +1,42 @@
+"""Order relations and recoverable resources from indicator ccdfs"""
+import numpy as np
+
+from indicator_kriging import IndicatorDistribution, correct_order_relations, decode_ccdf, encode_ccdf
+
+
+def test_order_relation_correction_averages_upward_and_downward_passes():
+    kriged = np.array([
+        [0.3, 0.2, 0.5, 1.2],
+        [-0.1, 0.4, 0.35, 0.9],
+        [0.1, 0.4, 0.7, 0.95]
+    ])
+    corrected = correct_order_relations(kriged)
+
+    assert np.allclose(corrected[0], [0.25, 0.25, 0.5, 1.0])
+    assert np.allclose(corrected[1], [0.0, 0.375, 0.375, 0.9])
+    assert np.allclose(corrected[2], kriged[2])  # already a valid cdf
+    assert np.all(np.diff(corrected, axis=1) >= 0)
+    assert np.all((corrected >= 0) & (corrected <= 1))
+
+
+def test_recoverable_tonnage_and_metal_at_cutoffs_between_thresholds():
+    rng = np.random.default_rng(3)
+    samples = rng.lognormal(0.0, 1.0, size=500)
+    distribution = IndicatorDistribution(samples, [0.5, 1.0, 2.0, 4.0])
+
+    # Block 0 carries the sample distribution; block 1 is certainly below 0.5
+    sample_cdf = (samples[:, None] <= distribution.cutoffs[None, :]).mean(axis=0)
+    ccdf = decode_ccdf(encode_ccdf(np.vstack([sample_cdf, np.ones(4)])))
+    tonnage = np.array([1000.0, 3000.0])
+    assert np.isclose(distribution.etype(ccdf)[0], samples.mean(), rtol=1e-4)
+
+    for cutoff in (0.0, 0.3, 0.5, 1.7, 3.0, 6.5):
+        proportion, metal_per_tonne = distribution.above(ccdf, cutoff)
+        above = samples > cutoff
+        assert np.isclose(proportion[0], above.mean(), atol=1e-4)
+        assert np.isclose(metal_per_tonne[0], (samples * above).mean(), rtol=1e-3, atol=1e-4)
+        if cutoff >= 0.5:
+            assert proportion[1] < 1e-4
+        # Recoverable tonnes as reported per cutoff: sum of tonnage x P(grade > cutoff)
+        expected_tonnes = tonnage[0] * above.mean() + tonnage[1] * proportion[1]
+        assert np.isclose(tonnage @ proportion, expected_tonnes, rtol=1e-3)
@@ -0,0 +1,111 @@
+"""Modelling job outcomes recorded by jobs.run_job"""
+import time
+
+import pytest
+
+import jobs
+import main
+from conftest import FakeConnection
+
+
+def cancelling_connection(extra=()):
+    """Every progress report sees cancel_requested"""
+    return FakeConnection(list(extra) + [
+        ("RETURNING cancel_requested", [{"cancel_requested": True}]),
+        ("UPDATE modelling_jobs SET status", [{"id": "job-1"}]),
+    ])
+
+
+def final_status(conn):
+    finish = [params for query, params in conn.queries if query.startswith("UPDATE modelling_jobs SET status")]
+    return finish[-1][0]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    conn = cancelling_connection([
+        ("INSERT INTO block_models", [{"id": "bm-cancel", "model_name": "m", "total_blocks": 0, "created_at": None}]),
+    ])
+    monkeypatch.setattr(main, "get_db_connection", lambda: conn)
+    return conn
+
+
+def run(conn, job_type, params):
+    job = {"id": "job-1", "job_type": job_type, "params": params, "worker_id": "worker-1"}
+    return jobs.run_job(lambda: conn, conn, job)
+
+
+def test_cancelled_block_model_creation_is_recorded_as_cancelled(database):
+    params = dict(
+        project_id="p1", model_name="m", x_min=0, x_max=20, y_min=0, y_max=20, z_min=0, z_max=10,
+        block_size_x=10, block_size_y=10, block_size_z=10
+    )
+    assert run(database, "create_block_model", params) == "cancelled"
+    assert final_status(database) == "cancelled"
+
+
+def test_cancelled_cross_validation_is_recorded_as_cancelled(database):
+    assert run(database, "cross_validation", {"project_id": "p1", "element": "au_ppm"}) == "cancelled"
+    assert final_status(database) == "cancelled"
+
+
+def test_cancelled_simulation_is_recorded_as_cancelled(database, monkeypatch):
+    database.responders.insert(0, ("FROM block_models", [{"id": "bm-cancel", "project_id": "p1"}]))
+    monkeypatch.setattr(main, "get_block_store", lambda cur, block_model: None)
+    monkeypatch.setattr(main, "search_settings", lambda block_model: (None, None))
+    assert run(database, "simulate_block_model", {"block_model_id": "bm-cancel"}) == "cancelled"
+    assert final_status(database) == "cancelled"
+
+
+def test_job_taken_from_worker_is_not_recorded(monkeypatch):
+    # Requeued as stale and claimed elsewhere: progress and finish match no row
+    conn = FakeConnection([("FROM cross_validation", [])])
+    monkeypatch.setattr(main, "get_db_connection", lambda: conn)
+    assert run(conn, "cross_validation", {"project_id": "p1", "element": "au_ppm"}) == "lost"
+    progress = [params for query, params in conn.queries if "RETURNING cancel_requested" in query]
+    assert progress[0][-1] == "worker-1"
+    assert not [query for query, _ in conn.queries if query.startswith("UPDATE modelling_jobs SET status")]
+
+
+def test_finish_job_only_updates_owned_running_job():
+    conn = FakeConnection()
+    assert not jobs.finish_job(conn, "job-1", "succeeded", {"ok": True}, worker_id="worker-1")
+    query, params = conn.queries[-1]
+    assert "AND worker_id = %s AND status = 'running'" in query
+    assert params[-2:] == ("job-1", "worker-1")
+
+
+def test_heartbeat_survives_database_errors(monkeypatch):
+    monkeypatch.setattr(jobs, "HEARTBEAT_SECONDS", 0.01)
+    heartbeats = FakeConnection()
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) in (2, 3):
+            raise RuntimeError("connection refused")
+        return heartbeats
+
+    context = jobs.JobContext(connect, {"id": "job-1", "params": {}, "worker_id": "worker-1"})
+    deadline = time.monotonic() + 5
+    while len(heartbeats.queries) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    context.close()
+    # Two failed connections, then the thread reconnected and kept beating
+    assert len(attempts) == 4
+    assert len(heartbeats.queries) >= 2
+    assert heartbeats.queries[0][1] == ("job-1", "worker-1")
+
+
+def test_always_deferred_work_runs_when_the_job_fails():
+    ran = []
+
+    @jobs.job_handler("test_fails_after_commit")
+    def fails_after_commit(params, job):
+        job.defer(ran.append, "sync", always=True)
+        job.defer(ran.append, "on success only")
+        raise RuntimeError("estimation record write failed")
+
+    conn = FakeConnection([("UPDATE modelling_jobs SET status", [{"id": "job-1"}])])
+    assert run(conn, "test_fails_after_commit", {}) == "failed"
+    assert ran == ["sync"]
@@ -0,0 +1,91 @@
+"""
+GeoForge Modelling Worker
+Runs queued modelling jobs outside the web processes
+
+    python worker.py                 # one worker process
+    python worker.py --processes 4   # four independent workers
+
+Each process keeps one connection that LISTENs on the modelling_jobs
+channel, claims jobs with FOR UPDATE SKIP LOCKED and runs them one at a
+time. SIGTERM/SIGINT let the current job finish before exiting; a worker
+that dies mid-job is detected by its stale heartbeat and the job is
+requeued by any other worker.
+"""
+import argparse
+import multiprocessing
+import os
+import select
+import signal
+import socket
+
+# Importing main registers the job handlers and the DB connection helper
+import main
+from jobs import JOB_CHANNEL, claim_job, requeue_stale_jobs, run_job
+
+
+# Seconds an idle worker waits for a NOTIFY before polling the queue anyway
+POLL_SECONDS = 5.0
+
+
+def work(worker_number: int = 0):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    listener = main.get_db_connection()
+    listener.autocommit = True
+    listener.cursor().execute(f"LISTEN {JOB_CHANNEL}")
+    conn = main.get_db_connection()
+    print(f"Worker {worker_id} listening for modelling jobs")
+
+    try:
+        while not stopping:
+            requeue_stale_jobs(conn)
+            job = claim_job(conn, worker_id)
+            if job is None:
+                # Sleep until a job is enqueued (or the poll interval passes)
+                if select.select([listener], [], [], POLL_SECONDS) != ([], [], []):
+                    listener.poll()
+                    listener.notifies.clear()
+                continue
+
+            print(f"Worker {worker_id} running {job['job_type']} job {job['id']}")
+            status = run_job(main.get_db_connection, conn, job)
+            print(f"Worker {worker_id} finished job {job['id']}: {status}")
+    finally:
+        listener.close()
+        conn.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="GeoForge modelling job worker")
+    parser.add_argument(
+        "--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "1")),
+        help="number of worker processes (default: WORKER_PROCESSES or 1)"
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        work()
+        return
+
+    # Not daemonic: workers start their own process pools for estimation
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=work, args=(n,)) for n in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def _forward(signum, _frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main_cli()
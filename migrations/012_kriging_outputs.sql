@@ -0,0 +1,14 @@
+-- ==========================================
+-- GeoForge: Kriging Estimation Outputs
+-- Migration 012: Per-block kriging quality metrics
+-- Purpose: Store slope of regression and sum of negative weights
+--          alongside the kriging variance written by estimate_block_grades
+-- ==========================================
+
+ALTER TABLE block_model_cells
+    ADD COLUMN IF NOT EXISTS slope_of_regression DOUBLE PRECISION, -- Cov(Z, Z*) / Var(Z*), 1.0 = conditionally unbiased
+    ADD COLUMN IF NOT EXISTS negative_weight_sum DOUBLE PRECISION; -- Sum of negative kriging weights (screen effect)
+
+COMMENT ON COLUMN block_model_cells.au_variance IS 'Ordinary kriging variance of the last estimated element';
+COMMENT ON COLUMN block_model_cells.slope_of_regression IS 'Slope of regression of true on estimated grade (kriging quality)';
+COMMENT ON COLUMN block_model_cells.negative_weight_sum IS 'Sum of negative kriging weights used for the block estimate';
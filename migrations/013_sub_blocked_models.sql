@@ -0,0 +1,31 @@
+-- ==========================================
+-- GeoForge: Sub-Blocked Block Models
+-- Migration 013: Octree sub-block cells
+-- Purpose: Let block_model_cells hold variable-size child cells of a
+--          regular parent grid (model_type = 'subblock')
+-- ==========================================
+
+ALTER TABLE block_models
+    ADD COLUMN IF NOT EXISTS sub_block_levels INTEGER DEFAULT 0, -- Max octree depth (child edge = parent edge / 2^level)
+    ADD COLUMN IF NOT EXISTS total_cells INTEGER; -- Leaf cells after sub-blocking (= total_blocks for regular models)
+
+ALTER TABLE block_model_cells
+    ADD COLUMN IF NOT EXISTS sub_level SMALLINT NOT NULL DEFAULT 0, -- 0 = whole parent block
+    ADD COLUMN IF NOT EXISTS sub_i SMALLINT NOT NULL DEFAULT 0, -- Child index within the parent at sub_level
+    ADD COLUMN IF NOT EXISTS sub_j SMALLINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS sub_k SMALLINT NOT NULL DEFAULT 0;
+
+-- i, j, k now identify the parent block; a cell is parent + octree path
+ALTER TABLE block_model_cells
+    DROP CONSTRAINT IF EXISTS block_model_cells_block_model_id_i_j_k_key;
+
+ALTER TABLE block_model_cells
+    DROP CONSTRAINT IF EXISTS block_model_cells_cell_key;
+
+ALTER TABLE block_model_cells
+    ADD CONSTRAINT block_model_cells_cell_key
+    UNIQUE (block_model_id, i, j, k, sub_level, sub_i, sub_j, sub_k);
+
+COMMENT ON COLUMN block_models.sub_block_levels IS 'Maximum octree subdivision level of a sub-blocked model';
+COMMENT ON COLUMN block_model_cells.i IS 'Parent block X index';
+COMMENT ON COLUMN block_model_cells.sub_level IS 'Octree level of the cell; edge length = parent block size / 2^sub_level';
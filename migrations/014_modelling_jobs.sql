@@ -0,0 +1,46 @@
+-- ==========================================
+-- GeoForge: Background Modelling Jobs
+-- Migration 014: PostgreSQL-backed job queue
+-- Purpose: Run block model creation, estimation and section
+--          interpolation in worker processes instead of HTTP requests.
+--          Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED
+--          and are woken by NOTIFY modelling_jobs.
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS modelling_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    job_type VARCHAR(50) NOT NULL, -- 'create_block_model', 'estimate_block_grades', 'section_grade'
+    project_id UUID,
+    block_model_id UUID REFERENCES block_models(id) ON DELETE CASCADE,
+    params JSONB NOT NULL DEFAULT '{}',
+
+    -- Lifecycle
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+    progress DOUBLE PRECISION NOT NULL DEFAULT 0, -- 0..1
+    progress_message TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+
+    -- Outcome
+    result JSONB, -- Same payload the synchronous endpoint used to return
+    error TEXT,
+
+    -- Worker bookkeeping
+    worker_id VARCHAR(100),
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Queue scan: oldest queued job first
+CREATE INDEX IF NOT EXISTS idx_modelling_jobs_queued
+    ON modelling_jobs(created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_modelling_jobs_running
+    ON modelling_jobs(heartbeat_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_modelling_jobs_project ON modelling_jobs(project_id);
+CREATE INDEX IF NOT EXISTS idx_modelling_jobs_block_model ON modelling_jobs(block_model_id);
+
+COMMENT ON TABLE modelling_jobs IS 'Queue and status of long-running modelling jobs executed by worker.py';
+COMMENT ON COLUMN modelling_jobs.heartbeat_at IS 'Refreshed by the running worker; stale running jobs are requeued';
@@ -0,0 +1,75 @@
+-- ==========================================
+-- GeoForge: Downhole Surveys and Desurvey Cache
+-- Migration 015: drill_hole_surveys + sample_coordinates
+-- Purpose: Position samples along the real (curved) hole trace instead of
+--          straight down from the collar. Desurveyed sample midpoints are
+--          cached in sample_coordinates; triggers drop a hole's cached
+--          rows whenever its collar, surveys or sample intervals change,
+--          and the backend re-desurveys missing holes on next use.
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS drill_hole_surveys (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    drill_hole_id UUID NOT NULL REFERENCES drill_holes(id) ON DELETE CASCADE,
+    depth_m DOUBLE PRECISION NOT NULL CHECK (depth_m >= 0), -- Measured depth along the hole
+    dip DOUBLE PRECISION NOT NULL, -- Degrees, negative downward
+    azimuth DOUBLE PRECISION NOT NULL, -- Degrees clockwise from grid north
+    survey_method VARCHAR(50), -- 'gyro', 'multishot', 'planned', ...
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (drill_hole_id, depth_m)
+);
+
+CREATE TABLE IF NOT EXISTS sample_coordinates (
+    sample_id UUID PRIMARY KEY REFERENCES core_samples(id) ON DELETE CASCADE,
+    drill_hole_id UUID NOT NULL REFERENCES drill_holes(id) ON DELETE CASCADE,
+    project_id UUID NOT NULL,
+    from_depth DOUBLE PRECISION,
+    to_depth DOUBLE PRECISION,
+    mid_x DOUBLE PRECISION NOT NULL, -- Desurveyed interval midpoint
+    mid_y DOUBLE PRECISION NOT NULL,
+    mid_z DOUBLE PRECISION NOT NULL,
+    desurvey_method VARCHAR(30) NOT NULL DEFAULT 'minimum_curvature',
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sample_coordinates_project ON sample_coordinates(project_id);
+CREATE INDEX IF NOT EXISTS idx_sample_coordinates_hole ON sample_coordinates(drill_hole_id);
+
+-- ==========================================
+-- CACHE INVALIDATION
+-- ==========================================
+
+-- TG_ARGV[0] names the column holding the drill hole id on the changed row
+CREATE OR REPLACE FUNCTION invalidate_sample_coordinates()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM sample_coordinates
+        WHERE drill_hole_id = (to_jsonb(OLD) ->> TG_ARGV[0])::uuid;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        DELETE FROM sample_coordinates
+        WHERE drill_hole_id = (to_jsonb(NEW) ->> TG_ARGV[0])::uuid;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_desurvey_drill_holes ON drill_holes;
+CREATE TRIGGER trigger_desurvey_drill_holes
+    AFTER UPDATE OF easting, northing, elevation, dip, azimuth ON drill_holes
+    FOR EACH ROW EXECUTE FUNCTION invalidate_sample_coordinates('id');
+
+DROP TRIGGER IF EXISTS trigger_desurvey_surveys ON drill_hole_surveys;
+CREATE TRIGGER trigger_desurvey_surveys
+    AFTER INSERT OR UPDATE OR DELETE ON drill_hole_surveys
+    FOR EACH ROW EXECUTE FUNCTION invalidate_sample_coordinates('drill_hole_id');
+
+-- New samples are picked up as missing rows; deleted ones cascade
+DROP TRIGGER IF EXISTS trigger_desurvey_core_samples ON core_samples;
+CREATE TRIGGER trigger_desurvey_core_samples
+    AFTER UPDATE OF drill_hole_id, from_depth, to_depth ON core_samples
+    FOR EACH ROW EXECUTE FUNCTION invalidate_sample_coordinates('drill_hole_id');
+
+COMMENT ON TABLE drill_hole_surveys IS 'Downhole survey stations (dip/azimuth at measured depth)';
+COMMENT ON TABLE sample_coordinates IS 'Cached desurveyed sample midpoints read by the modelling endpoints';
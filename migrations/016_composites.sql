@@ -0,0 +1,129 @@
+-- ==========================================
+-- GeoForge: Downhole Composites
+-- Migration 016: Versioned composite sets
+-- Purpose: Store length-weighted composites (fixed length, by lithology
+--          or by vein) that estimation and section interpolation can use
+--          instead of raw assay intervals. composite_set_holes tracks which
+--          holes are composited; triggers drop a hole's row (cascading to
+--          its composites) when its data changes so refreshes only
+--          recomposite changed holes.
+-- Depends on: 015_desurvey.sql (drill_hole_surveys)
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS composite_sets (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    project_id UUID NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    method VARCHAR(20) NOT NULL CHECK (method IN ('fixed_length', 'lithology', 'vein')),
+    composite_length DOUBLE PRECISION CHECK (composite_length > 0), -- NULL = whole domain intervals
+    min_coverage DOUBLE PRECISION NOT NULL DEFAULT 0.5, -- Minimum assayed fraction of a composite
+    version INTEGER NOT NULL DEFAULT 0, -- Bumped whenever holes are recomposited
+    holes_count INTEGER DEFAULT 0,
+    composites_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_composite_sets_project ON composite_sets(project_id);
+
+CREATE TABLE IF NOT EXISTS composite_set_holes (
+    composite_set_id UUID NOT NULL REFERENCES composite_sets(id) ON DELETE CASCADE,
+    drill_hole_id UUID NOT NULL REFERENCES drill_holes(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL, -- Set version the hole was composited in
+    composited_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (composite_set_id, drill_hole_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_composite_set_holes_hole ON composite_set_holes(drill_hole_id);
+
+CREATE TABLE IF NOT EXISTS composites (
+    id BIGSERIAL PRIMARY KEY,
+    composite_set_id UUID NOT NULL,
+    drill_hole_id UUID NOT NULL,
+    from_depth DOUBLE PRECISION NOT NULL,
+    to_depth DOUBLE PRECISION NOT NULL,
+    domain TEXT, -- Lithology or vein id the composite belongs to
+    coverage DOUBLE PRECISION, -- Assayed fraction of the composite length
+    mid_x DOUBLE PRECISION NOT NULL, -- Desurveyed composite midpoint
+    mid_y DOUBLE PRECISION NOT NULL,
+    mid_z DOUBLE PRECISION NOT NULL,
+    au_ppm DOUBLE PRECISION,
+    ag_ppm DOUBLE PRECISION,
+    cu_ppm DOUBLE PRECISION,
+    pb_ppm DOUBLE PRECISION,
+    zn_ppm DOUBLE PRECISION,
+    FOREIGN KEY (composite_set_id, drill_hole_id)
+        REFERENCES composite_set_holes(composite_set_id, drill_hole_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_composites_set ON composites(composite_set_id);
+CREATE INDEX IF NOT EXISTS idx_composites_set_hole ON composites(composite_set_id, drill_hole_id);
+
+-- ==========================================
+-- INVALIDATION
+-- ==========================================
+
+-- TG_ARGV[0] names the column holding the drill hole id on the changed row
+CREATE OR REPLACE FUNCTION invalidate_composite_holes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM composite_set_holes
+        WHERE drill_hole_id = (to_jsonb(OLD) ->> TG_ARGV[0])::uuid;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        DELETE FROM composite_set_holes
+        WHERE drill_hole_id = (to_jsonb(NEW) ->> TG_ARGV[0])::uuid;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Assays reference their hole through core_samples
+CREATE OR REPLACE FUNCTION invalidate_composite_holes_for_assay()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM composite_set_holes
+    WHERE drill_hole_id IN (
+        SELECT drill_hole_id FROM core_samples
+        WHERE id IN (
+            (to_jsonb(OLD) ->> 'sample_id')::uuid,
+            (to_jsonb(NEW) ->> 'sample_id')::uuid
+        )
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_composites_assays ON assays;
+CREATE TRIGGER trigger_composites_assays
+    AFTER INSERT OR UPDATE OR DELETE ON assays
+    FOR EACH ROW EXECUTE FUNCTION invalidate_composite_holes_for_assay();
+
+DROP TRIGGER IF EXISTS trigger_composites_core_samples ON core_samples;
+CREATE TRIGGER trigger_composites_core_samples
+    AFTER INSERT OR UPDATE OR DELETE ON core_samples
+    FOR EACH ROW EXECUTE FUNCTION invalidate_composite_holes('drill_hole_id');
+
+DROP TRIGGER IF EXISTS trigger_composites_geological_units ON geological_units;
+CREATE TRIGGER trigger_composites_geological_units
+    AFTER INSERT OR UPDATE OR DELETE ON geological_units
+    FOR EACH ROW EXECUTE FUNCTION invalidate_composite_holes('drill_hole_id');
+
+DROP TRIGGER IF EXISTS trigger_composites_vein_intersections ON vein_intersections;
+CREATE TRIGGER trigger_composites_vein_intersections
+    AFTER INSERT OR UPDATE OR DELETE ON vein_intersections
+    FOR EACH ROW EXECUTE FUNCTION invalidate_composite_holes('drill_hole_id');
+
+DROP TRIGGER IF EXISTS trigger_composites_drill_holes ON drill_holes;
+CREATE TRIGGER trigger_composites_drill_holes
+    AFTER UPDATE OF easting, northing, elevation, dip, azimuth ON drill_holes
+    FOR EACH ROW EXECUTE FUNCTION invalidate_composite_holes('id');
+
+DROP TRIGGER IF EXISTS trigger_composites_surveys ON drill_hole_surveys;
+CREATE TRIGGER trigger_composites_surveys
+    AFTER INSERT OR UPDATE OR DELETE ON drill_hole_surveys
+    FOR EACH ROW EXECUTE FUNCTION invalidate_composite_holes('drill_hole_id');
+
+COMMENT ON TABLE composite_sets IS 'Compositing parameters and version; composites are refreshed per changed hole';
+COMMENT ON TABLE composites IS 'Length-weighted downhole composites with desurveyed midpoints';
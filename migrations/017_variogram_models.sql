@@ -0,0 +1,34 @@
+-- ==========================================
+-- GeoForge: Stored Variogram Models
+-- Migration 017: variogram_models
+-- Purpose: Fit variograms once (nested, optionally anisotropic) and let
+--          section-grade interpolation and block estimation reference
+--          them by id instead of refitting on every request.
+-- Depends on: 016_composites.sql (composite_sets)
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS variogram_models (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    project_id UUID NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    element VARCHAR(20) NOT NULL, -- 'au_ppm', 'cu_ppm', ...
+    composite_set_id UUID REFERENCES composite_sets(id) ON DELETE SET NULL, -- Data the model was fitted to (NULL = raw assays)
+
+    -- Model: nugget + nested structures sharing one orientation
+    nugget DOUBLE PRECISION NOT NULL DEFAULT 0,
+    structures JSONB NOT NULL, -- [{model_type, sill, range, range_semi, range_minor}, ...]
+    azimuth DOUBLE PRECISION NOT NULL DEFAULT 0, -- Major axis, degrees clockwise from north
+    dip DOUBLE PRECISION NOT NULL DEFAULT 0, -- Major axis, degrees (negative downward)
+    rake DOUBLE PRECISION NOT NULL DEFAULT 0, -- Semi-major axis rotation about the major axis
+    total_sill DOUBLE PRECISION,
+
+    -- Fitting record
+    fitted BOOLEAN NOT NULL DEFAULT TRUE, -- FALSE when entered manually
+    experimental JSONB, -- Experimental variogram(s) the model was fitted to
+    sample_count INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_variogram_models_project ON variogram_models(project_id, element);
+
+COMMENT ON TABLE variogram_models IS 'Fitted or manual variogram models referenced by id from estimation and interpolation';
@@ -0,0 +1,22 @@
+-- ==========================================
+-- GeoForge: Anisotropic Search Ellipsoids
+-- Migration 018: block_models search ellipsoid and passes
+-- Purpose: Let block estimation search samples inside a rotated ellipsoid
+--          (radii along major/semi-major/minor axes, oriented by
+--          azimuth/dip/rake) with expanding search passes, and record
+--          which pass estimated each cell.
+-- Depends on: 017_variogram_models.sql
+-- ==========================================
+
+ALTER TABLE block_models
+    ADD COLUMN IF NOT EXISTS search_radius_semi DOUBLE PRECISION, -- NULL = search_radius
+    ADD COLUMN IF NOT EXISTS search_radius_minor DOUBLE PRECISION, -- NULL = search_radius
+    ADD COLUMN IF NOT EXISTS search_azimuth DOUBLE PRECISION DEFAULT 0, -- Major axis, degrees clockwise from north
+    ADD COLUMN IF NOT EXISTS search_dip DOUBLE PRECISION DEFAULT 0, -- Major axis, degrees (negative downward)
+    ADD COLUMN IF NOT EXISTS search_rake DOUBLE PRECISION DEFAULT 0, -- Semi-major axis rotation about the major axis
+    ADD COLUMN IF NOT EXISTS search_passes JSONB; -- [{scale, min_samples, max_samples}, ...]; NULL = one pass
+
+ALTER TABLE block_model_cells
+    ADD COLUMN IF NOT EXISTS search_pass SMALLINT; -- 1-based pass that estimated the cell
+
+COMMENT ON COLUMN block_models.search_passes IS 'Expanding search passes; scale multiplies the ellipsoid radii';
@@ -0,0 +1,21 @@
+-- ==========================================
+-- GeoForge: Per-Element Kriging Variance
+-- Migration 019: block_model_cells variance per element
+-- Purpose: estimate_block_grades writes each element's kriging variance
+--          to its own column (previously every element overwrote
+--          au_variance), including multi-element runs that share one
+--          neighbourhood and kriging system per block.
+-- Depends on: 018_search_ellipsoids.sql
+-- ==========================================
+
+ALTER TABLE block_model_cells
+    ADD COLUMN IF NOT EXISTS ag_variance DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS cu_variance DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS pb_variance DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS zn_variance DOUBLE PRECISION;
+
+COMMENT ON COLUMN block_model_cells.au_variance IS 'Kriging variance of the Au estimate (IDW: neighbour variance)';
+COMMENT ON COLUMN block_model_cells.ag_variance IS 'Kriging variance of the Ag estimate (IDW: neighbour variance)';
+COMMENT ON COLUMN block_model_cells.cu_variance IS 'Kriging variance of the Cu estimate (IDW: neighbour variance)';
+COMMENT ON COLUMN block_model_cells.pb_variance IS 'Kriging variance of the Pb estimate (IDW: neighbour variance)';
+COMMENT ON COLUMN block_model_cells.zn_variance IS 'Kriging variance of the Zn estimate (IDW: neighbour variance)';
@@ -0,0 +1,15 @@
+-- ==========================================
+-- GeoForge: Section Corridor Indexes
+-- Migration 020: plan-view spatial indexes on sample midpoints
+-- Purpose: /api/model/section-grade with a section_line reads only the
+--          samples within a corridor of the line (ST_DWithin). These GiST
+--          expression indexes let that query use an index scan instead of
+--          reading every sample of the project.
+-- Depends on: 015_desurvey.sql, 016_composites.sql
+-- ==========================================
+
+CREATE INDEX IF NOT EXISTS idx_sample_coordinates_plan
+    ON sample_coordinates USING GIST(ST_Point(mid_x, mid_y));
+
+CREATE INDEX IF NOT EXISTS idx_composites_plan
+    ON composites USING GIST(ST_Point(mid_x, mid_y));
@@ -0,0 +1,123 @@
+-- ==========================================
+-- GeoForge: Project Data Versions and Result Cache
+-- Migration 021: project_data_versions + result_cache
+-- Purpose: Give every project a data version that triggers bump whenever
+--          its holes, surveys, samples, assays, lithology or veins change,
+--          and keep computed results (section-grade grids) keyed on that
+--          version in a cache table shared by all API processes. Results
+--          of older versions are never read again and are pruned on write.
+-- Depends on: 015_desurvey.sql (drill_hole_surveys)
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS project_data_versions (
+    project_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    bumped_xid BIGINT, -- Transaction of the last bump (one bump per transaction)
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Unlogged: a cache may be lost on crash and is cheaper to write
+CREATE UNLOGGED TABLE IF NOT EXISTS result_cache (
+    cache_key CHAR(64) PRIMARY KEY, -- sha256 of namespace, parameters and data version
+    namespace VARCHAR(50) NOT NULL, -- 'section_grade', ...
+    project_id UUID NOT NULL,
+    data_version BIGINT NOT NULL,
+    payload BYTEA NOT NULL, -- zlib-compressed JSON
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_result_cache_project ON result_cache(project_id, namespace, data_version);
+
+-- ==========================================
+-- VERSION BUMPS
+-- ==========================================
+
+-- Bulk imports touch many rows in one transaction; only the first bumps
+CREATE OR REPLACE FUNCTION bump_project_data_version(p_project_id UUID)
+RETURNS VOID AS $$
+BEGIN
+    IF p_project_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO project_data_versions AS v (project_id, version, bumped_xid, updated_at)
+    VALUES (p_project_id, 1, txid_current(), CURRENT_TIMESTAMP)
+    ON CONFLICT (project_id) DO UPDATE
+        SET version = v.version + 1,
+            bumped_xid = EXCLUDED.bumped_xid,
+            updated_at = EXCLUDED.updated_at
+        WHERE v.bumped_xid IS DISTINCT FROM EXCLUDED.bumped_xid;
+END;
+$$ LANGUAGE plpgsql;
+
+-- TG_ARGV[0] names the column on the changed row; TG_ARGV[1] says what it
+-- references: 'project', 'hole' (drill_holes.id) or 'sample' (core_samples.id)
+CREATE OR REPLACE FUNCTION project_data_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    ids UUID[] := '{}';
+    changed_project UUID;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        ids := ids || (to_jsonb(OLD) ->> TG_ARGV[0])::uuid;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        ids := ids || (to_jsonb(NEW) ->> TG_ARGV[0])::uuid;
+    END IF;
+
+    IF TG_ARGV[1] = 'project' THEN
+        FOR changed_project IN SELECT DISTINCT unnest(ids) LOOP
+            PERFORM bump_project_data_version(changed_project);
+        END LOOP;
+    ELSIF TG_ARGV[1] = 'hole' THEN
+        FOR changed_project IN
+            SELECT DISTINCT project_id FROM drill_holes WHERE id = ANY(ids)
+        LOOP
+            PERFORM bump_project_data_version(changed_project);
+        END LOOP;
+    ELSE
+        FOR changed_project IN
+            SELECT DISTINCT h.project_id
+            FROM core_samples s
+            JOIN drill_holes h ON h.id = s.drill_hole_id
+            WHERE s.id = ANY(ids)
+        LOOP
+            PERFORM bump_project_data_version(changed_project);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_data_version_drill_holes ON drill_holes;
+CREATE TRIGGER trigger_data_version_drill_holes
+    AFTER INSERT OR DELETE OR UPDATE OF project_id, easting, northing, elevation, dip, azimuth ON drill_holes
+    FOR EACH ROW EXECUTE FUNCTION project_data_changed('project_id', 'project');
+
+DROP TRIGGER IF EXISTS trigger_data_version_surveys ON drill_hole_surveys;
+CREATE TRIGGER trigger_data_version_surveys
+    AFTER INSERT OR UPDATE OR DELETE ON drill_hole_surveys
+    FOR EACH ROW EXECUTE FUNCTION project_data_changed('drill_hole_id', 'hole');
+
+DROP TRIGGER IF EXISTS trigger_data_version_core_samples ON core_samples;
+CREATE TRIGGER trigger_data_version_core_samples
+    AFTER INSERT OR UPDATE OR DELETE ON core_samples
+    FOR EACH ROW EXECUTE FUNCTION project_data_changed('drill_hole_id', 'hole');
+
+DROP TRIGGER IF EXISTS trigger_data_version_assays ON assays;
+CREATE TRIGGER trigger_data_version_assays
+    AFTER INSERT OR UPDATE OR DELETE ON assays
+    FOR EACH ROW EXECUTE FUNCTION project_data_changed('sample_id', 'sample');
+
+-- Lithology and vein intervals shape lithology/vein composites
+DROP TRIGGER IF EXISTS trigger_data_version_geological_units ON geological_units;
+CREATE TRIGGER trigger_data_version_geological_units
+    AFTER INSERT OR UPDATE OR DELETE ON geological_units
+    FOR EACH ROW EXECUTE FUNCTION project_data_changed('drill_hole_id', 'hole');
+
+DROP TRIGGER IF EXISTS trigger_data_version_vein_intersections ON vein_intersections;
+CREATE TRIGGER trigger_data_version_vein_intersections
+    AFTER INSERT OR UPDATE OR DELETE ON vein_intersections
+    FOR EACH ROW EXECUTE FUNCTION project_data_changed('drill_hole_id', 'hole');
+
+COMMENT ON TABLE project_data_versions IS 'Per-project data version, bumped by triggers when drilling data changes';
+COMMENT ON TABLE result_cache IS 'Computed results keyed on parameters and project data version, shared by API processes';
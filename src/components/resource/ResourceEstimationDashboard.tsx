@@ -11,6 +11,7 @@
 
 import React, { useState, useEffect } from 'react';
 import { Layers, Zap, Target, FileText, CheckCircle } from 'lucide-react';
+import { waitForJob, ModellingJob } from '../../lib/services/JobService';
 
 interface Project {
   id: string;
@@ -96,6 +97,11 @@ export const ResourceEstimationDashboard: React.FC<ResourceEstimationDashboardPr
     }
   };
 
+  const showJobProgress = (job: ModellingJob) => {
+    const message = job.progress_message || (job.status === 'queued' ? 'Queued' : 'Running');
+    setSuccessMessage(`${message}… ${Math.round(job.progress * 100)}%`);
+  };
+
   const createBlockModel = async () => {
     setIsLoading(true);
     setError(null);
@@ -123,7 +129,8 @@ export const ResourceEstimationDashboard: React.FC<ResourceEstimationDashboardPr
 
       if (!response.ok) throw new Error('Failed to create block model');
       
-      const data = await response.json();
+      // Creation runs as a background job; wait for its result
+      const data = await waitForJob('http://localhost:8000', await response.json(), showJobProgress);
       setSuccessMessage(`Created block model: ${data.blocks_created.toLocaleString()} blocks`);
       setSelectedBlockModel(data.block_model_id);
       loadBlockModels();
@@ -150,7 +157,8 @@ export const ResourceEstimationDashboard: React.FC<ResourceEstimationDashboardPr
 
       if (!response.ok) throw new Error('Failed to estimate grades');
       
-      const data = await response.json();
+      // Estimation runs as a background job; wait for its result
+      const data = await waitForJob('http://localhost:8000', await response.json(), showJobProgress);
       setSuccessMessage(`Estimated grades for ${data.statistics.estimated_blocks.toLocaleString()} blocks`);
       loadBlockModels();
       setCurrentStep(3);
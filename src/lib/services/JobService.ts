@@ -0,0 +1,57 @@
+/**
+ * Modelling Job Service
+ * Polls long-running backend modelling jobs (block model creation,
+ * grade estimation, background section interpolation) until they finish
+ */
+
+export interface ModellingJob {
+  id: string;
+  job_type: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+  progress: number;
+  progress_message?: string;
+  error?: string;
+}
+
+export interface JobSubmission {
+  job_id: string;
+  job_type: string;
+  status: string;
+  status_url: string;
+  result_url: string;
+}
+
+const POLL_INTERVAL_MS = 1000;
+
+/**
+ * Wait for a submitted job and return its result (the payload the endpoint
+ * used to return directly). Throws if the job fails or is cancelled.
+ */
+export async function waitForJob<T = any>(
+  apiBaseUrl: string,
+  submission: JobSubmission,
+  onProgress?: (job: ModellingJob) => void
+): Promise<T> {
+  for (;;) {
+    const response = await fetch(`${apiBaseUrl}${submission.status_url}`);
+    if (!response.ok) throw new Error(`Failed to fetch ${submission.job_type} job status`);
+
+    const job: ModellingJob = await response.json();
+    onProgress?.(job);
+
+    if (job.status === 'succeeded') {
+      const result = await fetch(`${apiBaseUrl}${submission.result_url}`);
+      if (!result.ok) throw new Error(`Failed to fetch ${submission.job_type} job result`);
+      return result.json();
+    }
+    if (job.status === 'failed') throw new Error(job.error || `${submission.job_type} job failed`);
+    if (job.status === 'cancelled') throw new Error(`${submission.job_type} job was cancelled`);
+
+    await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+}
+
+export async function cancelJob(apiBaseUrl: string, jobId: string): Promise<void> {
+  const response = await fetch(`${apiBaseUrl}/api/jobs/${jobId}/cancel`, { method: 'POST' });
+  if (!response.ok) throw new Error('Failed to cancel job');
+}